@@ -122,3 +122,124 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Scraper settings
+
+# Candidate site fetching: global and per-host concurrency caps, timeout in seconds
+SCRAPER_FETCH_CONCURRENCY = 16
+SCRAPER_FETCH_PER_HOST = 2
+SCRAPER_FETCH_TIMEOUT = 30
+
+# Page downloads are streamed: non-HTML responses are skipped from their headers and
+# at most SCRAPER_FETCH_MAX_BYTES are read. With SCRAPER_FETCH_EARLY_STOP the download
+# also stops once an email and a phone have been seen (city/Elfsight checks then
+# only see the part that was read)
+SCRAPER_FETCH_MAX_BYTES = 2 * 1024 * 1024
+SCRAPER_FETCH_EARLY_STOP = False
+
+# Landing pages without an email or phone get a contact-page crawl: up to
+# SCRAPER_CONTACT_PAGES same-site links that look like contact/about pages, fetched
+# concurrently, with SCRAPER_CONTACT_CRAWL_SECONDS for the whole site
+SCRAPER_CONTACT_PAGES = 3
+SCRAPER_CONTACT_CRAWL_SECONDS = 10
+
+# On-disk cache of fetched business pages, revalidated with ETag/Last-Modified.
+# Entries older than the TTL (seconds) are refetched in full; least recently used
+# pages are evicted past the size limit. Set the directory to None to disable
+SCRAPER_HTTP_CACHE_DIR = BASE_DIR / '.cache' / 'http'
+SCRAPER_HTTP_CACHE_TTL = 7 * 24 * 60 * 60
+SCRAPER_HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Parsed search engine results are cached in the scraper cache for this many seconds,
+# keyed by engine and normalized query, so repeat grids skip the searches and delays.
+# 0 disables the cache
+SCRAPER_SERP_CACHE_TTL = 24 * 60 * 60
+
+# Where the Google and Bing searches are sent (scheme and host). The loadtest
+# command points these at its local fake engines
+SCRAPER_SEARCH_BASE_URLS = {
+    'google': 'https://www.google.com',
+    'bing': 'https://www.bing.com',
+}
+
+# Search engine rate limiting: one budget per host, refilled every
+# SearchEngine.delay_between_requests seconds and BURST requests deep. Only requests
+# that find the budget spent wait, plus up to JITTER random seconds. The budget is
+# shared by all worker processes through the database (RateLimitState); set SHARED
+# to False to give every process its own budget instead
+SCRAPER_RATE_LIMIT_BURST = 1
+SCRAPER_RATE_LIMIT_JITTER = 1.0
+SCRAPER_RATE_LIMIT_SHARED = True
+
+# Category x city combinations a job runs at once (engines within a combination
+# always run in parallel); the per-host rate limits above still apply
+SCRAPER_COMBINATION_CONCURRENCY = 4
+
+# Jobs are split into work units that run_scrape_worker processes on any host lease
+# from the database. A lease lasts SCRAPER_LEASE_SECONDS and is renewed every
+# SCRAPER_HEARTBEAT_INTERVAL seconds while the unit runs; expired leases are taken
+# over by other workers, and a unit is failed after SCRAPER_UNIT_MAX_ATTEMPTS claims
+SCRAPER_LEASE_SECONDS = 120
+SCRAPER_HEARTBEAT_INTERVAL = 30
+SCRAPER_UNIT_MAX_ATTEMPTS = 3
+
+# Candidate sites already in ScrapedData with contact info fetched within this many
+# days are not fetched again (0 disables). Each worker keeps a Bloom filter of known
+# hosts, rebuilt every SCRAPER_KNOWN_HOSTS_REFRESH seconds, to skip the lookup query
+SCRAPER_LEAD_FRESHNESS_DAYS = 14
+SCRAPER_KNOWN_HOSTS_REFRESH = 600
+
+# Shared HTTP connection pool: number of per-host pools kept, idle connections per
+# host, and larger dedicated pools for the search engines we query constantly
+SCRAPER_HTTP_POOL_CONNECTIONS = 100
+SCRAPER_HTTP_POOL_MAXSIZE = 10
+SCRAPER_HTTP_HOST_POOLS = {
+    'https://www.google.com': 20,
+    'https://www.bing.com': 20,
+}
+# Forward proxies for all outbound requests, by scheme (None for direct connections)
+SCRAPER_HTTP_PROXIES = None
+
+# Caches: 'scraper' is shared by the web and worker processes (config version
+# counter, progress, SERP results). The file cache works for every process on
+# one host (its locking variant keeps progress counters exact, see scraper_app/cache.py);
+# point it at Redis/Memcached for several hosts. Not DatabaseCache: its incr isn't atomic.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'scraper': {
+        'BACKEND': 'scraper_app.cache.LockingFileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'scraper',
+    },
+}
+SCRAPER_CACHE_ALIAS = 'scraper'
+
+# Seconds between worker publishes of their pipeline metrics to the scraper
+# cache, where the /metrics view (Prometheus text format) reads them
+SCRAPER_METRICS_PUBLISH_INTERVAL = 15
+
+# Seconds between checks of the shared config version; edits made in this
+# process (admin saves) invalidate the snapshot immediately via signals
+SCRAPER_CONFIG_CHECK_INTERVAL = 5.0
+
+# Lead writes are buffered per job and flushed as one bulk upsert when this many
+# leads are pending or the oldest pending lead is this many seconds old
+SCRAPER_LEAD_BATCH_SIZE = 100
+SCRAPER_LEAD_FLUSH_INTERVAL = 5.0
+
+# Server-Sent Events progress stream: how often it checks the progress channel,
+# and how long one connection lasts before the browser reconnects. A stream
+# occupies a server thread for its whole life, so serve the site with a threaded
+# or async server (runserver, gunicorn --threads/gthread, uvicorn), not plain sync
+# workers, and keep connections short so a few open tabs can't starve requests.
+SCRAPER_SSE_POLL_INTERVAL = 0.25
+SCRAPER_SSE_MAX_SECONDS = 30
+
+# HTML parser backend: 'auto' (lxml if installed, else html.parser), 'selectolax', 'lxml'
+# or 'html.parser'. selectolax is fastest for SERPs but opt-in, see scraper_app/parsing.py
+SCRAPER_HTML_PARSER = 'auto'
+
+# Results file that `manage.py run_benchmarks` compares against (written with --save-baseline)
+SCRAPER_BENCHMARK_BASELINE = BASE_DIR / 'benchmark_baseline.json'
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Client, ScrapedData, BlacklistedDomain, SearchEngine
+from .models import Client, ScrapedData, BlacklistedDomain, SearchEngine, ScrapeJob, WorkUnit
+from .config import invalidate_config
 
 @admin.register(Client)
 class ClientAdmin(admin.ModelAdmin):
@@ -7,7 +8,7 @@ class ClientAdmin(admin.ModelAdmin):
 
 @admin.register(SearchEngine)
 class SearchEngineAdmin(admin.ModelAdmin):
-    list_display = ('name', 'is_active', 'priority', 'max_results', 'delay_between_requests', 'add_reviews_keyword')
+    list_display = ('name', 'is_active', 'priority', 'max_results', 'delay_between_requests', 'max_concurrency', 'add_reviews_keyword')
     list_filter = ('is_active', 'add_reviews_keyword')
     search_fields = ('name', 'search_url_template')
     list_editable = ('is_active', 'priority', 'delay_between_requests')
@@ -22,8 +23,8 @@ class SearchEngineAdmin(admin.ModelAdmin):
             'description': 'Use {query} as placeholder in URL template. Example: https://www.google.com/search?q={query}&hl=en'
         }),
         ('Anti-Blocking Settings', {
-            'fields': ('delay_between_requests',),
-            'description': 'Increase delay to avoid IP blocking. Recommended: 2-5 seconds'
+            'fields': ('delay_between_requests', 'max_concurrency'),
+            'description': 'Requests to an engine are spaced at least this delay apart, with at most max concurrency in flight. Recommended: 2-5 seconds, 1 request'
         }),
     )
     
@@ -31,11 +32,13 @@ class SearchEngineAdmin(admin.ModelAdmin):
     
     def activate_engines(self, request, queryset):
         updated = queryset.update(is_active=True)
+        invalidate_config()  # bulk update() skips post_save signals
         self.message_user(request, f'{updated} search engine(s) activated.')
     activate_engines.short_description = "Activate selected search engines"
     
     def deactivate_engines(self, request, queryset):
         updated = queryset.update(is_active=False)
+        invalidate_config()  # bulk update() skips post_save signals
         self.message_user(request, f'{updated} search engine(s) deactivated.')
     deactivate_engines.short_description = "Deactivate selected search engines"
 
@@ -61,11 +64,13 @@ class BlacklistedDomainAdmin(admin.ModelAdmin):
     
     def activate_domains(self, request, queryset):
         updated = queryset.update(is_active=True)
+        invalidate_config()  # bulk update() skips post_save signals
         self.message_user(request, f'{updated} domain(s) activated.')
     activate_domains.short_description = "Activate selected domains"
     
     def deactivate_domains(self, request, queryset):
         updated = queryset.update(is_active=False)
+        invalidate_config()  # bulk update() skips post_save signals
         self.message_user(request, f'{updated} domain(s) deactivated.')
     deactivate_domains.short_description = "Deactivate selected domains"
 
@@ -75,3 +80,27 @@ class ScrapedDataAdmin(admin.ModelAdmin):
     search_fields = ('title', 'category', 'city', 'country', 'link')
     list_filter = ('client', 'country', 'is_verified', 'created_at')
     ordering = ('is_verified', '-created_at')
+
+@admin.register(ScrapeJob)
+class ScrapeJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'client', 'status', 'current', 'total', 'saved_count', 'result_count', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status', 'client', 'created_at')
+    search_fields = ('country', 'url', 'worker')
+    ordering = ('-created_at',)
+    readonly_fields = ('started_at', 'finished_at', 'created_at')
+    
+    actions = ['requeue_jobs']
+    
+    def requeue_jobs(self, request, queryset):
+        # The worker that picks a job up again replaces its work units
+        updated = queryset.update(status=ScrapeJob.STATUS_QUEUED, worker='', error='', finished_at=None)
+        self.message_user(request, f'{updated} job(s) re-queued.')
+    requeue_jobs.short_description = "Re-queue selected jobs"
+
+@admin.register(WorkUnit)
+class WorkUnitAdmin(admin.ModelAdmin):
+    list_display = ('job', 'position', 'category', 'city', 'status', 'worker', 'attempts', 'lease_expires_at', 'heartbeat_at', 'saved_count')
+    list_filter = ('status',)
+    search_fields = ('category', 'city', 'worker')
+    ordering = ('-job', 'position')
+    readonly_fields = ('results', 'skipped_items', 'heartbeat_at', 'finished_at')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ScraperAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scraper_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - registers config invalidation receivers
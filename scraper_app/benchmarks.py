@@ -0,0 +1,306 @@
+"""
+Offline micro-benchmarks for the scraping hot paths (run_benchmarks command).
+
+Every case runs on saved or generated HTML, never the network:
+
+    serp.*     parse_google_results / parse_bing_results on the saved SERP
+               pages and on generated ones, once per installed parser backend
+    filter.*   the per-result work of add_unique_and_save: canonicalize_url,
+               filters.screen_result and the registrable-domain key
+    extract.*  extract_from_response (what visit_and_extract does once a page
+               has arrived) on the saved pages and on generated business pages
+    scan.*     the contact_scan.scan() pass alone (emails, phones, tel: link)
+               and the best email/phone choice, on the same pages; each
+               scan.<page>[legacy] case times the seven full-text regex
+               passes scan() replaced, as the reference to compare with
+
+Each case reports ops/sec, p50/p99 latency per call and the peak memory one
+call allocates (tracemalloc). Results can be saved as a JSON baseline and
+later runs compared against it; a case regresses when its ops/sec drop, or
+its peak allocation grows, by more than the tolerance.
+"""
+import contextlib
+import copy
+import io
+import json
+import random
+import re
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from . import parsing
+from .config import get_fallback_matcher
+from .contact_scan import EMAIL_RE, PHONE_PATTERNS, scan
+from .extract import best_email, best_phone, extract_from_response
+from .filters import screen_result
+from .normalize import canonicalize_url, registrable_domain
+
+Case = namedtuple('Case', ['name', 'func', 'args', 'backend'], defaults=(None,))
+Stats = namedtuple('Stats', ['ops_per_sec', 'p50_us', 'p99_us', 'peak_kib', 'calls'])
+
+SAVED_PAGES = ('debug_google_reviews.html', 'debug_ddg.html', 'debug_output.html')
+
+
+def get_baseline_path():
+    return Path(getattr(settings, 'SCRAPER_BENCHMARK_BASELINE', Path(settings.BASE_DIR) / 'benchmark_baseline.json'))
+
+
+class PageResponse:
+    """Stands in for a fetched 200 response"""
+
+    def __init__(self, text, url=''):
+        self.text = text
+        self.url = url
+        self.status_code = 200
+
+
+# Synthetic inputs; a fixed seed keeps them identical between runs
+
+WORDS = ('law', 'dental', 'clinic', 'family', 'care', 'group', 'studio', 'fitness', 'auto', 'repair',
+         'north', 'city', 'west', 'plumbing', 'realty', 'spa', 'bakery', 'legal', 'centre', 'health')
+
+
+def _name(rng):
+    return ' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(2, 4)))
+
+
+def _host(rng):
+    return '-'.join(rng.choice(WORDS) for _ in range(2)) + str(rng.randint(1, 999)) + rng.choice(('.com', '.ca', '.co.uk', '.in'))
+
+
+def synthetic_google_serp(results=40, seed=1):
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(results):
+        title = f"{_name(rng)} - {rng.choice(('Reviews', 'Home', 'Ratings', 'Contact'))}"
+        blocks.append(
+            f'<div class="g tF2Cxc"><div class="yuRUbf"><a href="https://www.{_host(rng)}/?utm_source=g{i}">'
+            f'<h3 class="LC20lb">{title}</h3></a></div>'
+            f'<div class="VwiC3b">Rated {rng.randint(1, 5)}.{rng.randint(0, 9)} stars from {rng.randint(3, 900)} '
+            f'google reviews. {_name(rng)} serving the area since {rng.randint(1950, 2020)}.</div></div>'
+        )
+    filler = '<div class="filler">' + '<span class="x">' * 20 + 'x' * 3000 + '</span>' * 20 + '</div>'
+    return f'<html><head><style>{"." * 5000}</style></head><body>{filler}<div id="search">{"".join(blocks)}</div></body></html>'
+
+
+def synthetic_bing_serp(results=40, seed=2):
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(results):
+        blocks.append(
+            f'<li class="b_algo"><h2><a href="https://{_host(rng)}/">{_name(rng)} Reviews</a></h2>'
+            f'<div class="b_caption"><p>{rng.randint(3, 900)} customer ratings for {_name(rng)}.</p></div></li>'
+        )
+    return f'<html><body><ol id="b_results"><li class="b_ad">ad</li>{"".join(blocks)}</ol></body></html>'
+
+
+def synthetic_business_page(kind, size_kib=60, seed=3):
+    """
+    A business landing page of roughly size_kib, with its contact details in
+    the place kind says: 'json_ld', 'microdata', 'tel_link', 'text' or 'none'.
+    """
+    rng = random.Random(seed)
+    phone = f"+1 ({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}"
+    contact = {
+        'json_ld': '<script type="application/ld+json">{"@type": "LocalBusiness", "telephone": "%s", '
+                   '"address": {"addressLocality": "Toronto"}}</script>' % phone,
+        'microdata': f'<span itemprop="telephone">{phone}</span><span itemprop="addressLocality">Toronto</span>',
+        'tel_link': f'<a href="tel:{phone}">Call us</a>',
+        'text': f'<p>Call us today at {phone}</p>',
+        'none': '',
+    }[kind]
+    body = []
+    while sum(map(len, body)) < size_kib * 1024:
+        body.append(
+            f'<div class="section"><h2>{_name(rng)}</h2><p>{" ".join(rng.choice(WORDS) for _ in range(60))}</p>'
+            f'<img src="/img/{rng.randint(1, 99999)}.jpg" width="{rng.randint(100, 999)}" height="{rng.randint(100, 999)}"></div>'
+        )
+    script = '<script>var cfg = {' + ','.join(f'"k{i}": {rng.randint(0, 10 ** 6)}' for i in range(300)) + '};</script>'
+    return (
+        f'<html><head><title>{_name(rng)}</title>{script}</head><body>{"".join(body[:len(body) // 2])}'
+        f'{contact}<footer>Toronto, Ontario, Canada. info@example-business.ca</footer>{"".join(body[len(body) // 2:])}</body></html>'
+    )
+
+
+def synthetic_serp_items(count=200, seed=4):
+    """SERP results with a realistic mix of business sites, listing sites, forums and ranking pages"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.15:
+            link, title = f'https://www.yelp.com/biz/{_host(rng)}', f'{_name(rng)} - Yelp'
+        elif roll < 0.25:
+            link, title = f'https://www.reddit.com/r/toronto/comments/{i}/', 'Any good recommendations? : forum'
+        elif roll < 0.35:
+            link, title = f'https://{_host(rng)}/blog/top-10', f'Top 10 {_name(rng)} in Toronto'
+        else:
+            link, title = f'https://www.{_host(rng)}/{rng.choice(("", "about", "services/"))}?utm_source=google&gclid={i}', _name(rng)
+        items.append({'link': link, 'title': title, 'snippet': 'Rated 4.5 stars', 'has_reviews': rng.random() > 0.05})
+    return items
+
+
+def filter_batch(items, matcher):
+    """The per-result work add_unique_and_save does before fetching, on fresh copies of items"""
+    kept = 0
+    for item in items:
+        item = dict(item)
+        item['link'] = canonicalize_url(item['link']) or item['link']
+        if screen_result(item, matcher) is None:
+            registrable_domain(item['link'])
+            kept += 1
+    return kept
+
+
+def extract_one(result, text):
+    return extract_from_response(copy.copy(result), PageResponse(text))
+
+
+def scan_contacts(text):
+    hits = scan(text)
+    return best_email(hits.emails), best_phone(hits.phones)
+
+
+def legacy_scan_contacts(text):
+    # The extractor's regex work before contact_scan: seven full-text passes, re.sub in the sort key
+    emails = set(EMAIL_RE.findall(text))
+    phones = []
+    for pattern in PHONE_PATTERNS:
+        phones.extend(pattern.findall(text))
+    unique_phones = []
+    unique_clean = set()
+    for p in phones:
+        p_clean = re.sub(r"[^\d+]", "", p)
+        if 10 <= len(p_clean) <= 15 and p_clean not in unique_clean:
+            unique_clean.add(p_clean)
+            unique_phones.append(p.strip())
+    unique_phones.sort(key=lambda x: (not x.startswith('+'), -len(re.sub(r"[^\d]", "", x))))
+    return emails, unique_phones[0] if unique_phones else ''
+
+
+def installed_backends():
+    backends = ['html.parser']
+    if parsing.HAS_LXML:
+        backends.append('lxml')
+    if parsing.HAS_SELECTOLAX:
+        backends.append('selectolax')
+    return backends
+
+
+def load_saved_pages():
+    """{file name: text} of the saved pages that exist in BASE_DIR"""
+    pages = {}
+    for name in SAVED_PAGES:
+        path = Path(settings.BASE_DIR) / name
+        if path.exists():
+            pages[name] = path.read_text(encoding='utf-8', errors='replace')
+    return pages
+
+
+def build_cases():
+    # Imported here: views pulls in the models and HTTP client, which the
+    # synthetic generators above don't need
+    from .views import parse_bing_results, parse_google_results
+
+    saved = load_saved_pages()
+    cases = []
+
+    serp_pages = [
+        ('google.synthetic', parse_google_results, synthetic_google_serp()),
+        ('bing.synthetic', parse_bing_results, synthetic_bing_serp()),
+    ]
+    for name, text in saved.items():
+        # The saved pages are Google/DuckDuckGo responses; the Google parser is the one they exercise
+        serp_pages.append((f'google.{name}', parse_google_results, text))
+    for backend in installed_backends():
+        for name, parse, text in serp_pages:
+            cases.append(Case(f'serp.{name}[{backend}]', parse, (text,), backend))
+
+    matcher = get_fallback_matcher()
+    cases.append(Case('filter.serp_items_200', filter_batch, (synthetic_serp_items(), matcher)))
+
+    result = {'link': 'https://example-business.ca/', 'title': 'Example Business', 'snippet': '',
+              'city': '', 'country': 'Canada'}
+    for name, text in saved.items():
+        cases.append(Case(f'extract.{name}', extract_one, (result, text)))
+    business_pages = {f'synthetic_{kind}': synthetic_business_page(kind)
+                      for kind in ('json_ld', 'microdata', 'tel_link', 'text', 'none')}
+    for name, text in business_pages.items():
+        cases.append(Case(f'extract.{name}', extract_one, (result, text)))
+
+    for name, text in {**saved, **business_pages}.items():
+        cases.append(Case(f'scan.{name}', scan_contacts, (text,)))
+        cases.append(Case(f'scan.{name}[legacy]', legacy_scan_contacts, (text,)))
+    return cases
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(case, rounds=50, min_time=0.2, alloc_rounds=3):
+    """Time case until it has run at least rounds times and min_time seconds, then trace one call's allocations"""
+    # The parsers read their backend from settings; the extractor and
+    # parsers print as they go, which is kept out of the report
+    backend = override_settings(SCRAPER_HTML_PARSER=case.backend) if case.backend else contextlib.nullcontext()
+    with backend, contextlib.redirect_stdout(io.StringIO()):
+        case.func(*case.args)  # warm-up: imports, regex and parser caches
+
+        durations = []
+        started = time.perf_counter()
+        while len(durations) < rounds or time.perf_counter() - started < min_time:
+            t0 = time.perf_counter_ns()
+            case.func(*case.args)
+            durations.append(time.perf_counter_ns() - t0)
+
+        peak = 0
+        tracemalloc.start()
+        try:
+            for _ in range(alloc_rounds):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                case.func(*case.args)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+
+    durations.sort()
+    return Stats(
+        ops_per_sec=len(durations) / (sum(durations) / 1e9),
+        p50_us=_percentile(durations, 0.50) / 1000,
+        p99_us=_percentile(durations, 0.99) / 1000,
+        peak_kib=peak / 1024,
+        calls=len(durations),
+    )
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    data = {name: stats._asdict() for name, stats in results.items()}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, tolerance=0.25):
+    """[(case name, message)] for cases slower or hungrier than baseline by more than tolerance"""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if stats.ops_per_sec < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append((name, f"{stats.ops_per_sec:.1f} ops/s vs {base['ops_per_sec']:.1f} baseline"))
+        # Small allocations are noise; only flag growth past 64 KiB
+        if stats.peak_kib > max(base['peak_kib'] * (1 + tolerance), base['peak_kib'] + 64):
+            regressions.append((name, f"{stats.peak_kib:.0f} KiB peak vs {base['peak_kib']:.0f} baseline"))
+    return regressions
@@ -0,0 +1,139 @@
+"""
+Compiled blacklist matcher for search-engine candidate URLs.
+
+BlacklistedDomain entries come in four shapes, each indexed separately so a
+lookup only walks the labels of the candidate's hostname instead of scanning
+every entry:
+
+    'yelp.com'         domain    - the host or any subdomain of it
+    '.gov'             suffix    - any host ending in that suffix (TLD rules)
+    'yellowpages.'     label     - a host containing that label, any TLD
+    'google.com/maps'  path      - a domain plus a path prefix
+"""
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+# Used when the BlacklistedDomain table is empty
+FALLBACK_BLACKLIST = (
+    # Review & Listing Sites
+    'birdeye.com', 'trustpilot.com', 'yelp.com', 'yellowpages.',
+    'tripadvisor.', 'bbb.org', 'foursquare.com', 'zomato.com',
+    'clutch.co', 'goodfirms.co', 'yably.ca', 'bestratedintoronto.com',
+    'threebestrated.', 'threebest.', '3bestrated.',
+
+    # Forums & Discussion Sites
+    'reddit.com', 'quora.com', 'stackoverflow.com', 'stackexchange.com',
+    'answers.yahoo.com', 'thestudentroom.co.uk', 'studentroom.co.uk',
+    'lawstudents.', 'studentdoctor.', 'studentforums.',
+    'forum.', 'forums.', 'community.', 'discuss.',
+
+    # Legal Directories
+    'lawyers.com', 'avvo.com', 'findlaw.com', 'martindale.com',
+    'superlawyers.com', 'nolo.com', 'bestlawfirms.com', 'lexpert.ca',
+
+    # Social Media
+    'facebook.com', 'instagram.com', 'twitter.com', 'linkedin.com',
+    'pinterest.com', 'youtube.com', 'tumblr.com', 'medium.com',
+
+    # Maps & Directories
+    'google.com/maps', 'maps.google.com', 'mapquest.com',
+    'justdial.com', 'indiamart.com', 'sulekha.com', 'indiatimes.com',
+    'magicpin.in', 'urbanpro.com', 'timesofindia.',
+
+    # Job Sites
+    'glassdoor.', 'indeed.com',
+
+    # Travel & Booking
+    'booking.com', 'expedia.', 'hotels.com', 'airbnb.com',
+    'opentable.com', 'urbanspoon.com',
+
+    # Home Services
+    'homeadvisor.com', 'angi.com', 'thumbtack.com', 'houzz.com',
+    'porch.com', 'bark.com',
+
+    # Other
+    'wikipedia.org', 'zumba.com',
+
+    # Search Engines
+    'search.yahoo.com', 'search.brave.com',
+
+    # Government & Education
+    '.gov', '.nic.in', 'gov.in', 'gov.uk', 'usa.gov', 'pib.gov.in',
+    '.edu', '.mil', 'india.gov.in',
+)
+
+BlacklistMatch = namedtuple('BlacklistMatch', ['rule', 'kind'])
+
+
+def split_url(url):
+    """Return (hostname, path) of a URL, lowercased, tolerating a missing scheme"""
+    url = (url or '').strip().lower()
+    if '://' not in url:
+        url = '//' + url
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+    except ValueError:
+        return '', ''
+    return host.rstrip('.'), parts.path or '/'
+
+
+class BlacklistMatcher:
+    """Hostname-indexed matcher built once from a list of blacklist entries"""
+
+    def __init__(self, entries):
+        self.domains = {}   # 'yelp.com' -> rule
+        self.suffixes = {}  # 'gov' (from '.gov') -> rule
+        self.labels = {}    # first label -> [(label tuple, rule)]
+        self.paths = {}     # 'google.com' -> [('/maps', rule)]
+        self.size = 0
+
+        for entry in entries:
+            rule = (entry or '').strip().lower()
+            if not rule:
+                continue
+            self.size += 1
+
+            if '/' in rule:
+                host, path = rule.split('/', 1)
+                self.paths.setdefault(host.strip('.'), []).append(('/' + path, rule))
+            elif rule.startswith('.'):
+                self.suffixes[rule.strip('.')] = rule
+            elif rule.endswith('.'):
+                labels = tuple(rule.strip('.').split('.'))
+                self.labels.setdefault(labels[0], []).append((labels, rule))
+            else:
+                self.domains[rule] = rule
+
+    def __len__(self):
+        return self.size
+
+    def match(self, url):
+        """Return the BlacklistMatch for url, or None if no rule applies"""
+        host, path = split_url(url)
+        if not host:
+            return None
+        labels = host.split('.')
+
+        # Domain, suffix and path rules: walk the host's suffixes, longest first
+        for i in range(len(labels)):
+            suffix = '.'.join(labels[i:])
+            rule = self.domains.get(suffix)
+            if rule:
+                return BlacklistMatch(rule, 'domain')
+            if i > 0:
+                rule = self.suffixes.get(suffix)
+                if rule:
+                    return BlacklistMatch(rule, 'tld' if i == len(labels) - 1 else 'suffix')
+            for prefix, rule in self.paths.get(suffix, ()):
+                if path.startswith(prefix):
+                    return BlacklistMatch(rule, 'path')
+
+        # Label rules must be followed by at least one more label ('yellowpages.' + TLD)
+        for i, label in enumerate(labels[:-1]):
+            for rule_labels, rule in self.labels.get(label, ()):
+                end = i + len(rule_labels)
+                if end < len(labels) and tuple(labels[i:end]) == rule_labels:
+                    return BlacklistMatch(rule, 'label')
+
+        return None
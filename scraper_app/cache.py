@@ -0,0 +1,53 @@
+"""
+Cache backend for the shared 'scraper' cache.
+
+Django's FileBasedCache implements incr() and add() as a read followed by a
+write, so two workers adding to the same progress counter at once can lose
+one of the increments. LockingFileBasedCache makes both atomic by holding an
+exclusive lock on a file in the cache directory while they run. The lock is
+an flock(), so it works across processes on one host, which is as far as a
+file cache is shared anyway; use Redis or Memcached (atomic incr built in)
+for workers on several hosts.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+LOCK_FILENAME = 'counters.lock'  # Not a .djcache file, so culling and clear() leave it alone
+
+_thread_lock = threading.Lock()
+
+
+class LockingFileBasedCache(FileBasedCache):
+    """FileBasedCache whose incr(), decr() and add() are atomic"""
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            with _thread_lock:
+                yield
+            return
+        os.makedirs(self._dir, exist_ok=True)
+        with open(os.path.join(self._dir, LOCK_FILENAME), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # decr() calls incr() with -delta
+        with self._locked():
+            return super().incr(key, delta, version)
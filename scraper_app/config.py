@@ -0,0 +1,120 @@
+"""
+In-process snapshot of scraper configuration (search engines and blacklist).
+
+The snapshot is loaded once, shared by every job and thread in the process,
+and never mutated. Saving or deleting a SearchEngine / BlacklistedDomain
+bumps a version counter (see signals.py); the next get_config() call then
+loads a fresh snapshot. The counter is also mirrored in the shared cache so
+worker processes notice edits made through the admin.
+"""
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .blacklist import BlacklistMatcher, FALLBACK_BLACKLIST
+from .models import BlacklistedDomain, SearchEngine
+
+VERSION_CACHE_KEY = 'scraper:config-version'
+
+EngineConfig = namedtuple('EngineConfig', [
+    'name', 'priority', 'add_reviews_keyword', 'max_results', 'delay_between_requests', 'max_concurrency',
+])
+
+ConfigSnapshot = namedtuple('ConfigSnapshot', [
+    'version',          # local version this snapshot was built for
+    'shared_version',   # shared cache token this snapshot was built for
+    'engines',          # tuple of active EngineConfig, by priority
+    'engines_by_name',  # read-only {name: EngineConfig}
+    'blacklist',        # compiled BlacklistMatcher (database or fallback)
+    'db_blacklist_count',
+    'loaded_at',
+])
+
+_lock = threading.Lock()
+_snapshot = None
+_local_version = 0
+_last_shared_check = 0.0
+_fallback_matcher = None
+
+
+def _shared_cache():
+    return caches[getattr(settings, 'SCRAPER_CACHE_ALIAS', 'default')]
+
+
+def _get_shared_version():
+    try:
+        token = _shared_cache().get(VERSION_CACHE_KEY)
+        if token is None:
+            token = str(time.time_ns())
+            _shared_cache().add(VERSION_CACHE_KEY, token, timeout=None)
+            token = _shared_cache().get(VERSION_CACHE_KEY, token)
+        return token
+    except Exception as e:
+        print(f"Config version check failed: {e}")
+        return None
+
+
+def get_fallback_matcher():
+    """Compiled FALLBACK_BLACKLIST, built once per process"""
+    global _fallback_matcher
+    if _fallback_matcher is None:
+        _fallback_matcher = BlacklistMatcher(FALLBACK_BLACKLIST)
+    return _fallback_matcher
+
+
+def _load(version, shared_version):
+    engines = tuple(
+        EngineConfig(e.name, e.priority, e.add_reviews_keyword, e.max_results, e.delay_between_requests, e.max_concurrency)
+        for e in SearchEngine.objects.filter(is_active=True).order_by('priority')
+    )
+    db_blacklist = list(BlacklistedDomain.objects.filter(is_active=True).values_list('domain', flat=True))
+    matcher = BlacklistMatcher(db_blacklist) if db_blacklist else get_fallback_matcher()
+
+    print(f"Loaded scraper config v{version}: {len(engines)} engine(s), {len(matcher)} blacklist rules")
+    return ConfigSnapshot(
+        version=version,
+        shared_version=shared_version,
+        engines=engines,
+        engines_by_name=MappingProxyType({e.name: e for e in engines}),
+        blacklist=matcher,
+        db_blacklist_count=len(db_blacklist),
+        loaded_at=time.time(),
+    )
+
+
+def get_config():
+    """Return the current ConfigSnapshot, reloading it only if it was invalidated"""
+    global _snapshot, _last_shared_check
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == _local_version:
+        interval = getattr(settings, 'SCRAPER_CONFIG_CHECK_INTERVAL', 5.0)
+        now = time.monotonic()
+        if now - _last_shared_check < interval:
+            return snapshot
+        _last_shared_check = now
+        if _get_shared_version() == snapshot.shared_version:
+            return snapshot
+
+    with _lock:
+        # Another thread may have reloaded while we waited for the lock
+        shared_version = _get_shared_version()
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version != _local_version or snapshot.shared_version != shared_version:
+            snapshot = _snapshot = _load(_local_version, shared_version)
+            _last_shared_check = time.monotonic()
+        return snapshot
+
+
+def invalidate_config():
+    """Drop the snapshot in this process and tell other processes to reload theirs"""
+    global _local_version
+    with _lock:
+        _local_version += 1
+    try:
+        _shared_cache().set(VERSION_CACHE_KEY, str(time.time_ns()), timeout=None)
+    except Exception as e:
+        print(f"Config version bump failed: {e}")
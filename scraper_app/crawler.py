@@ -0,0 +1,132 @@
+"""
+Contact-page discovery for candidate sites whose landing page has no email
+or phone.
+
+contact_links() ranks the same-site links on the landing page by how much
+they look like a contact page (/contact, /about, "Get in touch", ...).
+crawl_contacts() then fetches the best SCRAPER_CONTACT_PAGES of them
+concurrently through the shared connection pool and merges what it finds
+into the result. Each site has a hard budget: at most that many pages, and
+SCRAPER_CONTACT_CRAWL_SECONDS in total. The crawl stops as soon as the
+missing fields have been found; pages still queued are cancelled and pages
+still downloading are abandoned.
+"""
+import concurrent.futures
+import html
+import re
+import time
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+
+from . import instrument
+from .extract import extract_page
+from .fetcher import fetch_page
+from .normalize import canonicalize_url, registrable_domain
+
+# The fragment is dropped from the captured href ("/contact#form" is /contact)
+ANCHOR_RE = re.compile(r'<a\b[^>]*?\bhref\s*=\s*["\']([^"\'#]*)(?:#[^"\']*)?["\'][^>]*>(.*?)</a\s*>', re.I | re.S)
+TAG_RE = re.compile(r'<[^>]+>')
+
+# (keyword, score): matched against the link's path and its anchor text
+CONTACT_KEYWORDS = [
+    ('contact', 10), ('kontakt', 10), ('get-in-touch', 9), ('get in touch', 9),
+    ('reach-us', 8), ('reach us', 8), ('enquir', 7), ('inquir', 7),
+    ('find-us', 6), ('find us', 6), ('location', 5), ('about', 4), ('team', 2),
+]
+SKIP_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.zip', '.doc', '.docx', '.mp4')
+
+
+def get_crawl_settings():
+    """Return (pages per site, seconds per site) from Django settings"""
+    return (
+        getattr(settings, 'SCRAPER_CONTACT_PAGES', 3),
+        getattr(settings, 'SCRAPER_CONTACT_CRAWL_SECONDS', 10),
+    )
+
+
+def missing_fields(result):
+    return [name for name in ('email', 'phone') if not (result.get(name) or '').strip()]
+
+
+def contact_links(base_url, text, limit=None):
+    """Same-site links from text, best contact-page candidates first"""
+    domain = registrable_domain(base_url)
+    current = canonicalize_url(base_url)
+    scored = {}
+    for href, label in ANCHOR_RE.findall(text):
+        href = html.unescape(href.strip())
+        if not href or href.lower().startswith(('mailto:', 'tel:', 'javascript:')):
+            continue
+        url = canonicalize_url(urljoin(base_url, href))
+        if not url or url == current or registrable_domain(url) != domain:
+            continue
+        path = urlsplit(url).path.lower()
+        if path.endswith(SKIP_EXTENSIONS):
+            continue
+
+        label = TAG_RE.sub(' ', label).lower()
+        score = 0
+        for keyword, weight in CONTACT_KEYWORDS:
+            if keyword in path:
+                score += weight
+            if keyword in label:
+                score += weight
+        if score:
+            # Shallow pages first among equals (/contact beats /blog/2019/contact-form-tips)
+            score -= path.count('/') * 0.5
+            scored[url] = max(score, scored.get(url, 0))
+
+    ranked = sorted(scored, key=scored.get, reverse=True)
+    return ranked[:limit] if limit else ranked
+
+
+def crawl_contacts(result, links, max_pages=None, budget=None):
+    """
+    Fetch up to max_pages of links concurrently and fill the result's missing
+    email/phone (and city) from them. Returns the number of pages used.
+    """
+    default_pages, default_budget = get_crawl_settings()
+    max_pages = max_pages or default_pages
+    budget = budget or default_budget
+    links = links[:max_pages]
+    if not links or not missing_fields(result):
+        return 0
+
+    with instrument.timed('crawl'):
+        return _crawl(result, links, budget)
+
+
+def _crawl(result, links, budget):
+    deadline = time.monotonic() + budget
+    target_country = (result.get('country') or '').strip()
+    used = 0
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(links))
+    try:
+        futures = {executor.submit(fetch_page, url, budget): url for url in links}
+        for future in concurrent.futures.as_completed(futures, timeout=budget):
+            used += 1
+            try:
+                page = future.result()
+            except Exception:
+                continue
+            if page is None or page.status_code != 200:
+                continue
+
+            found = {'city': result.get('city') or ''}
+            extract_page(found, page.text, target_country)
+            for name in missing_fields(result):
+                if found.get(name):
+                    result[name] = found[name]
+                    print(f"  Found {name} on {futures[future][:60]}")
+            if not result.get('city') and found.get('city'):
+                result['city'] = found['city']
+
+            if not missing_fields(result) or time.monotonic() > deadline:
+                break
+    except concurrent.futures.TimeoutError:
+        print(f"  Contact crawl of {links[0][:50]} hit its {budget}s budget")
+    finally:
+        # Don't wait for abandoned pages; their threads finish on their own
+        executor.shutdown(wait=False, cancel_futures=True)
+    return used
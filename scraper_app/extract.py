@@ -0,0 +1,306 @@
+"""
+Contact extraction from a fetched business page.
+
+Extraction is tiered so the expensive work only happens when it is needed:
+
+    1. Cheap probes on the raw text: country check, Elfsight, and one
+       contact_scan.scan() pass for emails, phone candidates and tel: links
+    2. One pass over the JSON-LD blocks for both city and phone
+    3. A DOM (BeautifulSoup via parsing.make_soup) - built lazily, and only
+       when a field is still missing and a substring probe says the page can
+       contain it
+    4. Phone numbers found in the text by the scan
+
+Outputs are the same as the original single-function extractor, except that
+the email is picked in page order (it used to depend on set ordering).
+"""
+import json
+import re
+
+from . import instrument
+from .contact_scan import scan
+from .parsing import make_soup
+
+# Country map for fuzzy matching
+COUNTRY_VARIATIONS = {
+    'Canada': ['canada', 'ca'],
+    'USA': ['usa', 'united states', 'u.s.a', 'america', ' u.s '],
+    'India': ['india', ' bhart ', ' in '],
+    'UK': ['united kingdom', ' u.k', 'great britain', 'england', 'london']
+}
+
+LD_JSON_RE = re.compile(
+    r'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.I | re.S
+)
+
+CITY_CLASSES = ['city', 'locality', 'address-city', 'contact-city']
+CITY_CLASS_RES = [re.compile(cls, re.I) for cls in CITY_CLASSES]
+META_CITY_RE = re.compile('city|location', re.I)
+
+
+class LazySoup:
+    """Builds the BeautifulSoup tree on first use only"""
+
+    def __init__(self, text):
+        self.text = text
+        self.soup = None
+
+    def __call__(self):
+        if self.soup is None:
+            self.soup = make_soup(self.text)
+        return self.soup
+
+    @property
+    def built(self):
+        return self.soup is not None
+
+
+def city_from_snippet(result, target_country):
+    """Dynamic Snippet Check: Look for "City, Country" pattern in title/snippet"""
+    meta_text = ((result.get('title') or '') + " " + (result.get('snippet') or '')).lower()
+    pattern = rf"([a-z\s]+),\s*{re.escape(target_country.lower())}"
+    match = re.search(pattern, meta_text)
+    if match:
+        extracted = match.group(1).strip().title()
+        if len(extracted.split()) <= 2:
+            return extracted
+    return ''
+
+
+def extract_from_response(result, resp):
+    """Extract email, phone, city and country checks from a fetched page (resp may be None)"""
+    result['city'] = (result.get('city') or '').strip()
+    target_country = (result.get('country') or '').strip()
+
+    if not result['city'] and target_country:
+        result['city'] = city_from_snippet(result, target_country)
+
+    if resp is None:
+        if 'phone' not in result: result['phone'] = ''
+        return result
+
+    try:
+        if resp.status_code == 200:
+            with instrument.timed('extract'):
+                extract_page(result, resp.text, target_country)
+    except Exception:
+        if 'phone' not in result: result['phone'] = ''
+    return result
+
+
+def extract_page(result, text, target_country=''):
+    """Run the extraction tiers over one page's HTML, filling result in place"""
+    text_lower = text.lower()
+    soup = LazySoup(text)
+
+    # Tier 1: probes on the raw text
+    result['is_invalid_country'] = is_invalid_country(text_lower, target_country, result['city'])
+
+    if 'elfsight.com' in text_lower or 'elfsight-app' in text_lower:
+        result['is_elfsight'] = True
+
+    hits = scan(text)
+    result['email'] = best_email(hits.emails)
+    result['phone'] = ''
+
+    # Tier 2: JSON-LD, parsed once for both city and phone
+    if 'ld+json' in text_lower:
+        ld_city, ld_phone = scan_json_ld(text, need_city=not result['city'])
+        if ld_city and not result['city']:
+            result['city'] = ld_city
+        if ld_phone:
+            result['phone'] = ld_phone
+
+    # Tier 3: DOM lookups, each guarded by a probe so the tree is rarely built
+    if not result['city']:
+        result['city'] = city_from_dom(soup, text_lower)
+
+    if not result['phone']:
+        result['phone'] = phone_from_dom(soup, text_lower, hits.tel)
+
+    # Tier 4: phone numbers the scan found in the raw text
+    if not result['phone']:
+        result['phone'] = best_phone(hits.phones)
+
+    return result
+
+
+def contacts_found(text):
+    """
+    Cheap early-stop check for streamed downloads: True once text holds both an
+    email and a phone number. City, Elfsight and country checks may still
+    differ from a full read, which is why early stopping is opt-in.
+    """
+    hits = scan(text)
+    if not best_email(hits.emails):
+        return False
+    return hits.tel is not None or bool(best_phone(hits.phones))
+
+
+def is_invalid_country(text_lower, target_country, city):
+    """True when the page doesn't mention the target country (or city) but does mention another one"""
+    if not target_country:
+        return False
+
+    candidates = COUNTRY_VARIATIONS.get(target_country, [target_country.lower()])
+    # Does the page content mention the country or its variations?
+    found_target = any(c in text_lower for c in candidates)
+
+    # If country name is missing, but the city matches our search, consider it FOUND
+    if not found_target and city:
+        if city.lower() in text_lower:
+            found_target = True
+    if found_target:
+        return False
+
+    # Check for mention of WRONG countries
+    padded = f" {text_lower} "
+    for k, v in COUNTRY_VARIATIONS.items():
+        if k != target_country:
+            if any(f" {var} " in padded for var in v):
+                return True
+    return False
+
+
+def best_email(emails):
+    """Pick the page's email: first non-image hit, else a generic info@/contact@/support@ one"""
+    best = None
+    for e in emails:
+        el = e.lower()
+        if any(g in el for g in ['info@', 'contact@', 'support@']):
+            if not best: best = e
+        elif not any(x in el for x in ['.png', '.jpg', '.gif']):
+            best = e
+            break
+    return best or ''
+
+
+def _ld_items(block):
+    data = json.loads(block)
+    # Handle both single object and list of objects
+    return data if isinstance(data, list) else [data]
+
+
+def _ld_city(items):
+    for item in items:
+        addr = item.get('address')
+        if isinstance(addr, dict):
+            city = addr.get('addressLocality')
+            if city:
+                return str(city).strip()
+        elif isinstance(item.get('location'), dict):
+            loc_addr = item['location'].get('address')
+            if isinstance(loc_addr, dict):
+                city = loc_addr.get('addressLocality')
+                if city:
+                    return str(city).strip()
+    return ''
+
+
+def _ld_phone(items):
+    for item in items:
+        # Check for telephone field
+        phone = item.get('telephone') or item.get('phone')
+        if phone:
+            return str(phone).strip()
+        # Check in contactPoint
+        contact = item.get('contactPoint')
+        if isinstance(contact, dict):
+            phone = contact.get('telephone')
+            if phone:
+                return str(phone).strip()
+    return ''
+
+
+def scan_json_ld(text, need_city=True):
+    """
+    Single pass over the JSON-LD blocks; returns (city, phone), either may be ''.
+    Stops as soon as everything needed has been found.
+    """
+    city = ''
+    phone = ''
+    for match in LD_JSON_RE.finditer(text):
+        try:
+            items = _ld_items(match.group(1))
+        except Exception:
+            continue
+        if need_city and not city:
+            try:
+                city = _ld_city(items)
+            except Exception:
+                pass
+        if not phone:
+            try:
+                phone = _ld_phone(items)
+            except Exception:
+                pass
+        if phone and (city or not need_city):
+            break
+    return city, phone
+
+
+def city_from_dom(soup, text_lower):
+    # Microdata / Schema.org
+    if 'addresslocality' in text_lower:
+        city_tag = soup().find(attrs={"itemprop": "addressLocality"})
+        if city_tag:
+            city = city_tag.get_text(strip=True)
+            if city:
+                return city
+
+    # Common HTML classes
+    for cls, cls_re in zip(CITY_CLASSES, CITY_CLASS_RES):
+        if cls not in text_lower:
+            continue
+        tag = soup().find(class_=cls_re)
+        if tag:
+            val = tag.get_text(strip=True)
+            if len(val) < 30 and len(val) > 2:
+                return val
+
+    # Last Resort: Meta tags
+    if '<meta' in text_lower and ('city' in text_lower or 'location' in text_lower):
+        meta_city = soup().find('meta', attrs={'name': META_CITY_RE})
+        if meta_city:
+            return meta_city.get('content', '').strip()
+
+    return ''
+
+
+def phone_from_dom(soup, text_lower, tel=None):
+    # Microdata / schema.org
+    if 'telephone' in text_lower:
+        phone_tag = soup().find(attrs={"itemprop": "telephone"})
+        if phone_tag:
+            phone = phone_tag.get_text(strip=True)
+            if phone:
+                return phone
+
+    # tel: links (most reliable HTML pattern), as found by the scan
+    if tel:
+        return tel.replace('tel:', '').strip()
+
+    return ''
+
+
+def best_phone(phones):
+    """Pick from scan() phone candidates; prefer '+' numbers, then longer ones"""
+    # Deduplicate on the cleaned number, keeping the first formatting seen
+    unique_phones = []
+    unique_clean = set()
+    for p, p_clean in phones:
+        # Validate length (10-15 digits)
+        if len(p_clean) >= 10 and len(p_clean) <= 15:
+            if p_clean not in unique_clean:
+                unique_clean.add(p_clean)
+                unique_phones.append((p.strip(), p_clean))
+
+    if not unique_phones:
+        return ''
+    # Prioritize numbers with '+' (international format), then longer numbers
+    best = min(unique_phones, key=lambda phone: (
+        not phone[0].startswith('+'),
+        -(len(phone[1]) - phone[1].count('+'))
+    ))
+    return best[0]
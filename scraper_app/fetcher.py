@@ -0,0 +1,311 @@
+"""
+Concurrent page fetcher for candidate business sites.
+
+A whole SERP batch is fetched at once on an asyncio loop. Each response is
+handed to a callback as soon as it arrives, so extraction overlaps with the
+remaining downloads.
+
+The concurrency caps (SCRAPER_FETCH_CONCURRENCY overall, SCRAPER_FETCH_PER_HOST
+per host) belong to the process, not to a batch: fetch_page takes a slot from
+shared semaphores, so combinations, engines and contact crawls running at the
+same time stay within the same caps.
+
+Bodies are streamed: non-HTML content types are rejected from the headers,
+reading stops at SCRAPER_FETCH_MAX_BYTES (or the fetch timeout, whichever
+comes first), and an optional stop_when(text) check can end the download as
+soon as the part read so far has everything we need.
+
+Complete pages with validators are kept in the on-disk http_cache and
+revalidated with conditional requests next time. Host-level redirects
+(http -> https, example.com -> www.example.com) are remembered per host, so
+later fetches of that host go straight to where it redirects.
+"""
+import asyncio
+import codecs
+import concurrent.futures
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse, urlsplit, urlunsplit
+
+from django.conf import settings
+
+from . import http_cache, http_client, instrument, metrics
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Content types worth extracting from; a missing header is given the benefit of the doubt
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+
+CHUNK_SIZE = 16 * 1024
+STOP_CHECK_BYTES = 64 * 1024  # Run stop_when at most once per this many bytes read
+MAX_REDIRECT_ENTRIES = 10000
+
+_redirects = {}  # (scheme, netloc) -> (scheme, netloc) that origin last redirected to
+_redirects_lock = threading.Lock()
+
+_slots = (None, None)  # (limit, semaphore) shared by every fetch in the process
+_host_slots = {}       # host -> (limit, semaphore)
+_slots_lock = threading.Lock()
+
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.I)
+HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+
+
+def get_fetch_settings():
+    """Return (max_concurrency, per_host, timeout) from Django settings"""
+    return (
+        getattr(settings, 'SCRAPER_FETCH_CONCURRENCY', 16),
+        getattr(settings, 'SCRAPER_FETCH_PER_HOST', 2),
+        getattr(settings, 'SCRAPER_FETCH_TIMEOUT', 30),
+    )
+
+
+def get_download_settings():
+    """Return (max_bytes, early_stop) from Django settings"""
+    return (
+        getattr(settings, 'SCRAPER_FETCH_MAX_BYTES', 2 * 1024 * 1024),
+        getattr(settings, 'SCRAPER_FETCH_EARLY_STOP', False),
+    )
+
+
+class Page:
+    """
+    A downloaded page. Quacks like the parts of requests.Response that the
+    extractor uses (status_code, text, url, headers).
+    """
+
+    def __init__(self, url, status_code, text, headers, bytes_read, truncated=False, stopped_early=False, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.bytes_read = bytes_read
+        self.truncated = truncated
+        self.stopped_early = stopped_early
+        self.from_cache = from_cache  # True when a 304 let us reuse the stored body
+
+
+def is_html(content_type):
+    if not content_type:
+        return True
+    return content_type.split(';', 1)[0].strip().lower() in HTML_TYPES
+
+
+def _encoding(resp, head):
+    # Header charset first, then <meta charset>, else utf-8 (no chardet guessing on partial bodies).
+    # resp.encoding is not used: requests fills in ISO-8859-1 for any text/* without a charset
+    for name in (_header_charset(resp), _meta_charset(head)):
+        if name:
+            try:
+                return codecs.lookup(name).name
+            except LookupError:
+                pass
+    return 'utf-8'
+
+
+def _header_charset(resp):
+    match = HEADER_CHARSET_RE.search(resp.headers.get('Content-Type', ''))
+    return match.group(1) if match else None
+
+
+def _meta_charset(head):
+    match = META_CHARSET_RE.search(head[:2048])
+    return match.group(1).decode('ascii', 'ignore') if match else None
+
+
+def resolve_redirect(url):
+    """url moved to the origin its host is known to redirect to (unchanged if unknown)"""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    target = _redirects.get((parts.scheme, parts.netloc.lower()))
+    if target is None:
+        return url
+    return urlunsplit((target[0], target[1], parts.path, parts.query, parts.fragment))
+
+
+def remember_redirect(requested, final):
+    """Record a redirect if it only changed the scheme and/or host, not the page"""
+    try:
+        req, fin = urlsplit(requested), urlsplit(final)
+    except ValueError:
+        return
+    origin = (req.scheme, req.netloc.lower())
+    target = (fin.scheme, fin.netloc.lower())
+    if origin == target or (req.path or '/') != (fin.path or '/'):
+        return
+    with _redirects_lock:
+        if len(_redirects) >= MAX_REDIRECT_ENTRIES:
+            _redirects.clear()
+        _redirects[origin] = target
+
+
+def _semaphores(host):
+    """The process-wide (global, per-host) semaphores for host, resized if the settings changed"""
+    global _slots
+    max_concurrency, per_host, _ = get_fetch_settings()
+    with _slots_lock:
+        if _slots[0] != max_concurrency:
+            # Fetches already holding a slot release it on the old semaphore
+            _slots = (max_concurrency, threading.BoundedSemaphore(max_concurrency))
+        host_slots = _host_slots.get(host)
+        if host_slots is None or host_slots[0] != per_host:
+            if len(_host_slots) >= MAX_REDIRECT_ENTRIES:
+                _host_slots.clear()
+            host_slots = _host_slots[host] = (per_host, threading.BoundedSemaphore(per_host))
+        return _slots[1], host_slots[1]
+
+
+@contextmanager
+def fetch_slot(url):
+    """Hold one of the process's fetch slots for url's host, waiting for one if needed"""
+    global_slots, host_slots = _semaphores(urlparse(url).netloc.lower())
+    # Host slot first so a busy host never holds global slots while waiting
+    with host_slots, global_slots:
+        yield
+
+
+def fetch_page(url, timeout=None, max_bytes=None, stop_when=None):
+    """
+    Download one page as a Page, or None if it isn't HTML.
+
+    At most max_bytes are read and the download is abandoned once timeout
+    seconds have passed in total. stop_when(text) is called on the text read
+    so far every STOP_CHECK_BYTES; returning True ends the download early.
+    The download waits for a process-wide fetch slot first (fetch_slot).
+    Raises the underlying requests exception if the request itself fails.
+    """
+    outcome = 'error'
+    try:
+        with fetch_slot(resolve_redirect(url)), instrument.in_flight('fetch'), instrument.timed('fetch'):
+            page = _fetch_page(url, timeout, max_bytes, stop_when)
+        if page is None:
+            outcome = 'not_html'
+        else:
+            outcome = 'cached' if page.from_cache else str(page.status_code)
+        return page
+    finally:
+        metrics.inc('scraper_page_fetches_total', outcome=outcome)
+
+
+def _fetch_page(url, timeout, max_bytes, stop_when):
+    default_max_bytes, _ = get_download_settings()
+    max_bytes = max_bytes or default_max_bytes
+    timeout = timeout or get_fetch_settings()[2]
+    deadline = time.monotonic() + timeout
+
+    url = resolve_redirect(url)
+    cached = http_cache.load(url)
+    headers = dict(DEFAULT_HEADERS, **cached.validators) if cached else DEFAULT_HEADERS
+
+    resp = http_client.get(url, headers=headers, timeout=timeout, stream=True)
+    if resp.history:
+        remember_redirect(url, resp.url)
+    try:
+        if cached and resp.status_code == 304:
+            http_cache.touch(url, resp.headers)
+            return Page(cached.meta['url'], 200, cached.text, resp.headers, 0, from_cache=True)
+
+        content_type = resp.headers.get('Content-Type', '')
+        if not is_html(content_type):
+            print(f"  Skipping {url[:60]}: {content_type.split(';')[0]}")
+            return None
+
+        chunks = []
+        size = 0
+        next_check = STOP_CHECK_BYTES
+        truncated = stopped_early = False
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                truncated = True
+                break
+            if time.monotonic() > deadline:
+                print(f"  Download of {url[:60]} hit the {timeout}s limit after {size} bytes")
+                truncated = True
+                break
+            if stop_when and size >= next_check:
+                next_check = size + STOP_CHECK_BYTES
+                body = b''.join(chunks)
+                if stop_when(body.decode(_encoding(resp, body), errors='replace')):
+                    stopped_early = True
+                    break
+
+        body = b''.join(chunks)[:max_bytes]
+        text = body.decode(_encoding(resp, body), errors='replace')
+        if not truncated and not stopped_early:
+            http_cache.store(url, resp.url, resp.status_code, resp.headers, text)
+        return Page(resp.url, resp.status_code, text, resp.headers, len(body), truncated, stopped_early)
+    finally:
+        # Closing an unfinished stream drops the connection instead of draining it
+        resp.close()
+
+
+async def _fetch_one(url, loop, executor, host_sems, per_host, timeout, handler, stop_when):
+    host = urlparse(url).netloc.lower()
+    host_sem = host_sems.get(host)
+    if host_sem is None:
+        host_sem = host_sems[host] = asyncio.Semaphore(per_host)
+
+    # fetch_page enforces the caps; queueing a batch's own pages per host here keeps
+    # them from tying up executor threads that other hosts of the batch could use
+    async with host_sem:
+        started = time.monotonic()
+        try:
+            resp = await loop.run_in_executor(executor, fetch_page, url, timeout, None, stop_when)
+            error = None
+        except Exception as e:
+            resp = None
+            error = e
+        elapsed = time.monotonic() - started
+
+    if error:
+        print(f"  Fetch error for {url[:60]}: {error}")
+    if handler:
+        try:
+            handler(url, resp)
+        except Exception as e:
+            print(f"  Handler error for {url[:60]}: {e}")
+    return url, resp, elapsed
+
+
+async def _fetch_all(urls, handler, max_concurrency, per_host, timeout, stop_when):
+    loop = asyncio.get_running_loop()
+    host_sems = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        tasks = [
+            _fetch_one(url, loop, executor, host_sems, per_host, timeout, handler, stop_when)
+            for url in urls
+        ]
+        return await asyncio.gather(*tasks)
+
+
+def fetch_pages(urls, handler=None, max_concurrency=None, per_host=None, timeout=None, stop_when=None):
+    """
+    Fetch all URLs concurrently and return {url: Page or None}.
+
+    handler(url, page) is called on the event loop thread as each fetch
+    completes; page is None when the request failed or wasn't HTML.
+    stop_when is passed on to fetch_page().
+    """
+    default_concurrency, default_per_host, default_timeout = get_fetch_settings()
+    max_concurrency = max_concurrency or default_concurrency
+    per_host = per_host or default_per_host
+    timeout = timeout or default_timeout
+
+    # Preserve order but fetch each URL only once
+    unique_urls = list(dict.fromkeys(urls))
+    if not unique_urls:
+        return {}
+
+    started = time.monotonic()
+    results = asyncio.run(_fetch_all(unique_urls, handler, max_concurrency, per_host, timeout, stop_when))
+    slowest = max((elapsed for _, _, elapsed in results), default=0.0)
+    revalidated = sum(1 for _, resp, _ in results if resp is not None and resp.from_cache)
+    print(f"  Fetched {len(unique_urls)} pages in {time.monotonic() - started:.1f}s "
+          f"(slowest {slowest:.1f}s, {revalidated} unchanged since last visit)")
+    return {url: resp for url, resp, _ in results}
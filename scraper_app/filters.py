@@ -0,0 +1,86 @@
+"""
+The SERP result filters that decide which candidates are worth a visit.
+
+screen_result() is a pure function of one result and the blacklist matcher,
+so it can be benchmarked (see scraper_app.benchmarks) and reused without a
+scrape in progress. perform_scraping applies it to every SERP result before
+the duplicate-site check. The reasons are the ones recorded in skipped_items.
+"""
+from urllib.parse import urlparse
+
+REASON_NON_ENGLISH = 'Non-English content'
+REASON_NO_REVIEWS = 'No Google Reviews found'
+REASON_BLACKLISTED = 'Listing/Review site (blacklisted)'
+REASON_FORUM_LINK = 'Forum/Discussion thread (not a business)'
+REASON_FORUM_TITLE = 'Forum/Discussion content'
+REASON_FORUM_PATH = 'Forum URL path'
+REASON_RANKING = 'Ranking page (Top 10/Best of)'
+# Recorded after the visit, by perform_scraping
+REASON_NO_CONTACT = 'No contact info (email/phone)'
+REASON_WRONG_COUNTRY = 'Wrong country'
+
+# Skip forum posts, discussion threads, and non-business URLs
+FORUM_KEYWORDS = (
+    'forum', 'thread', 'topic', 'discussion', 'post', 'comment',
+    'reddit.com', 'quora.com', 'stackoverflow', 'answers.yahoo',
+    '/forum/', '/thread/', '/topic/', '/discussion/', '/post/',
+    'lawstudents', 'studentroom', 'thestudentroom',
+    'wiki', 'wikipedia', 'fandom', 'wikia'
+)
+TITLE_FORUM_KEYWORDS = ('forum', 'discussion', 'thread', 'post', 'comment', 'question', 'answer')
+BAD_PATH_SEGMENTS = ('/forum/', '/thread/', '/topic/', '/discussion/', '/post/', '/questions/', '/answers/')
+
+# "Top X" / "Best of" ranking pages
+RANKING_KEYWORDS = (
+    'top 10', 'top 5', 'top 20', 'top 30', 'top 50', 'top 100',
+    'top ten', 'top five', 'top twenty',
+    'best 10', 'best 5', 'best 20', 'best of', 'best in',
+    'top rated', 'highest rated', 'top-rated',
+    '10 best', '5 best', '20 best', '30 best',
+    'rankings', 'ranked', 'list of', 'directory of',
+    'best lawyers', 'best doctors', 'best clinics', 'best firms',
+    'best restaurants', 'best gyms', 'best services',
+    'top lawyers', 'top doctors', 'top clinics', 'top firms'
+)
+
+
+def screen_result(item, matcher):
+    """
+    Run one SERP result through the filters. Returns None when it passes,
+    else its skipped_items entry ({'url', 'reason'} and 'rule' for blacklist hits).
+    """
+    link = item['link'].lower()
+    title = item.get('title', '').lower()
+
+    def skip(reason, **extra):
+        return {'url': item['link'][:80], 'reason': reason, **extra}
+
+    # Skip non-English titles
+    non_english_chars = sum(1 for c in title if ord(c) > 127)
+    if non_english_chars > len(title) * 0.3:
+        return skip(REASON_NON_ENGLISH)
+
+    # Skip businesses without Google Reviews
+    if not item.get('has_reviews', False):
+        return skip(REASON_NO_REVIEWS)
+
+    # Skip blacklisted domains (listing sites)
+    blacklist_match = matcher.match(link)
+    if blacklist_match:
+        return skip(REASON_BLACKLISTED, rule=blacklist_match.rule)
+
+    if any(keyword in link for keyword in FORUM_KEYWORDS):
+        return skip(REASON_FORUM_LINK)
+
+    if any(keyword in title for keyword in TITLE_FORUM_KEYWORDS):
+        return skip(REASON_FORUM_TITLE)
+
+    # Skip if URL path contains forum-like segments
+    path = urlparse(item['link']).path.lower()
+    if any(segment in path for segment in BAD_PATH_SEGMENTS):
+        return skip(REASON_FORUM_PATH)
+
+    if any(keyword in title for keyword in RANKING_KEYWORDS):
+        return skip(REASON_RANKING)
+
+    return None
@@ -0,0 +1,193 @@
+"""
+On-disk HTTP cache for business site fetches.
+
+Pages that came back with an ETag or Last-Modified header are stored
+(zlib-compressed) under SCRAPER_HTTP_CACHE_DIR, one file per URL. The next
+fetch of the same URL sends If-None-Match / If-Modified-Since, and a 304
+reuses the stored body, so repeat scrapes of a category/city mostly cost
+304s instead of full downloads.
+
+Entries neither stored nor revalidated by a 304 within SCRAPER_HTTP_CACHE_TTL
+are dropped instead of revalidated,
+and once the directory grows past SCRAPER_HTTP_CACHE_MAX_BYTES the least
+recently used entries are evicted. Setting SCRAPER_HTTP_CACHE_DIR to None
+turns the cache off.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+PRUNE_EVERY = 50  # Check the directory size once per this many writes
+PRUNE_TO = 0.9  # Evict down to this fraction of the size limit
+
+_lock = threading.Lock()
+_writes = 0
+
+
+def get_cache_settings():
+    """Return (directory or None, ttl seconds, max bytes) from Django settings"""
+    return (
+        getattr(settings, 'SCRAPER_HTTP_CACHE_DIR', None),
+        getattr(settings, 'SCRAPER_HTTP_CACHE_TTL', 7 * 24 * 60 * 60),
+        getattr(settings, 'SCRAPER_HTTP_CACHE_MAX_BYTES', 200 * 1024 * 1024),
+    )
+
+
+def _path(directory, url):
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    # Two-level fan-out keeps directories small
+    return os.path.join(directory, digest[:2], digest + '.page')
+
+
+class CachedPage:
+    """A stored page: validators, a few headers and the decoded text"""
+
+    def __init__(self, meta, text):
+        self.meta = meta
+        self.text = text
+
+    @property
+    def validators(self):
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+
+def load(url):
+    """Stored page for url, or None if missing, expired or unreadable"""
+    directory, ttl, _ = get_cache_settings()
+    if not directory:
+        return None
+    path = _path(directory, url)
+    try:
+        with open(path, 'rb') as f:
+            meta = json.loads(f.readline())
+            if time.time() - meta['stored_at'] > ttl:
+                raise ValueError('expired')
+            text = zlib.decompress(f.read()).decode('utf-8')
+    except FileNotFoundError:
+        return None
+    except Exception:
+        _remove(path)
+        return None
+    return CachedPage(meta, text)
+
+
+def touch(url, headers=None):
+    """
+    Restart an entry's TTL after a 304 revalidated it, taking any new ETag or
+    Last-Modified from the 304's headers. The rewrite also marks the entry
+    as just used, so eviction keeps it.
+    """
+    directory, _, _ = get_cache_settings()
+    if not directory:
+        return False
+    path = _path(directory, url)
+    try:
+        with open(path, 'rb') as f:
+            meta = json.loads(f.readline())
+            payload = f.read()
+    except (OSError, ValueError):
+        return False
+
+    meta['stored_at'] = time.time()
+    headers = headers or {}
+    if headers.get('ETag'):
+        meta['etag'] = headers['ETag']
+    if headers.get('Last-Modified'):
+        meta['last_modified'] = headers['Last-Modified']
+    return _write(url, path, meta, payload)
+
+
+def store(url, final_url, status_code, headers, text):
+    """Store a 200 response that carries an ETag or Last-Modified validator"""
+    directory, _, max_bytes = get_cache_settings()
+    etag = headers.get('ETag')
+    last_modified = headers.get('Last-Modified')
+    if not directory or status_code != 200 or not (etag or last_modified):
+        return False
+
+    meta = {
+        'url': final_url,
+        'etag': etag,
+        'last_modified': last_modified,
+        'content_type': headers.get('Content-Type', ''),
+        'stored_at': time.time(),
+    }
+    if not _write(url, _path(directory, url), meta, zlib.compress(text.encode('utf-8'), 6)):
+        return False
+
+    global _writes
+    with _lock:
+        _writes += 1
+        due = _writes % PRUNE_EVERY == 1
+    if due:
+        prune(max_bytes)
+    return True
+
+
+def _write(url, path, meta, payload):
+    # Written to a temporary file and renamed, so readers never see half an entry
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps(meta).encode('utf-8') + b'\n')
+            f.write(payload)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"  HTTP cache write failed for {url[:60]}: {e}")
+        _remove(tmp)
+        return False
+    return True
+
+
+def prune(max_bytes=None):
+    """Evict least recently used entries until the cache fits in max_bytes; returns files removed"""
+    directory, _, default_max = get_cache_settings()
+    max_bytes = max_bytes or default_max
+    if not directory or not os.path.isdir(directory):
+        return 0
+
+    entries = []
+    total = 0
+    for sub in os.scandir(directory):
+        if not sub.is_dir():
+            continue
+        for entry in os.scandir(sub.path):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    target = max_bytes * PRUNE_TO
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        if _remove(path):
+            total -= size
+            removed += 1
+    print(f"  HTTP cache: evicted {removed} pages")
+    return removed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
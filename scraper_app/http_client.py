@@ -0,0 +1,72 @@
+"""
+Process-wide pooled HTTP client.
+
+Every outbound request (search engines and business sites) goes through one
+shared requests.Session so TCP/TLS connections are kept alive and reused
+across queries, combinations and jobs handled by the same process.
+"""
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_pool_settings():
+    """Return (pool_connections, pool_maxsize, host_pools) from Django settings"""
+    return (
+        getattr(settings, 'SCRAPER_HTTP_POOL_CONNECTIONS', 100),
+        getattr(settings, 'SCRAPER_HTTP_POOL_MAXSIZE', 10),
+        getattr(settings, 'SCRAPER_HTTP_HOST_POOLS', {}),
+    )
+
+
+def _build_session():
+    pool_connections, pool_maxsize, host_pools = get_pool_settings()
+    session = requests.Session()
+
+    # Requests used to be one-shot, so never carry cookies from one query to the next
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    # pool_connections is how many per-host pools are kept, pool_maxsize how many
+    # idle keep-alive connections each of those pools holds on to
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    # Dedicated, larger pools for hosts we hit constantly (search engines)
+    for prefix, maxsize in host_pools.items():
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=maxsize))
+
+    # Optional forward proxies by scheme, e.g. {'http': 'http://127.0.0.1:8899'}
+    session.proxies.update(getattr(settings, 'SCRAPER_HTTP_PROXIES', None) or {})
+
+    return session
+
+
+def get_session():
+    """Return the shared session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def reset_session():
+    """Close all pooled connections; the next get_session() builds a fresh pool"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def get(url, **kwargs):
+    """requests.get through the shared connection pool"""
+    return get_session().get(url, **kwargs)
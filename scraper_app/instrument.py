@@ -0,0 +1,84 @@
+"""
+Process-wide stage timing for the scraping pipeline.
+
+The pipeline marks its stages with timed('fetch'), timed('extract'), ...
+and every call adds to that stage's count and total seconds. Stages run on
+many threads at once, so totals are thread-seconds and can exceed wall
+time; nested stages (a crawl's own fetches) are counted in both.
+in_flight('fetch') additionally tracks how many calls are running right now
+and the highest that has been seen.
+
+The loadtest command reads snapshot() to report time per stage, and every
+call also goes into the scraper_stage_seconds histogram (scraper_app.metrics)
+served at /metrics. Recording is a couple of locked additions, cheap enough
+to stay on in production.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from . import metrics
+
+_lock = threading.Lock()
+_stages = {}    # stage -> [calls, seconds]
+_running = {}   # name -> calls in flight now
+_peak = {}      # name -> most calls in flight at once
+
+
+def record(stage, seconds):
+    """Add one call of seconds to stage"""
+    with _lock:
+        totals = _stages.get(stage)
+        if totals is None:
+            totals = _stages[stage] = [0, 0.0]
+        totals[0] += 1
+        totals[1] += seconds
+    metrics.observe('scraper_stage_seconds', seconds, stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    """Time the block as one call of stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def in_flight(name):
+    """Count the block as running while it runs"""
+    with _lock:
+        running = _running[name] = _running.get(name, 0) + 1
+        if running > _peak.get(name, 0):
+            _peak[name] = running
+    try:
+        yield
+    finally:
+        with _lock:
+            _running[name] -= 1
+
+
+def running(name):
+    """Calls of name in flight right now"""
+    with _lock:
+        return _running.get(name, 0)
+
+
+def snapshot():
+    """{'stages': {stage: (calls, seconds)}, 'running': {...}, 'peak': {...}}"""
+    with _lock:
+        return {
+            'stages': {stage: tuple(totals) for stage, totals in _stages.items()},
+            'running': dict(_running),
+            'peak': dict(_peak),
+        }
+
+
+def reset():
+    """Forget all totals and peaks (calls still running keep being counted)"""
+    with _lock:
+        _stages.clear()
+        _peak.clear()
+        _peak.update(_running)
@@ -0,0 +1,416 @@
+"""
+Background scrape jobs.
+
+The scrape_data view only queues a ScrapeJob. A run_scrape_worker process
+that picks it up splits it into WorkUnits (one per category x city
+combination, or a single unit for a URL scrape). Any number of worker
+processes, on any number of hosts sharing the database, then claim units
+through leases:
+
+    - claiming a unit sets its lease to SCRAPER_LEASE_SECONDS from now
+    - while the unit runs, a heartbeat thread renews the lease every
+      SCRAPER_HEARTBEAT_INTERVAL seconds
+    - a unit whose lease expired (its worker crashed or lost the database)
+      is taken over by the next worker asking for work, up to
+      SCRAPER_UNIT_MAX_ATTEMPTS claims
+
+Leads go straight into the shared ScrapedData table as each unit runs. The
+worker that finishes a job's last unit combines the units' results into
+ScrapeResult rows and marks the job done.
+"""
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .leads import LeadBuffer
+from .models import ScrapeJob, ScrapeResult, WorkUnit
+from .progress import ProgressChannel, reset_counters
+from .views import perform_scraping, scrape_from_url
+
+
+def get_lease_settings():
+    """Return (lease seconds, heartbeat interval, max attempts) from Django settings"""
+    return (
+        getattr(settings, 'SCRAPER_LEASE_SECONDS', 120),
+        getattr(settings, 'SCRAPER_HEARTBEAT_INTERVAL', 30),
+        getattr(settings, 'SCRAPER_UNIT_MAX_ATTEMPTS', 3),
+    )
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically claim the oldest queued job for this worker.
+    Returns the claimed job, or None if the queue is empty.
+    """
+    queued_ids = ScrapeJob.objects.filter(status=ScrapeJob.STATUS_QUEUED).order_by('created_at').values_list('id', flat=True)[:10]
+    for job_id in queued_ids:
+        # Conditional update so two workers can never claim the same job
+        claimed = ScrapeJob.objects.filter(id=job_id, status=ScrapeJob.STATUS_QUEUED).update(
+            status=ScrapeJob.STATUS_RUNNING,
+            worker=worker_id,
+            started_at=timezone.now(),
+        )
+        if claimed:
+            return ScrapeJob.objects.get(id=job_id)
+    return None
+
+
+def plan_next_job(worker_id):
+    """Claim the oldest queued job and split it into work units; returns the job or None"""
+    # Cheap check first, so idle workers don't open write transactions on every poll
+    if not ScrapeJob.objects.filter(status=ScrapeJob.STATUS_QUEUED).exists():
+        return None
+    # Claim and split in one transaction so a crash can't leave a running job without units
+    with transaction.atomic():
+        job = claim_next_job(worker_id)
+        if job is not None:
+            split_job(job)
+    return job
+
+
+def split_job(job):
+    """(Re)create a job's work units and reset its progress"""
+    categories = job.categories
+    cities = job.cities or ['']
+    if job.url:
+        # For URL scraping, use first category and city
+        combinations = [(categories[0] if categories else '', cities[0])]
+    else:
+        combinations = [(category, city) for category in categories for city in cities]
+
+    WorkUnit.objects.filter(job=job).delete()
+    WorkUnit.objects.bulk_create([
+        WorkUnit(job=job, position=i, category=category, city=city)
+        for i, (category, city) in enumerate(combinations, 1)
+    ])
+    update_progress(
+        job, current=0, total=len(combinations), saved_count=0, skipped_count=0, duplicate_count=0,
+        result_count=0, skipped_items=[], error='', finished_at=None,
+        status_message=f'Split into {len(combinations)} work unit(s)',
+    )
+    reset_counters(job.pk, current=0, saved=0, skipped=0, pages_visited=0)
+    print(f"Job {job.pk}: split into {len(combinations)} work unit(s)")
+
+
+def claim_next_unit(worker_id, job_id=None):
+    """
+    Lease the next pending unit, or take over one whose lease has expired.
+    Only units of job_id are considered when it is given; load test units
+    are only ever claimed that way.
+    Returns the leased unit, or None if there is no work.
+    """
+    lease_seconds, _, max_attempts = get_lease_settings()
+    now = timezone.now()
+    candidates = WorkUnit.objects.filter(
+        Q(status=WorkUnit.STATUS_PENDING) | Q(status=WorkUnit.STATUS_LEASED, lease_expires_at__lt=now)
+    )
+    if job_id is not None:
+        candidates = candidates.filter(job_id=job_id)
+    else:
+        # Their settings overrides only exist in the loadtest process
+        candidates = candidates.filter(job__is_load_test=False)
+    candidates = candidates.order_by('job_id', 'position').values_list('id', 'job_id', 'status', 'worker', 'attempts')[:10]
+
+    for unit_id, job_id, status, old_worker, attempts in candidates:
+        if attempts >= max_attempts:
+            gave_up = WorkUnit.objects.filter(id=unit_id, status=status, attempts=attempts).update(
+                status=WorkUnit.STATUS_FAILED,
+                error=f'Gave up after {attempts} attempts (last worker: {old_worker or "none"})',
+                lease_expires_at=None,
+                finished_at=now,
+            )
+            if gave_up:
+                finish_job_if_complete(job_id)
+            continue
+
+        # attempts changes on every claim, so it doubles as the compare-and-swap token
+        claimed = WorkUnit.objects.filter(id=unit_id, status=status, attempts=attempts).update(
+            status=WorkUnit.STATUS_LEASED,
+            worker=worker_id,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            heartbeat_at=now,
+            attempts=attempts + 1,
+        )
+        if claimed:
+            if status == WorkUnit.STATUS_LEASED:
+                print(f"Taking over job {job_id} unit {unit_id} from {old_worker} (lease expired)")
+            return WorkUnit.objects.select_related('job', 'job__client').get(id=unit_id)
+    return None
+
+
+def renew_lease(unit, worker_id):
+    """Extend a unit's lease; False if the lease was lost to another worker"""
+    lease_seconds, _, _ = get_lease_settings()
+    now = timezone.now()
+    return bool(WorkUnit.objects.filter(pk=unit.pk, worker=worker_id, status=WorkUnit.STATUS_LEASED).update(
+        lease_expires_at=now + timedelta(seconds=lease_seconds),
+        heartbeat_at=now,
+    ))
+
+
+class LeaseHeartbeat(threading.Thread):
+    """Keeps a unit's lease alive while its worker is busy with it"""
+
+    def __init__(self, unit, worker_id):
+        super().__init__(name=f'heartbeat-{unit.pk}', daemon=True)
+        self.unit = unit
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        _, interval, _ = get_lease_settings()
+        try:
+            while not self.stopped.wait(interval):
+                try:
+                    if not renew_lease(self.unit, self.worker_id):
+                        self.lost = True
+                        print(f"Lost the lease on job {self.unit.job_id} unit {self.unit.pk}")
+                        return
+                except Exception as e:
+                    # The lease may still expire; keep trying until the unit is done
+                    print(f"Heartbeat for unit {self.unit.pk} failed: {e}")
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def update_progress(job, **fields):
+    """Write progress fields for a job without touching the rest of the row"""
+    for name, value in fields.items():
+        setattr(job, name, value)
+    ScrapeJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_unit(unit, worker_id):
+    """Run a leased unit, record its outcome and finish the job if it was the last one"""
+    job = unit.job
+    where = f'{unit.category} in {unit.city or "all cities"}'
+    # Other units of the job publish to the same counters; the job row seeds them if nobody has yet
+    channel = ProgressChannel(
+        job.pk, counters={'current': job.current, 'saved': job.saved_count, 'skipped': job.skipped_count},
+        state=ScrapeJob.STATUS_RUNNING, total=job.total,
+        current_category=unit.category, current_city=unit.city or 'All cities',
+    )
+    status = f'Scraping {job.url}...' if job.url else f'Searching for {where}...'
+    update_progress(job, current_category=unit.category, current_city=unit.city or 'All cities', status_message=status)
+    channel.publish(stage='fetch' if job.url else 'search', status=status)
+
+    print(f"\n{'='*60}")
+    print(f"PROGRESS: Job {job.pk} unit {unit.position}/{job.total} (attempt {unit.attempts}) on {worker_id}")
+    print(f"Category: '{unit.category}', City: '{unit.city}', Country: '{job.country}'")
+    print(f"{'='*60}")
+
+    heartbeat = LeaseHeartbeat(unit, worker_id)
+    heartbeat.start()
+    try:
+        # One write buffer per unit; leaving the block flushes whatever is still pending
+        with LeadBuffer() as leads:
+            results, dup_count, saved_count, skipped_items = _scrape_unit(unit, job, leads, channel)
+    except Exception as e:
+        traceback.print_exc()
+        heartbeat.stop()
+        release_unit(unit, worker_id, str(e))
+        finish_job_if_complete(job.pk)
+        return unit
+    heartbeat.stop()
+
+    completed = WorkUnit.objects.filter(pk=unit.pk, worker=worker_id, status=WorkUnit.STATUS_LEASED).update(
+        status=WorkUnit.STATUS_DONE,
+        results=results,
+        skipped_items=skipped_items,
+        saved_count=saved_count,
+        duplicate_count=dup_count,
+        lease_expires_at=None,
+        error='',
+        finished_at=timezone.now(),
+    )
+    if not completed:
+        # Another worker took the unit over; its leads are saved (upserts are idempotent),
+        # but the results belong to whichever run completes the unit
+        print(f"✗ Job {job.pk} unit {unit.position} was taken over, discarding its results")
+        return unit
+
+    unit.status = WorkUnit.STATUS_DONE
+    ScrapeJob.objects.filter(pk=job.pk).update(
+        current=F('current') + 1,
+        saved_count=F('saved_count') + saved_count,
+        skipped_count=F('skipped_count') + len(skipped_items),
+        duplicate_count=F('duplicate_count') + dup_count,
+    )
+    job.refresh_from_db(fields=['current', 'saved_count', 'skipped_count'])
+    # saved/skipped were already counted batch by batch while the unit ran
+    channel.increment(stage='search', status=f'Finished {where} ({job.current}/{job.total})', current=1)
+    print(f"✓ Got {len(results)} results, saved {saved_count} to database for {where}")
+    finish_job_if_complete(job.pk)
+    return unit
+
+
+def release_unit(unit, worker_id, error):
+    """Hand a failed unit back to the queue, or fail it once it has used up its attempts"""
+    _, _, max_attempts = get_lease_settings()
+    retry = unit.attempts < max_attempts
+    WorkUnit.objects.filter(pk=unit.pk, worker=worker_id, status=WorkUnit.STATUS_LEASED).update(
+        status=WorkUnit.STATUS_PENDING if retry else WorkUnit.STATUS_FAILED,
+        lease_expires_at=None,
+        error=error,
+        finished_at=None if retry else timezone.now(),
+    )
+    unit.status = WorkUnit.STATUS_PENDING if retry else WorkUnit.STATUS_FAILED
+    print(f"✗ Job {unit.job_id} unit {unit.position} failed ({error}); {'will retry' if retry else 'giving up'}")
+
+
+def finish_job_if_complete(job_id):
+    """
+    Combine the units' results into ScrapeResult rows once no unit is pending
+    or leased. Only one worker wins the finished_at compare-and-swap, so this
+    is safe to call from every worker. The swap, the results and the final
+    status commit together: if any of it fails, finished_at is rolled back
+    and a later call (e.g. the worker's retry) can finish the job.
+    Returns the finished job or None.
+    """
+    if WorkUnit.objects.filter(job_id=job_id, status__in=[WorkUnit.STATUS_PENDING, WorkUnit.STATUS_LEASED]).exists():
+        return None
+    with transaction.atomic():
+        claimed = ScrapeJob.objects.filter(
+            pk=job_id, status=ScrapeJob.STATUS_RUNNING, finished_at__isnull=True
+        ).update(finished_at=timezone.now())
+        if not claimed:
+            return None
+
+        job = ScrapeJob.objects.get(pk=job_id)
+        units = list(job.units.order_by('position'))
+        done = [u for u in units if u.status == WorkUnit.STATUS_DONE]
+        failed = [u for u in units if u.status == WorkUnit.STATUS_FAILED]
+
+        final_results = [r for u in done for r in u.results]
+        all_skipped_items = [item for u in done for item in u.skipped_items]
+        total_saved = sum(u.saved_count for u in done)
+        total_dup_count = sum(u.duplicate_count for u in done)
+
+        save_results(job, final_results)
+        all_failed = bool(units) and len(failed) == len(units)
+        if all_failed:
+            update_progress(job, status=ScrapeJob.STATUS_FAILED, error=failed[0].error, status_message='Failed')
+        else:
+            update_progress(
+                job,
+                status=ScrapeJob.STATUS_DONE,
+                current=len(done),
+                result_count=len(final_results),
+                saved_count=total_saved,
+                duplicate_count=total_dup_count,
+                skipped_count=len(all_skipped_items),
+                skipped_items=all_skipped_items[:50],  # Limit to 50 items for display
+                error='; '.join(f'{u.category} in {u.city or "all cities"}: {u.error}' for u in failed),
+                status_message='Finished' if not failed else f'Finished ({len(failed)} unit(s) failed)',
+            )
+
+    # Published only once the job row says the same
+    channel = ProgressChannel(job.pk, total=job.total, current_category=job.current_category, current_city=job.current_city)
+    if all_failed:
+        channel.publish(stage='failed', status='Failed', state=ScrapeJob.STATUS_FAILED, message=job.error)
+        return job
+    channel.publish(
+        stage='done',
+        status=job.status_message,
+        state=ScrapeJob.STATUS_DONE,
+        current=job.current,
+        saved=total_saved,
+        skipped=len(all_skipped_items),
+        count=len(final_results),
+        skipped_duplicates=total_dup_count,
+        skipped_items=job.skipped_items,
+    )
+    print(f"Job {job.pk} finished: {len(final_results)} results from {len(done)} unit(s), {len(failed)} failed")
+    return job
+
+
+def save_results(job, results):
+    """Store a job's display results as ScrapeResult rows, replacing any earlier run"""
+    ScrapeResult.objects.filter(job=job).delete()
+    ScrapeResult.objects.bulk_create([
+        ScrapeResult(
+            job=job,
+            position=i,
+            client_name=r.get('client') or '',
+            category=r.get('category') or '',
+            city=r.get('city') or '',
+            country=r.get('country') or '',
+            title=r.get('title') or '',
+            link=r.get('link') or '',
+            snippet=r.get('snippet') or '',
+            email=(r.get('email') or '').strip(),
+            phone=(r.get('phone') or '').strip(),
+            is_elfsight=bool(r.get('is_elfsight')),
+            is_verified=bool(r.get('is_verified')),
+        )
+        for i, r in enumerate(results, 1)
+    ], batch_size=500)
+
+
+def _scrape_unit(unit, job, leads, channel):
+    """Scrape one unit; returns (display results, duplicate count, saved count, skipped items)"""
+    client = job.client
+    client_name = client.name if client else ""
+    category = unit.category
+    city = unit.city
+    country = job.country
+    url = job.url
+
+    print(f"DEBUG: Job {job.pk} unit {unit.position} - Category: '{category}', City: '{city}', Country: '{country}', URL: '{url}', Client: {client_name}")
+
+    skipped_items = []
+    # Check if URL is provided - if so, scrape directly from URL
+    if url:
+        print(f"DEBUG: URL scraping mode - passing category='{category}', city='{city}', country='{country}'")
+        raw_results, dup_count, saved_count = scrape_from_url(url, category, city, country, client, client_name, lead_buffer=leads)
+        print(f"DEBUG: scrape_from_url returned {len(raw_results)} results, saved {saved_count}")
+    else:
+        raw_results, dup_count, saved_count, skipped_items, found_urls = perform_scraping(
+            category, city, country, client, client_name, lead_buffer=leads, progress=channel
+        )
+
+    # For display purposes, prepare final results
+    final_results = []
+    for r in raw_results:
+        # Skip if filtered by country validation
+        if r.get('is_invalid_country'):
+            continue
+
+        email = (r.get('email') or '').strip()
+        phone = (r.get('phone') or '').strip()
+
+        # Skip leads with NO contact info
+        if not email and not phone:
+            continue
+
+        # Always use form data for display
+        if url:
+            # URL scraping - use form values
+            final_city = city
+            final_country = country
+            final_category = category
+        else:
+            # Search scraping - use form values from the loop
+            final_city = r.get('city', '')
+            final_country = r.get('country', '')
+            final_category = r.get('category', '')
+
+        r['client'] = client_name
+        r['category'] = final_category
+        r['city'] = final_city
+        r['country'] = final_country
+        r['is_verified'] = False
+
+        final_results.append(r)
+
+    return final_results, dup_count, saved_count, skipped_items
@@ -0,0 +1,131 @@
+"""
+Pre-fetch lookup of leads we already have.
+
+Before a SERP batch is fetched, perform_scraping asks find_fresh() which
+candidate links are already in ScrapedData with contact info scraped within
+the last SCRAPER_LEAD_FRESHNESS_DAYS days. Those sites are not fetched again;
+their stored email/phone are reused instead. Only leads stored for the same
+country count: the country check happens on the fetched page, and a reused
+lead is saved under the current search's country.
+
+All candidates of a batch are looked up in one query, and most batches need
+no query at all: an in-memory Bloom filter of every host in ScrapedData says
+when none of the candidates' hosts can be known. The filter is rebuilt every
+SCRAPER_KNOWN_HOSTS_REFRESH seconds and hosts written by this process are
+added to it right away (see leads.LeadBuffer). A false positive only costs
+one query, and a host added by another worker since the last rebuild only
+costs a fetch.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ScrapedData
+from .normalize import normalize_link
+
+_lock = threading.Lock()
+_known_hosts = None
+_built_at = 0.0
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: two 64-bit halves of one digest give all k positions
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+def host_of(link_key):
+    """Host part of a normalize_link() key"""
+    return link_key.split('/', 1)[0].split('?', 1)[0]
+
+
+def get_freshness_window():
+    """Freshness window as a timedelta, or None when the check is disabled"""
+    days = getattr(settings, 'SCRAPER_LEAD_FRESHNESS_DAYS', 14)
+    return timedelta(days=days) if days else None
+
+
+def _build_known_hosts():
+    hosts = set()
+    for key in ScrapedData.objects.exclude(link_key=None).values_list('link_key', flat=True).iterator(chunk_size=5000):
+        hosts.add(host_of(key))
+    # Room to grow until the next rebuild
+    bloom = BloomFilter(len(hosts) * 2 + 10000)
+    for host in hosts:
+        bloom.add(host)
+    print(f"Known-hosts filter built from {len(hosts)} hosts")
+    return bloom
+
+
+def get_known_hosts():
+    """This process's Bloom filter of hosts in ScrapedData, rebuilt when stale"""
+    global _known_hosts, _built_at
+    refresh = getattr(settings, 'SCRAPER_KNOWN_HOSTS_REFRESH', 600)
+    with _lock:
+        if _known_hosts is None or time.monotonic() - _built_at > refresh:
+            _known_hosts = _build_known_hosts()
+            _built_at = time.monotonic()
+        return _known_hosts
+
+
+def note_keys(link_keys):
+    """Add the hosts of freshly written leads to the filter (if it has been built)"""
+    with _lock:
+        if _known_hosts is not None:
+            for key in link_keys:
+                _known_hosts.add(host_of(key))
+
+
+def find_fresh(links, country):
+    """
+    Map each of links that has fresh contact info in ScrapedData, stored for
+    country, to its stored fields {'email', 'phone', 'is_elfsight', 'scraped_at'}.
+    """
+    window = get_freshness_window()
+    if not window or not links:
+        return {}
+
+    keys = {}
+    known = get_known_hosts()
+    for link in links:
+        key = normalize_link(link)
+        if key and host_of(key) in known:
+            keys[key] = link
+    if not keys:
+        return {}
+
+    rows = ScrapedData.objects.filter(
+        Q(email__gt='') | Q(phone__gt=''),
+        link_key__in=list(keys),
+        country__iexact=(country or '').strip(),
+        scraped_at__gte=timezone.now() - window,
+    ).values('link_key', 'email', 'phone', 'is_elfsight', 'scraped_at')
+
+    return {
+        keys[row.pop('link_key')]: row
+        for row in rows
+    }
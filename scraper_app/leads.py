@@ -0,0 +1,114 @@
+"""
+Buffered writes of scraped leads to ScrapedData.
+
+Instead of one update_or_create() per accepted lead, a job collects leads in a
+LeadBuffer which upserts them in a single INSERT ... ON CONFLICT statement
+keyed on the normalized link (ScrapedData.link_key). A batch is flushed when
+it reaches SCRAPER_LEAD_BATCH_SIZE leads, when its oldest lead is
+SCRAPER_LEAD_FLUSH_INTERVAL seconds old, and when the buffer is closed.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import instrument, metrics
+from .known_leads import note_keys
+from .models import ScrapedData
+from .normalize import normalize_link
+
+# Fields written on every upsert (link_key is the conflict target)
+LEAD_FIELDS = [
+    'client', 'category', 'city', 'country', 'title', 'snippet',
+    'email', 'phone', 'is_elfsight', 'is_verified', 'scraped_at',
+]
+
+
+class LeadBuffer:
+    """Collects leads for one job and upserts them into ScrapedData in batches"""
+
+    def __init__(self, max_size=None, max_age=None):
+        self.max_size = max_size or getattr(settings, 'SCRAPER_LEAD_BATCH_SIZE', 100)
+        self.max_age = max_age if max_age is not None else getattr(settings, 'SCRAPER_LEAD_FLUSH_INTERVAL', 5.0)
+        self.pending = {}  # link_key -> (link, field values)
+        self.oldest = None
+        self.written = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+    def add(self, link, **fields):
+        """Queue one lead; flushes when the batch is full or too old"""
+        link = (link or '').strip()
+        key = normalize_link(link)
+        if not key:
+            return
+        # scraped_at is when the site was last fetched; leads reused without a fetch pass the old one
+        if fields.get('scraped_at') is None:
+            fields['scraped_at'] = timezone.now()
+        with self.lock:
+            # Leads for the same site collapse into one row; the latest one wins
+            self.pending[key] = (link, fields)
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            due = len(self.pending) >= self.max_size or time.monotonic() - self.oldest >= self.max_age
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all pending leads; returns the number of leads written. Raises
+        the bulk write's error when not a single lead could be saved.
+        """
+        with self.lock:
+            batch, self.pending, self.oldest = self.pending, {}, None
+            if not batch:
+                return 0
+            with instrument.timed('save'):
+                try:
+                    self._write_batch(batch)
+                    saved = len(batch)
+                    note_keys(batch)
+                except Exception as e:
+                    print(f"  Bulk lead write failed ({e}), retrying {len(batch)} leads one by one")
+                    saved = self._write_rows(batch)
+                    if not saved:
+                        # Nothing reached the database (e.g. it is locked); let the caller retry the work
+                        raise
+            self.written += saved
+            metrics.inc('scraper_leads_written_total', saved)
+        print(f"  ✓ Upserted {saved} of {len(batch)} leads to database")
+        return saved
+
+    def _write_batch(self, batch):
+        # One INSERT ... ON CONFLICT (link_key) DO UPDATE for the whole batch
+        objs = [
+            ScrapedData(link=link, link_key=key, **fields)
+            for key, (link, fields) in batch.items()
+        ]
+        ScrapedData.objects.bulk_create(
+            objs,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['link_key'],
+            update_fields=['link'] + LEAD_FIELDS,
+        )
+
+    def _write_rows(self, batch):
+        # Returns the number of rows saved; a bad row doesn't cost the rest of the batch
+        saved = 0
+        for key, (link, fields) in batch.items():
+            try:
+                ScrapedData.objects.update_or_create(link_key=key, defaults=dict(fields, link=link))
+            except Exception as e:
+                print(f"  Error saving to DB: {link[:60]} - {e}")
+                continue
+            saved += 1
+            note_keys([key])
+        return saved
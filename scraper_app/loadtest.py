@@ -0,0 +1,221 @@
+"""
+Local stand-ins for the internet, for load testing perform_scraping.
+
+start_farm() runs one threaded HTTP server that plays every remote party:
+
+    google.test / bing.test   Google- and Bing-shaped SERPs for any query;
+                              the organic results link to farm sites
+    site-N.test               N = 0 .. sites-1: synthetic business sites
+
+The server is used as the scraper's HTTP proxy (SCRAPER_HTTP_PROXIES), so
+the .test hosts never need DNS and nothing leaves the machine. Which sites
+a query returns, and how each site behaves, is derived from FarmConfig.seed,
+so runs are repeatable:
+
+    - every response waits latency_ms plus up to jitter_ms (serp_latency_ms
+      for the engines)
+    - error_rate of requests get a 500, throttle_rate a 429
+    - redirect_rate of sites answer 301 to their www. host
+    - large_rate of sites pad their landing page to large_kib
+    - a site's contact details are in JSON-LD, a tel: link, the text, only
+      on its /contact page, or nowhere
+
+The loadtest command starts a farm, points the engines at it and runs a
+category x city grid through the work-unit pipeline.
+"""
+import random
+import threading
+import time
+import zlib
+from collections import Counter, namedtuple
+from functools import lru_cache
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FarmConfig = namedtuple('FarmConfig', [
+    'sites', 'results_per_page', 'latency_ms', 'jitter_ms', 'serp_latency_ms',
+    'error_rate', 'throttle_rate', 'redirect_rate', 'large_rate', 'large_kib',
+    'country', 'seed',
+], defaults=(2000, 30, 80, 120, 300, 0.02, 0.01, 0.1, 0.02, 1536, 'Canada', 1))
+
+ENGINE_HOSTS = {'google': 'google.test', 'bing': 'bing.test'}
+
+WORDS = ('Maple', 'North', 'Summit', 'Harbour', 'Cedar', 'Prime', 'Union', 'Bright', 'Oak', 'River',
+         'Dental', 'Fitness', 'Law', 'Clinic', 'Auto', 'Realty', 'Studio', 'Care', 'Group', 'Partners')
+CONTACT_STYLES = ('json_ld', 'tel_link', 'text', 'contact_page', 'none')
+CONTACT_WEIGHTS = (25, 25, 20, 20, 10)
+
+
+class Site:
+    """How one farm site looks and behaves; fixed by the farm seed and its number"""
+
+    def __init__(self, config, number):
+        rng = random.Random(config.seed * 1000003 + number)
+        self.number = number
+        self.host = f'site-{number}.test'
+        self.name = ' '.join(rng.sample(WORDS, 3))
+        self.redirects = rng.random() < config.redirect_rate
+        self.large = rng.random() < config.large_rate
+        self.contact = rng.choices(CONTACT_STYLES, CONTACT_WEIGHTS)[0]
+        self.phone = f'+1 ({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}'
+        self.email = f'info@site-{number}.test'
+        self.paragraphs = [
+            ' '.join(rng.choice(WORDS).lower() for _ in range(40)) for _ in range(rng.randint(20, 60))
+        ]
+
+
+class SiteFarm:
+    """Content for the fake engines and sites, plus per-kind/status request counts"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.requests = Counter()  # (kind, status) -> count
+        self.bytes_sent = 0
+        self.site = lru_cache(maxsize=None)(self._site)
+        self.landing_page = lru_cache(maxsize=4096)(self._landing_page)
+
+    def _site(self, number):
+        return Site(self.config, number)
+
+    def count(self, kind, status, size):
+        with self.lock:
+            self.requests[kind, status] += 1
+            self.bytes_sent += size
+
+    def stats(self):
+        with self.lock:
+            return dict(self.requests), self.bytes_sent
+
+    def serp_sites(self, engine, query):
+        """The site numbers engine returns for query, always the same for the same query"""
+        rng = random.Random(zlib.crc32(f'{engine}:{query}'.encode('utf-8')) ^ self.config.seed)
+        count = min(self.config.results_per_page, self.config.sites)
+        return rng.sample(range(self.config.sites), count)
+
+    def serp_page(self, engine, query):
+        blocks = []
+        for rank, number in enumerate(self.serp_sites(engine, query)):
+            site = self.site(number)
+            link = f'http://{site.host}/' + ('?utm_source=serp' if rank % 4 == 0 else '')
+            title = escape(f'{site.name} - Reviews')
+            snippet = escape(f'Rated 4.{rank % 10} stars from {rank * 7 + 3} Google reviews. {site.name}, serving {self.config.country}.')
+            if engine == 'google':
+                blocks.append(
+                    f'<div class="g tF2Cxc"><div class="yuRUbf"><a href="{link}"><h3 class="LC20lb">{title}</h3></a></div>'
+                    f'<div class="VwiC3b">{snippet}</div></div>'
+                )
+            else:
+                blocks.append(
+                    f'<li class="b_algo"><h2><a href="{link}">{title}</a></h2>'
+                    f'<div class="b_caption"><p>{snippet}</p></div></li>'
+                )
+        if engine == 'google':
+            return f'<html><head><title>{escape(query)}</title></head><body><div id="search">{"".join(blocks)}</div></body></html>'
+        return f'<html><head><title>{escape(query)}</title></head><body><ol id="b_results">{"".join(blocks)}</ol></body></html>'
+
+    def _landing_page(self, number):
+        site = self.site(number)
+        contact = {
+            'json_ld': '<script type="application/ld+json">{"@type": "LocalBusiness", "telephone": "%s", '
+                       '"email": "%s"}</script><p>Email %s</p>' % (site.phone, site.email, site.email),
+            'tel_link': f'<a href="tel:{site.phone}">Call us</a> <a href="mailto:{site.email}">Email us</a>',
+            'text': f'<p>Call {site.phone} or write to {site.email}</p>',
+            'contact_page': '',
+            'none': '',
+        }[site.contact]
+        body = ''.join(f'<p>{p}</p>' for p in site.paragraphs)
+        if site.large:
+            # Keep the padding ahead of the contact details, like a page heavy with inline assets
+            filler = 'x' * 1000
+            body = '<!-- ' + ''.join(f'{filler}\n' for _ in range(self.config.large_kib)) + ' -->' + body
+        return (
+            f'<html><head><title>{escape(site.name)}</title></head><body><h1>{escape(site.name)}</h1>'
+            f'<nav><a href="/">Home</a> <a href="/services">Services</a> <a href="/contact">Contact us</a></nav>'
+            f'{body}{contact}<footer>{escape(site.name)}, {escape(self.config.country)}</footer></body></html>'
+        )
+
+    def contact_page(self, number):
+        site = self.site(number)
+        if site.contact == 'none':
+            return f'<html><body><h1>Contact</h1><p>Use the form below.</p><footer>{escape(self.config.country)}</footer></body></html>'
+        return (
+            f'<html><body><h1>Contact {escape(site.name)}</h1><p>Phone: {site.phone}</p>'
+            f'<p>Email: {site.email}</p><footer>{escape(self.config.country)}</footer></body></html>'
+        )
+
+
+class FarmHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'SiteFarm/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        farm = self.server.farm
+        config = farm.config
+        # As a proxy the request line carries the absolute URL
+        parts = urlsplit(self.path)
+        host = (parts.hostname or self.headers.get('Host', '').split(':')[0]).lower()
+        path = parts.path or '/'
+
+        engine = next((name for name, engine_host in ENGINE_HOSTS.items() if engine_host == host), None)
+        kind = 'serp' if engine else 'site'
+        latency = config.serp_latency_ms if engine else config.latency_ms
+        time.sleep((latency + random.uniform(0, config.jitter_ms)) / 1000)
+
+        roll = random.random()
+        if roll < config.throttle_rate:
+            return self.reply(kind, 429, '<html><body>Too many requests</body></html>', {'Retry-After': '5'})
+        if roll < config.throttle_rate + config.error_rate:
+            return self.reply(kind, 500, '<html><body>Internal error</body></html>')
+
+        if engine:
+            query = parse_qs(parts.query).get('q', [''])[0]
+            return self.reply(kind, 200, farm.serp_page(engine, query))
+
+        bare = host[4:] if host.startswith('www.') else host
+        if not (bare.startswith('site-') and bare.endswith('.test') and bare[5:-5].isdigit()):
+            return self.reply(kind, 404, '<html><body>Unknown host</body></html>')
+        number = int(bare[5:-5])
+        if number >= config.sites:
+            return self.reply(kind, 404, '<html><body>Unknown site</body></html>')
+
+        site = farm.site(number)
+        if site.redirects and not host.startswith('www.'):
+            return self.reply(kind, 301, '', {'Location': f'http://www.{host}{path}'})
+        if path.rstrip('/') == '/contact':
+            return self.reply(kind, 200, farm.contact_page(number))
+        if path == '/':
+            return self.reply(kind, 200, farm.landing_page(number))
+        return self.reply(kind, 404, '<html><body>Not found</body></html>')
+
+    def reply(self, kind, status, text, headers=None):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.farm.count(kind, status, len(body))
+
+
+class FarmServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many scraper threads connect at once through the proxy
+    request_queue_size = 256
+
+    def __init__(self, address, farm):
+        self.farm = farm
+        super().__init__(address, FarmHandler)
+
+
+def start_farm(config, port=0):
+    """Start a FarmServer for config on 127.0.0.1:port (0 picks a free port) in a daemon thread"""
+    server = FarmServer(('127.0.0.1', port), SiteFarm(config))
+    threading.Thread(target=server.serve_forever, name='site-farm', daemon=True).start()
+    return server
@@ -0,0 +1,155 @@
+import contextlib
+import io
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from scraper_app import http_client, instrument, loadtest
+from scraper_app.jobs import claim_next_unit, run_unit, split_job
+from scraper_app.models import ScrapedData, ScrapeJob
+
+
+class Command(BaseCommand):
+    help = ('Run a category x city grid against local fake search engines and a fake site farm, '
+            'and report leads per minute, fetch concurrency and time per stage. '
+            'Engine rate limits still come from the SearchEngine settings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', default='Dentist,Gym,Law Firm', help='Comma-separated categories')
+        parser.add_argument('--cities', default='Toronto,Ottawa,Calgary', help='Comma-separated cities')
+        parser.add_argument('--country', default='Canada')
+        parser.add_argument('--threads', type=int, default=None,
+                            help='Work units run at once (default: SCRAPER_COMBINATION_CONCURRENCY)')
+        parser.add_argument('--port', type=int, default=0, help='Port for the fake server (default: any free port)')
+        defaults = loadtest.FarmConfig()
+        parser.add_argument('--sites', type=int, default=defaults.sites, help='Business sites in the farm')
+        parser.add_argument('--results', type=int, default=defaults.results_per_page, help='Results per SERP')
+        parser.add_argument('--latency-ms', type=float, default=defaults.latency_ms, help='Base latency of site responses')
+        parser.add_argument('--jitter-ms', type=float, default=defaults.jitter_ms, help='Random extra latency, up to this much')
+        parser.add_argument('--serp-latency-ms', type=float, default=defaults.serp_latency_ms, help='Base latency of SERP responses')
+        parser.add_argument('--error-rate', type=float, default=defaults.error_rate, help='Share of requests answered with 500')
+        parser.add_argument('--throttle-rate', type=float, default=defaults.throttle_rate, help='Share of requests answered with 429')
+        parser.add_argument('--redirect-rate', type=float, default=defaults.redirect_rate, help='Share of sites redirecting to www.')
+        parser.add_argument('--large-rate', type=float, default=defaults.large_rate, help='Share of sites with a large landing page')
+        parser.add_argument('--large-kib', type=int, default=defaults.large_kib, help='Size of a large landing page')
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--keep', action='store_true', help='Keep the job and the fake leads it wrote')
+        parser.add_argument('--verbose', action='store_true', help="Show the scraper's own output")
+
+    def handle(self, *args, **options):
+        categories = [c.strip() for c in options['categories'].split(',') if c.strip()]
+        cities = [c.strip() for c in options['cities'].split(',') if c.strip()] or ['']
+        threads = options['threads'] or getattr(settings, 'SCRAPER_COMBINATION_CONCURRENCY', 4)
+        config = loadtest.FarmConfig(
+            sites=options['sites'], results_per_page=options['results'],
+            latency_ms=options['latency_ms'], jitter_ms=options['jitter_ms'], serp_latency_ms=options['serp_latency_ms'],
+            error_rate=options['error_rate'], throttle_rate=options['throttle_rate'],
+            redirect_rate=options['redirect_rate'], large_rate=options['large_rate'], large_kib=options['large_kib'],
+            country=options['country'], seed=options['seed'],
+        )
+
+        server = loadtest.start_farm(config, options['port'])
+        proxy = f'http://127.0.0.1:{server.server_port}'
+        self.stdout.write(f'Site farm with {config.sites} sites listening on {proxy}')
+
+        # Everything goes through the farm; caches and the freshness check would hide the work
+        overrides = override_settings(
+            SCRAPER_HTTP_PROXIES={'http': proxy},
+            SCRAPER_SEARCH_BASE_URLS={name: f'http://{host}' for name, host in loadtest.ENGINE_HOSTS.items()},
+            SCRAPER_SERP_CACHE_TTL=0,
+            SCRAPER_HTTP_CACHE_DIR=None,
+            SCRAPER_LEAD_FRESHNESS_DAYS=0,
+        )
+        job = None
+        with overrides:
+            http_client.reset_session()
+            try:
+                job = ScrapeJob.objects.create(
+                    categories=categories, cities=cities, country=options['country'],
+                    total=len(categories) * len(cities), status=ScrapeJob.STATUS_RUNNING,
+                    worker='loadtest', started_at=timezone.now(), status_message='Load test', is_load_test=True,
+                )
+                split_job(job)
+                self.stdout.write(f'Job {job.pk}: {job.total} unit(s) on {threads} thread(s)...')
+                elapsed, concurrency = self.run_grid(job, threads, options['verbose'])
+                self.report(job, elapsed, concurrency, server.farm)
+            finally:
+                http_client.reset_session()
+                server.shutdown()
+                server.server_close()
+                if job is not None and not options['keep']:
+                    self.clean_up(job)
+
+    def run_grid(self, job, threads, verbose):
+        """Run the job's units on threads; returns (seconds, sampled fetch concurrency)"""
+        instrument.reset()
+        samples = []
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.1):
+                samples.append(instrument.running('fetch'))
+
+        def work(worker_id):
+            try:
+                while True:
+                    unit = claim_next_unit(worker_id, job_id=job.pk)
+                    if unit is None:
+                        return
+                    run_unit(unit, worker_id)
+            finally:
+                connection.close()
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        runners = [threading.Thread(target=work, args=(f'loadtest/{n}',)) for n in range(1, threads + 1)]
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        started = time.monotonic()
+        with output:
+            sampler.start()
+            for runner in runners:
+                runner.start()
+            for runner in runners:
+                runner.join()
+        elapsed = time.monotonic() - started
+        done.set()
+        return elapsed, samples
+
+    def report(self, job, elapsed, concurrency, farm):
+        job.refresh_from_db()
+        units = list(job.units.all())
+        saved = sum(unit.saved_count for unit in units)
+        failed = sum(1 for unit in units if unit.status == unit.STATUS_FAILED)
+        snapshot = instrument.snapshot()
+        requests, bytes_sent = farm.stats()
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(units)} unit(s) in {elapsed:.1f}s ({failed} failed): {saved} leads, '
+            f'{saved / elapsed * 60:.1f} leads/minute'
+        ))
+        active = [n for n in concurrency if n]
+        self.stdout.write(
+            f'Fetch concurrency: peak {snapshot["peak"].get("fetch", 0)}, '
+            f'mean {sum(concurrency) / max(len(concurrency), 1):.1f} over the run, '
+            f'{sum(active) / max(len(active), 1):.1f} while fetching'
+        )
+
+        self.stdout.write('')
+        self.stdout.write(f"{'stage':<18} {'calls':>7} {'thread-s':>10} {'mean ms':>9}")
+        for stage, (calls, seconds) in sorted(snapshot['stages'].items(), key=lambda item: -item[1][1]):
+            self.stdout.write(f'{stage:<18} {calls:>7} {seconds:>10.2f} {seconds / calls * 1000:>9.1f}')
+
+        self.stdout.write('')
+        self.stdout.write(f'Farm traffic: {bytes_sent / 1024 / 1024:.1f} MiB sent')
+        for (kind, status), count in sorted(requests.items()):
+            self.stdout.write(f'  {kind:<5} {status}: {count}')
+
+    def clean_up(self, job):
+        leads, _ = ScrapedData.objects.filter(link_key__regex=r'^site-[0-9]+\.test').delete()
+        job.delete()
+        self.stdout.write(f'Removed the load test job and {leads} fake lead row(s) (use --keep to keep them)')
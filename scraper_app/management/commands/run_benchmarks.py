@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scraper_app import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Offline micro-benchmarks of SERP parsing, result filtering and contact extraction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', default='', help='Run only cases whose name contains this text (e.g. serp, extract)')
+        parser.add_argument('--rounds', type=int, default=50, help='Minimum timed calls per case')
+        parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds spent timing each case')
+        parser.add_argument('--baseline', default='', help='Baseline JSON file (default: SCRAPER_BENCHMARK_BASELINE)')
+        parser.add_argument('--save-baseline', action='store_true', help='Write these results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown / allocation growth against the baseline (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        baseline_path = options['baseline'] or benchmarks.get_baseline_path()
+        cases = [case for case in benchmarks.build_cases() if options['only'] in case.name]
+        if not cases:
+            raise CommandError(f"No benchmark cases match '{options['only']}'")
+
+        self.stdout.write(f"{'case':<48} {'ops/sec':>10} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9}")
+        results = {}
+        for case in cases:
+            stats = benchmarks.measure(case, rounds=options['rounds'], min_time=options['min_time'])
+            results[case.name] = stats
+            self.stdout.write(
+                f"{case.name:<48} {stats.ops_per_sec:>10.1f} {stats.p50_us / 1000:>9.3f} "
+                f"{stats.p99_us / 1000:>9.3f} {stats.peak_kib:>9.0f}"
+            )
+
+        if options['save_baseline']:
+            benchmarks.save_baseline(baseline_path, results)
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+
+        try:
+            baseline = benchmarks.load_baseline(baseline_path)
+        except FileNotFoundError:
+            self.stdout.write(f'No baseline at {baseline_path}; run with --save-baseline to create one')
+            return
+
+        regressions = benchmarks.compare(results, baseline, tolerance=options['tolerance'])
+        if regressions:
+            for name, message in regressions:
+                self.stdout.write(self.style.ERROR(f'  REGRESSION {name}: {message}'))
+            raise CommandError(f'{len(regressions)} regression(s) against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path} ({len(results)} cases)'))
@@ -0,0 +1,101 @@
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from scraper_app import metrics
+from scraper_app.jobs import claim_next_unit, finish_job_if_complete, plan_next_job, run_unit
+
+
+class Command(BaseCommand):
+    help = 'Process scrape jobs from the database; run any number of these, on any number of hosts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when there is no work left instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--worker-id', default='', help='Name recorded on claimed work (default: host:pid)')
+        parser.add_argument('--threads', type=int, default=None,
+                            help='Work units processed at once (default: SCRAPER_COMBINATION_CONCURRENCY)')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or f'{socket.gethostname()}:{os.getpid()}'
+        threads = options['threads'] or getattr(settings, 'SCRAPER_COMBINATION_CONCURRENCY', 4)
+
+        self.stdout.write(self.style.SUCCESS(f'Scrape worker {worker_id} started with {threads} thread(s)'))
+
+        # The web process serves these at /metrics
+        publisher = metrics.Publisher(worker_id)
+        publisher.start()
+        try:
+            if threads == 1:
+                self.work(worker_id, options)
+                return
+            # Each thread leases its own units, so give each one its own name
+            runners = [
+                threading.Thread(target=self.work, args=(f'{worker_id}/{n}', options), daemon=True)
+                for n in range(1, threads + 1)
+            ]
+            for runner in runners:
+                runner.start()
+            while any(runner.is_alive() for runner in runners):
+                for runner in runners:
+                    runner.join(timeout=0.5)
+        except KeyboardInterrupt:
+            # Leases of unfinished units expire and are taken over by other workers
+            self.stdout.write(self.style.WARNING(f'\nScrape worker {worker_id} stopped'))
+        finally:
+            publisher.stop()
+
+    def work(self, worker_id, options):
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    job = plan_next_job(worker_id)
+                    if job is not None:
+                        self.stdout.write(f'→ Queued job {job.pk} split into {job.total} unit(s)')
+                    unit = claim_next_unit(worker_id)
+                except DatabaseError as e:
+                    # Busy or unreachable database (e.g. SQLite locked by another worker); try again shortly
+                    self.stdout.write(self.style.WARNING(f'{worker_id}: database error while claiming work: {e}'))
+                    connection.close()
+                    time.sleep(options['poll_interval'])
+                    continue
+                if unit is None:
+                    if options['once']:
+                        self.stdout.write(f'{worker_id}: no work left')
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f'→ {worker_id} running job {unit.job_id} unit {unit.position}')
+                try:
+                    run_unit(unit, worker_id)
+                except Exception as e:
+                    # e.g. SQLite locked while recording the outcome; the unit's lease
+                    # expires and another worker (or this one) takes it over
+                    self.stdout.write(self.style.ERROR(
+                        f'{worker_id}: job {unit.job_id} unit {unit.position} interrupted: {e}'))
+                    connection.close()
+                    time.sleep(options['poll_interval'])
+                    self.retry_finish(worker_id, unit.job_id)
+                    continue
+
+                if unit.status == unit.STATUS_DONE:
+                    self.stdout.write(self.style.SUCCESS(f'✓ Job {unit.job_id} unit {unit.position} done'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'✗ Job {unit.job_id} unit {unit.position} {unit.status}'))
+        finally:
+            connection.close()
+
+    def retry_finish(self, worker_id, job_id):
+        # If the unit was recorded as done but finishing the job failed, no later unit would finish it
+        try:
+            finish_job_if_complete(job_id)
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'{worker_id}: could not finish job {job_id} yet: {e}'))
+            connection.close()
@@ -0,0 +1,194 @@
+"""
+Prometheus metrics for the scraping pipeline.
+
+Counters and latency histograms are kept per process, in memory:
+
+    scraper_stage_seconds{stage}               every instrument stage (search, parse,
+                                               fetch, extract, crawl, save, ...)
+    scraper_serp_requests_total{engine,outcome}
+    scraper_serp_request_seconds{engine}       search engine requests, cache hits excluded
+    scraper_page_fetches_total{outcome}        business and contact pages
+    scraper_leads_written_total                rows upserted by LeadBuffer
+    scraper_filter_rejections_total{reason}    same reasons as skipped_items
+
+The scraping happens in run_scrape_worker processes, not in the web process
+that serves /metrics. Each worker therefore publishes a snapshot of its
+metrics to the shared scraper cache every SCRAPER_METRICS_PUBLISH_INTERVAL
+seconds, and the metrics view renders every snapshot it finds, labelled
+with the worker's id. Snapshots of workers that stopped publishing expire.
+"""
+import bisect
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Upper bounds in seconds; wide enough for a 2ms parse and a 60s page download
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DESCRIPTIONS = {
+    'scraper_stage_seconds': ('histogram', 'Time spent per pipeline stage, per call'),
+    'scraper_serp_requests_total': ('counter', 'Search engine requests by engine and outcome (HTTP status, error or cached)'),
+    'scraper_serp_request_seconds': ('histogram', 'Search engine request latency, excluding rate limit waits'),
+    'scraper_page_fetches_total': ('counter', 'Page fetches by outcome (HTTP status, cached, not_html or error)'),
+    'scraper_leads_written_total': ('counter', 'Leads upserted to the database'),
+    'scraper_filter_rejections_total': ('counter', 'SERP results rejected, by skipped_items reason'),
+}
+
+PROCESS_ID = f'{socket.gethostname()}:{os.getpid()}'
+INDEX_KEY = 'scraper:metrics:workers'
+KEY_TEMPLATE = 'scraper:metrics:{worker}'
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts (last is +Inf), sum, count]
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add value to the counter name{labels}"""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Record one observation of seconds in the histogram name{labels}"""
+    key = (name, _labels(labels))
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        series[0][index] += 1
+        series[1] += seconds
+        series[2] += 1
+
+
+def snapshot():
+    """This process's metrics as plain data, for the cache and render()"""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'histograms': {key: (list(buckets), total, count) for key, (buckets, total, count) in _histograms.items()},
+        }
+
+
+# Sharing between processes
+
+def _cache():
+    return caches[getattr(settings, 'SCRAPER_CACHE_ALIAS', 'default')]
+
+
+def get_publish_settings():
+    """Return (publish interval, snapshot timeout) in seconds"""
+    interval = getattr(settings, 'SCRAPER_METRICS_PUBLISH_INTERVAL', 15)
+    # A few missed publishes are tolerated before a worker's metrics disappear
+    return interval, max(60, interval * 4)
+
+
+def publish(worker):
+    """Store this process's snapshot in the shared cache under worker"""
+    _, timeout = get_publish_settings()
+    cache = _cache()
+    cache.set(KEY_TEMPLATE.format(worker=worker), snapshot(), timeout=timeout)
+    # Not atomic across processes; a worker dropped by a racing write re-adds itself next time
+    now = time.time()
+    index = cache.get(INDEX_KEY) or {}
+    index = {name: seen for name, seen in index.items() if now - seen < timeout}
+    index[worker] = now
+    cache.set(INDEX_KEY, index, timeout=None)
+
+
+def collect():
+    """{worker: snapshot} for every worker that published recently, plus this process"""
+    snapshots = {}
+    try:
+        cache = _cache()
+        for worker in (cache.get(INDEX_KEY) or {}):
+            data = cache.get(KEY_TEMPLATE.format(worker=worker))
+            if data is not None:
+                snapshots[worker] = data
+    except Exception as e:
+        print(f"Metrics read failed: {e}")
+    # This process's own numbers are always current
+    snapshots[PROCESS_ID] = snapshot()
+    return snapshots
+
+
+class Publisher(threading.Thread):
+    """Publishes this process's metrics every interval until stopped"""
+
+    def __init__(self, worker):
+        super().__init__(name='metrics-publisher', daemon=True)
+        self.worker = worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval, _ = get_publish_settings()
+        while True:
+            try:
+                publish(self.worker)
+            except Exception as e:
+                print(f"Metrics publish failed: {e}")
+            if self.stopped.wait(interval):
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        try:
+            publish(self.worker)
+        except Exception as e:
+            print(f"Metrics publish failed: {e}")
+
+
+# Prometheus text format
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """Prometheus text exposition (format 0.0.4) of {worker: snapshot}"""
+    samples = {}  # name -> [lines]
+    for worker, data in sorted(snapshots.items()):
+        for (name, labels), value in sorted(data['counters'].items()):
+            labels = (('worker', worker),) + labels
+            samples.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for (name, labels), (buckets, total, count) in sorted(data['histograms'].items()):
+            labels = (('worker', worker),) + labels
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (float('inf'),), buckets):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    out = []
+    for name in sorted(samples):
+        kind, description = DESCRIPTIONS.get(name, ('untyped', name))
+        out.append(f'# HELP {name} {description}')
+        out.append(f'# TYPE {name} {kind}')
+        out.extend(samples[name])
+    return '\n'.join(out) + '\n'
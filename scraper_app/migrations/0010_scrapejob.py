@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0009_searchengine_delay_between_requests_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categories', models.JSONField(default=list)),
+                ('cities', models.JSONField(default=list)),
+                ('country', models.CharField(blank=True, max_length=255)),
+                ('url', models.URLField(blank=True, max_length=500)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=20)),
+                ('worker', models.CharField(blank=True, help_text='Worker that claimed this job', max_length=100)),
+                ('current', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('current_category', models.CharField(blank=True, max_length=255)),
+                ('current_city', models.CharField(blank=True, max_length=255)),
+                ('status_message', models.CharField(blank=True, max_length=255)),
+                ('saved_count', models.IntegerField(default=0)),
+                ('skipped_count', models.IntegerField(default=0)),
+                ('duplicate_count', models.IntegerField(default=0)),
+                ('skipped_items', models.JSONField(blank=True, default=list)),
+                ('results', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='scraper_app.client')),
+            ],
+            options={
+                'verbose_name': 'Scrape Job',
+                'verbose_name_plural': 'Scrape Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:16
+
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+
+
+# Copy of scraper_app.normalize.normalize_link as of this migration; the live
+# function may change, the keys written here must not
+def normalize_link(url):
+    url = (url or '').strip()
+    if not url:
+        return ''
+    try:
+        parts = urlsplit(url if '://' in url else '//' + url)
+        host = (parts.hostname or '').rstrip('.')
+        port = parts.port
+    except ValueError:
+        return url.lower()[:500]
+
+    if host.startswith('www.'):
+        host = host[4:]
+    if port and port not in (80, 443):
+        host = f'{host}:{port}'
+
+    key = host + parts.path.rstrip('/')
+    if parts.query:
+        key += '?' + parts.query
+    return key[:500]
+
+
+# Filled in on the kept row when it has no value of its own
+MERGED_FIELDS = ['client_id', 'city', 'listing_url', 'snippet', 'email', 'phone']
+
+
+def merge_duplicates(ScrapedData, duplicates):
+    """
+    duplicates maps the id of the newest row of each key to the ids of its
+    older duplicates. Contact info only an older row found is copied onto the
+    newest row, then the older rows are deleted.
+    """
+    for keeper_id, older_ids in duplicates.items():
+        keeper = ScrapedData.objects.get(pk=keeper_id)
+        changed = set()
+        for old in ScrapedData.objects.filter(pk__in=older_ids).order_by('-created_at', '-id'):
+            for field in MERGED_FIELDS:
+                if not getattr(keeper, field) and getattr(old, field):
+                    setattr(keeper, field, getattr(old, field))
+                    changed.add(field)
+            for field in ('is_verified', 'is_elfsight'):
+                if getattr(old, field) and not getattr(keeper, field):
+                    setattr(keeper, field, True)
+                    changed.add(field)
+        if changed:
+            keeper.save(update_fields=sorted(changed))
+        ScrapedData.objects.filter(pk__in=older_ids).delete()
+
+
+def backfill_link_keys(apps, schema_editor):
+    """
+    Give existing rows their normalized key. When several rows share a key,
+    the newest one gets it and the older ones are merged into it.
+    """
+    ScrapedData = apps.get_model('scraper_app', 'ScrapedData')
+    keepers = {}     # key -> id of the newest row
+    duplicates = {}  # id of the newest row -> ids of older rows with the same key
+    batch = []
+    for obj in ScrapedData.objects.order_by('-created_at', '-id').only('id', 'link').iterator(chunk_size=2000):
+        key = normalize_link(obj.link)
+        if not key:
+            continue
+        if key in keepers:
+            duplicates.setdefault(keepers[key], []).append(obj.pk)
+            continue
+        keepers[key] = obj.pk
+        obj.link_key = key
+        batch.append(obj)
+        if len(batch) >= 1000:
+            ScrapedData.objects.bulk_update(batch, ['link_key'])
+            batch = []
+    if batch:
+        ScrapedData.objects.bulk_update(batch, ['link_key'])
+    merge_duplicates(ScrapedData, duplicates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0010_scrapejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='link_key',
+            field=models.CharField(blank=True, editable=False, max_length=500, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_link_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='scrapeddata',
+            index=models.Index(fields=['client', '-created_at'], name='scraped_client_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scrapeddata',
+            index=models.Index(fields=['client', 'is_verified', '-created_at'], name='scraped_client_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scrapeddata',
+            index=models.Index(fields=['is_verified', '-created_at'], name='scraped_verified_created_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0011_scrapeddata_link_key'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='scrapejob',
+            name='results',
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='result_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ScrapeResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('client_name', models.CharField(blank=True, max_length=100)),
+                ('category', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('country', models.CharField(blank=True, max_length=255)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('link', models.URLField(max_length=500)),
+                ('snippet', models.TextField(blank=True)),
+                ('email', models.CharField(blank=True, max_length=255)),
+                ('phone', models.CharField(blank=True, max_length=255)),
+                ('is_elfsight', models.BooleanField(default=False)),
+                ('is_verified', models.BooleanField(default=False)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='result_rows', to='scraper_app.scrapejob')),
+            ],
+            options={
+                'ordering': ['job', 'position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scraperesult',
+            constraint=models.UniqueConstraint(fields=('job', 'position'), name='scrape_result_job_position_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0012_scraperesult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchengine',
+            name='max_concurrency',
+            field=models.PositiveIntegerField(default=1, help_text='Maximum requests in flight to this engine at once'),
+        ),
+    ]
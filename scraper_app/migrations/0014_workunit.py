@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0013_searchengine_max_concurrency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkUnit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('category', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('leased', 'Leased'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('results', models.JSONField(blank=True, default=list)),
+                ('skipped_items', models.JSONField(blank=True, default=list)),
+                ('saved_count', models.IntegerField(default=0)),
+                ('duplicate_count', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='units', to='scraper_app.scrapejob')),
+            ],
+            options={
+                'ordering': ['job', 'position'],
+                'indexes': [models.Index(fields=['status', 'lease_expires_at'], name='work_unit_claim_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='workunit',
+            constraint=models.UniqueConstraint(fields=('job', 'position'), name='work_unit_job_position_uniq'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:31
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_scraped_at(apps, schema_editor):
+    """Existing rows were fetched at least as recently as they were created"""
+    ScrapedData = apps.get_model('scraper_app', 'ScrapedData')
+    ScrapedData.objects.filter(scraped_at=None).update(scraped_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0014_workunit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapeddata',
+            name='scraped_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_scraped_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0015_scrapeddata_scraped_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapejob',
+            name='is_load_test',
+            field=models.BooleanField(default=False),
+        ),
+    ]
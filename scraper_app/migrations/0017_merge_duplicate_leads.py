@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:02
+
+from importlib import import_module
+
+from django.db import migrations
+
+# Module names starting with a digit can't be imported with an import statement
+link_key_migration = import_module('scraper_app.migrations.0011_scrapeddata_link_key')
+
+
+def merge_unkeyed_duplicates(apps, schema_editor):
+    """
+    Databases migrated before 0011 merged duplicates still have the older
+    duplicates of a link with link_key = NULL, where the next save() of one
+    of them fails on the unique key. Merge them into the row that has the key.
+    """
+    ScrapedData = apps.get_model('scraper_app', 'ScrapedData')
+    keepers = {}
+    duplicates = {}
+    for obj in ScrapedData.objects.filter(link_key__isnull=True).order_by('-created_at', '-id').only('id', 'link').iterator(chunk_size=2000):
+        key = link_key_migration.normalize_link(obj.link)
+        if not key:
+            continue
+        if key not in keepers:
+            keeper_id = ScrapedData.objects.filter(link_key=key).values_list('id', flat=True).first()
+            if keeper_id is None:
+                # No row has this key yet; the newest unkeyed row takes it
+                ScrapedData.objects.filter(pk=obj.pk).update(link_key=key)
+                keepers[key] = obj.pk
+                continue
+            keepers[key] = keeper_id
+        duplicates.setdefault(keepers[key], []).append(obj.pk)
+    link_key_migration.merge_duplicates(ScrapedData, duplicates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0016_scrapejob_is_load_test'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_unkeyed_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper_app', '0017_merge_duplicate_leads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=255, unique=True)),
+                ('tat', models.FloatField(default=0.0)),
+            ],
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 
+from .normalize import normalize_link
+
 class Client(models.Model):
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -16,6 +18,7 @@ class SearchEngine(models.Model):
     add_reviews_keyword = models.BooleanField(default=True, help_text="Add 'reviews' to search query")
     max_results = models.IntegerField(default=10, help_text="Maximum results to fetch per search")
     delay_between_requests = models.FloatField(default=2.0, help_text="Delay in seconds between requests (avoid IP blocking)")
+    max_concurrency = models.PositiveIntegerField(default=1, help_text="Maximum requests in flight to this engine at once")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -52,6 +55,7 @@ class ScrapedData(models.Model):
     country = models.CharField(max_length=255)
     title = models.CharField(max_length=255)
     link = models.URLField(max_length=500)  # Actual business website URL
+    link_key = models.CharField(max_length=500, unique=True, null=True, blank=True, editable=False)  # normalize_link(link), the upsert key
     listing_url = models.URLField(max_length=500, blank=True, null=True)  # Reference URL from listing sites (Birdeye, Yelp, etc.)
     snippet = models.TextField(blank=True, null=True)
     email = models.CharField(max_length=255, blank=True, null=True)
@@ -59,6 +63,156 @@ class ScrapedData(models.Model):
     is_elfsight = models.BooleanField(default=False)
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    scraped_at = models.DateTimeField(null=True, blank=True)  # Last time the site itself was fetched
+
+    class Meta:
+        indexes = [
+            # Client CSV exports: filter by client (and is_verified), newest first
+            models.Index(fields=['client', '-created_at'], name='scraped_client_created_idx'),
+            models.Index(fields=['client', 'is_verified', '-created_at'], name='scraped_client_verified_idx'),
+            # Admin changelist default ordering
+            models.Index(fields=['is_verified', '-created_at'], name='scraped_verified_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.link_key = normalize_link(self.link) or None
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.title} ({self.client})"
+
+class ScrapeJob(models.Model):
+    """A scrape request queued by the UI and processed by the run_scrape_worker command"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True)
+    categories = models.JSONField(default=list)
+    cities = models.JSONField(default=list)
+    country = models.CharField(max_length=255, blank=True)
+    url = models.URLField(max_length=500, blank=True)  # Direct URL scrape instead of search grid
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    worker = models.CharField(max_length=100, blank=True, help_text="Worker that claimed this job")
+    # Created by the loadtest command against its fake farm; workers never claim its units
+    is_load_test = models.BooleanField(default=False)
+
+    # Progress, updated by the worker after every combination
+    current = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    current_category = models.CharField(max_length=255, blank=True)
+    current_city = models.CharField(max_length=255, blank=True)
+    status_message = models.CharField(max_length=255, blank=True)
+    saved_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    duplicate_count = models.IntegerField(default=0)
+
+    skipped_items = models.JSONField(default=list, blank=True)
+    result_count = models.IntegerField(default=0)  # Rows in ScrapeResult for this job
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Scrape Job"
+        verbose_name_plural = "Scrape Jobs"
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.status}) - {', '.join(self.categories)}"
+
+class ScrapeResult(models.Model):
+    """One lead found by a scrape job; the UI pages through these and download_csv exports them"""
+    job = models.ForeignKey(ScrapeJob, on_delete=models.CASCADE, related_name='result_rows')
+    position = models.IntegerField()  # 1-based order within the job
+    client_name = models.CharField(max_length=100, blank=True)
+    category = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=255, blank=True)
+    country = models.CharField(max_length=255, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    link = models.URLField(max_length=500)
+    snippet = models.TextField(blank=True)
+    email = models.CharField(max_length=255, blank=True)
+    phone = models.CharField(max_length=255, blank=True)
+    is_elfsight = models.BooleanField(default=False)
+    is_verified = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['job', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'position'], name='scrape_result_job_position_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} (job {self.job_id})"
+
+class WorkUnit(models.Model):
+    """
+    One category x city combination of a ScrapeJob (or the whole job for a URL
+    scrape). Workers on any host claim units through a lease that they keep
+    extending while they run; a unit whose lease expired is taken over by the
+    next worker that asks for work.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_LEASED = 'leased'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_LEASED, 'Leased'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    job = models.ForeignKey(ScrapeJob, on_delete=models.CASCADE, related_name='units')
+    position = models.IntegerField()  # 1-based order within the job's grid
+    category = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+
+    # Lease: held by worker until lease_expires_at, renewed by its heartbeat
+    worker = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+
+    # Outcome, combined into the job's results once every unit is finished
+    results = models.JSONField(default=list, blank=True)
+    skipped_items = models.JSONField(default=list, blank=True)
+    saved_count = models.IntegerField(default=0)
+    duplicate_count = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['job', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'position'], name='work_unit_job_position_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at'], name='work_unit_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.job_id} unit {self.position} ({self.status})"
+
+class RateLimitState(models.Model):
+    """
+    Shared request schedule of one search engine host, so every worker process
+    (on any host) draws from the same rate limit. See scraper_app/ratelimit.py.
+    """
+    host = models.CharField(max_length=255, unique=True)
+    # GCRA theoretical arrival time: when the host's budget is fully spent, as a unix timestamp
+    tat = models.FloatField(default=0.0)
+
+    def __str__(self):
+        return self.host
@@ -0,0 +1,127 @@
+"""
+URL normalization helpers.
+"""
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {80, 443}
+
+
+def normalize_link(url):
+    """
+    Key used to identify a lead's website in ScrapedData.link_key.
+
+    Insensitive to scheme, a leading 'www.', host case, default ports, a
+    trailing slash and the fragment, so http://www.Example.com/ and
+    https://example.com share one key. Path and query are kept as-is.
+    """
+    url = (url or '').strip()
+    if not url:
+        return ''
+    try:
+        parts = urlsplit(url if '://' in url else '//' + url)
+        host = (parts.hostname or '').rstrip('.')
+        port = parts.port
+    except ValueError:
+        return url.lower()[:500]
+
+    if host.startswith('www.'):
+        host = host[4:]
+    if port and port not in DEFAULT_PORTS:
+        host = f'{host}:{port}'
+
+    key = host + parts.path.rstrip('/')
+    if parts.query:
+        key += '?' + parts.query
+    return key[:500]
+
+
+# Query parameters that only track the click, never select content
+TRACKING_PARAMS = {
+    'gclid', 'gclsrc', 'dclid', 'gbraid', 'wbraid', 'fbclid', 'msclkid', 'yclid', 'twclid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', 'igshid', 'srsltid', 'ref', 'ref_src', 'trk',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+# Multi-label public suffixes seen in our target countries, plus hosting platforms
+# whose subdomains are separate businesses. Used when tldextract isn't installed.
+MULTI_LABEL_SUFFIXES = {
+    'co.uk', 'org.uk', 'me.uk', 'ltd.uk', 'plc.uk', 'ac.uk', 'gov.uk', 'nhs.uk',
+    'com.au', 'net.au', 'org.au', 'co.nz', 'org.nz', 'net.nz',
+    'co.in', 'net.in', 'org.in', 'firm.in', 'gen.in', 'ind.in',
+    'ab.ca', 'bc.ca', 'mb.ca', 'nb.ca', 'nl.ca', 'ns.ca', 'on.ca', 'pe.ca', 'qc.ca', 'sk.ca',
+    'com.br', 'com.mx', 'co.za', 'com.sg',
+    'wixsite.com', 'myshopify.com', 'squarespace.com', 'wordpress.com', 'blogspot.com',
+    'business.site', 'godaddysites.com', 'weebly.com', 'webflow.io', 'github.io',
+    'netlify.app', 'vercel.app', 'herokuapp.com', 'square.site',
+}
+
+try:
+    import tldextract
+    # Bundled suffix list only (no network), private suffixes like myshopify.com included
+    _extract = tldextract.TLDExtract(suffix_list_urls=(), include_psl_private_domains=True)
+except ImportError:
+    _extract = None
+
+
+def canonicalize_url(url):
+    """
+    URL to fetch and store for a search result: lowercase scheme and host,
+    no default port, no fragment, no tracking parameters, '/' for an empty
+    path. Returns '' for anything that isn't an absolute http(s) URL.
+    """
+    url = (url or '').strip()
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').rstrip('.')
+        port = parts.port
+    except ValueError:
+        return ''
+    scheme = parts.scheme.lower()
+    if scheme not in ('http', 'https') or not host:
+        return ''
+
+    netloc = host
+    if port and port not in DEFAULT_PORTS:
+        netloc = f'{host}:{port}'
+    query = parts.query
+    if query:
+        params = parse_qsl(query, keep_blank_values=True)
+        kept = [
+            (name, value) for name, value in params
+            if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+        ]
+        # Only re-encode when something was dropped, so other queries stay byte-identical
+        if len(kept) != len(params):
+            query = urlencode(kept)
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+def registrable_domain(url_or_host):
+    """
+    The domain a business registered ("example.co.uk" for shop.example.co.uk),
+    used to visit each business once per run no matter which page the engine
+    linked. Falls back to the whole host for IP addresses and bare hosts.
+    """
+    host = url_or_host
+    if '/' in host:
+        try:
+            host = urlsplit(host).hostname or ''
+        except ValueError:
+            return ''
+    host = host.lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+
+    if _extract is not None:
+        ext = _extract(host)
+        if ext.domain and ext.suffix:
+            return f'{ext.domain}.{ext.suffix}'
+        return host
+
+    labels = host.split('.')
+    if len(labels) <= 2 or labels[-1].isdigit():
+        return host
+    for size in (3, 2):
+        if '.'.join(labels[-size:]) in MULTI_LABEL_SUFFIXES:
+            return '.'.join(labels[-(size + 1):]) if len(labels) > size else host
+    return '.'.join(labels[-2:])
@@ -0,0 +1,130 @@
+"""
+HTML parser backends.
+
+SCRAPER_HTML_PARSER picks the backend used for SERP and page parsing:
+
+    'html.parser'  BeautifulSoup with Python's built-in parser (slowest, no deps)
+    'lxml'         BeautifulSoup with lxml
+    'selectolax'   selectolax (lexbor) for SERPs; page DOM lookups use lxml
+                   if installed, else html.parser
+    'auto'         lxml if installed, else html.parser (default)
+
+'auto' doesn't pick selectolax even though it is faster: lexbor follows the
+HTML5 quirks mode of pages without a standards doctype, where class
+selectors match case-insensitively (div.g matches class="G"). select_nodes
+parses in standards mode to avoid that, but lexbor and the libxml2/Python
+parsers can still build different trees from broken markup, so selectolax
+stays opt-in.
+
+SERP parsing is partial: select_nodes() only materializes the result blocks
+an engine asks for (a SoupStrainer on the BeautifulSoup backends, lazy node
+wrappers on selectolax). The returned nodes all support the small subset of
+the bs4 Tag API the engines use (select, select_one, get_text, get), so the
+same CSS selectors work on every backend.
+"""
+from bs4 import BeautifulSoup, SoupStrainer
+from django.conf import settings
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+try:
+    # selectolax >= 1.0 only ships the lexbor engine
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    HAS_SELECTOLAX = True
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+        HAS_SELECTOLAX = True
+    except ImportError:
+        HTMLParser = None
+        HAS_SELECTOLAX = False
+
+BACKENDS = ('html.parser', 'lxml', 'selectolax')
+STANDARDS_DOCTYPE = '<!DOCTYPE html>'
+
+
+def get_backend():
+    """Configured backend name, falling back to html.parser if it isn't installed"""
+    backend = getattr(settings, 'SCRAPER_HTML_PARSER', 'auto')
+    if backend == 'auto':
+        return 'lxml' if HAS_LXML else 'html.parser'
+    if backend == 'selectolax' and not HAS_SELECTOLAX:
+        print("WARNING: selectolax is not installed, using html.parser")
+        return 'html.parser'
+    if backend == 'lxml' and not HAS_LXML:
+        print("WARNING: lxml is not installed, using html.parser")
+        return 'html.parser'
+    if backend not in BACKENDS:
+        print(f"WARNING: unknown SCRAPER_HTML_PARSER '{backend}', using html.parser")
+        return 'html.parser'
+    return backend
+
+
+def _bs4_feature(backend):
+    # selectolax has no find()/regex API, so full-page DOM work goes through bs4
+    if backend == 'html.parser':
+        return 'html.parser'
+    return 'lxml' if HAS_LXML else 'html.parser'
+
+
+def make_soup(text, backend=None):
+    """Full BeautifulSoup tree of a page using the configured backend"""
+    return BeautifulSoup(text, _bs4_feature(backend or get_backend()))
+
+
+class SelectolaxNode:
+    """Wraps a selectolax node with the bs4 Tag methods the SERP parsers use"""
+
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def select(self, selector):
+        return [SelectolaxNode(n) for n in self.node.css(selector)]
+
+    def select_one(self, selector):
+        node = self.node.css_first(selector)
+        return SelectolaxNode(node) if node is not None else None
+
+    def get_text(self, strip=False):
+        return self.node.text(deep=True, separator='', strip=strip)
+
+    def get(self, name, default=None):
+        value = self.node.attributes.get(name)
+        return default if value is None else value
+
+
+def _class_token(name):
+    # The strainer sees the raw class attribute ("g tF2Cxc"), not the split list
+    return lambda value: value is not None and name in value.split()
+
+
+def _strainer(only):
+    kwargs = dict(only)
+    if isinstance(kwargs.get('class_'), str):
+        kwargs['class_'] = _class_token(kwargs['class_'])
+    return SoupStrainer(**kwargs)
+
+
+def select_nodes(text, selector, only=None, backend=None):
+    """
+    Parse just enough of text to return the nodes matching selector.
+
+    only is a dict of SoupStrainer arguments (e.g. {'name': 'div', 'class_': 'g'})
+    describing the outermost elements worth keeping; the BeautifulSoup backends
+    skip building everything else.
+    """
+    backend = backend or get_backend()
+    if backend == 'selectolax':
+        # A leading standards doctype keeps lexbor out of quirks mode (a later doctype is ignored),
+        # so class selectors stay case-sensitive like on the other backends
+        return [SelectolaxNode(n) for n in HTMLParser(STANDARDS_DOCTYPE + text).css(selector)]
+
+    parse_only = _strainer(only) if only else None
+    soup = BeautifulSoup(text, _bs4_feature(backend), parse_only=parse_only)
+    return soup.select(selector)
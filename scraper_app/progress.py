@@ -0,0 +1,120 @@
+"""
+Live progress channel for scrape jobs.
+
+The worker running a job keeps the job's progress in a ProgressChannel and
+publishes the whole state to the shared cache on every stage change (search,
+fetch, extract, save). The progress_stream view reads it back and pushes it
+to the browser as Server-Sent Events, so stage updates cost neither a
+session write nor a database write.
+
+Several units of a job run at once, each with its own channel, so what the
+channels share lives in separate cache keys rather than in any one state:
+
+    - seq is one counter per job, so every publish gets a higher number
+      than the last, whichever channel made it
+    - counters (saved, skipped, current, ...) are added to with cache.incr
+      and read back on every publish, so units never overwrite each other
+
+This relies on an atomic cache.incr: Redis/Memcached, the local-memory cache
+(one process only) or scraper_app.cache.LockingFileBasedCache, the default
+for the 'scraper' cache. Django's plain file and database caches read and
+write, so racing units would lose increments there.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_TEMPLATE = 'scraper:progress:{job_id}'
+COUNTER_TEMPLATE = 'scraper:progress:{job_id}:{name}'
+STATE_TIMEOUT = 6 * 60 * 60  # Keep finished jobs' state around for late listeners
+
+
+def _cache():
+    return caches[getattr(settings, 'SCRAPER_CACHE_ALIAS', 'default')]
+
+
+def read_progress(job_id):
+    """Latest published state for a job, or None if nothing was published"""
+    try:
+        return _cache().get(KEY_TEMPLATE.format(job_id=job_id))
+    except Exception as e:
+        print(f"Progress read failed for job {job_id}: {e}")
+        return None
+
+
+def _counter_key(job_id, name):
+    return COUNTER_TEMPLATE.format(job_id=job_id, name=name)
+
+
+def reset_counters(job_id, **values):
+    """Set a job's shared counters, e.g. back to 0 when it is split again"""
+    try:
+        _cache().set_many({_counter_key(job_id, name): value for name, value in values.items()}, timeout=STATE_TIMEOUT)
+    except Exception as e:
+        print(f"Progress reset failed for job {job_id}: {e}")
+
+
+def _add(cache, key, delta):
+    # incr raises ValueError for a missing key; the first writer creates it
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=STATE_TIMEOUT):
+            return delta
+        return cache.incr(key, delta)
+
+
+class ProgressChannel:
+    """
+    Progress state of one running unit (or the finish step) of a job,
+    published to the shared cache. counters seeds the job's shared counters
+    if no other channel has yet.
+    """
+
+    def __init__(self, job_id, counters=None, **initial):
+        self.job_id = job_id
+        self.key = KEY_TEMPLATE.format(job_id=job_id)
+        self.state = dict(initial, job_id=job_id)
+        self.counters = set(counters or ())
+        self.lock = threading.Lock()
+        try:
+            cache = _cache()
+            for name, value in (counters or {}).items():
+                cache.add(_counter_key(job_id, name), value, timeout=STATE_TIMEOUT)
+        except Exception as e:
+            print(f"Progress seed failed for job {job_id}: {e}")
+
+    def publish(self, stage=None, status=None, **fields):
+        """Merge fields into the state and publish it; stage/status describe what is happening now"""
+        self._update(stage, status, fields, {})
+
+    def increment(self, stage=None, status=None, **deltas):
+        """Add deltas to the job's shared counters and publish the state"""
+        self._update(stage, status, {}, deltas)
+
+    def _update(self, stage, status, fields, deltas):
+        with self.lock:
+            try:
+                cache = _cache()
+                for name, delta in deltas.items():
+                    self.counters.add(name)
+                    _add(cache, _counter_key(self.job_id, name), delta)
+                shared = cache.get_many([_counter_key(self.job_id, name) for name in self.counters])
+                for name in self.counters:
+                    value = shared.get(_counter_key(self.job_id, name))
+                    if value is not None:
+                        self.state[name] = value
+                # Fields win over counters: the finish step publishes the job's final totals
+                self.state.update(fields)
+                if stage is not None:
+                    self.state['stage'] = stage
+                if status is not None:
+                    self.state['status'] = status
+                self.state['seq'] = _add(cache, _counter_key(self.job_id, 'seq'), 1)
+                self.state['updated_at'] = time.time()
+                # Written under the lock so an older state of this channel can never overwrite a newer one
+                cache.set(self.key, dict(self.state), timeout=STATE_TIMEOUT)
+            except Exception as e:
+                print(f"Progress publish failed for job {self.job_id}: {e}")
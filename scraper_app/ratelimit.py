@@ -0,0 +1,161 @@
+"""
+Per-host rate limiting for search engine requests.
+
+Every host gets one HostLimiter per process, shared by all its threads and
+jobs. A request only waits when the host's budget is actually used up,
+instead of sleeping before every query: the budget refills at one request
+per delay_between_requests seconds and holds up to SCRAPER_RATE_LIMIT_BURST
+requests. Waits get up to SCRAPER_RATE_LIMIT_JITTER seconds of random jitter
+so they don't look machine-timed.
+
+The budget is shared by every worker process, on every host: it is kept in
+the host's RateLimitState row and spent with GCRA (the generic cell rate
+algorithm, a token bucket stored as a single timestamp), updated with a
+compare-and-swap so racing workers never both get the same slot. The
+timestamps are wall-clock time, so hosts running workers need synced clocks.
+If the database can't be reached the limiter falls back to a token bucket in
+the process, and with SCRAPER_RATE_LIMIT_SHARED = False it always uses one.
+
+The cap on requests in flight (SearchEngine.max_concurrency) is still per
+process: N worker processes may have N times max_concurrency requests open
+at once, though they start no faster than the shared rate allows.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import instrument
+from .models import RateLimitState
+
+CAS_ATTEMPTS = 10  # Lost compare-and-swaps before falling back to the local bucket
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Classic token bucket; reserve() hands out tokens and says how long to wait for one"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def configure(self, rate, capacity):
+        with self.lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token, returning the seconds to wait before using it (0 if one was free)"""
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            # Negative balance: later callers queue up behind this reservation
+            return -self.tokens / self.rate
+
+
+def reserve_shared(host, delay, burst):
+    """
+    Take the next request slot of host from the shared budget in the
+    database; returns the seconds to wait before using it (0 if it was free).
+    Raises DatabaseError if the database can't be used.
+    """
+    # tat is when the budget would be fully spent; a request may start up to
+    # (burst - 1) * delay before that, and moves it delay seconds later
+    tolerance = (burst - 1) * delay
+    for _ in range(CAS_ATTEMPTS):
+        state, _ = RateLimitState.objects.get_or_create(host=host)
+        now = time.time()
+        tat = max(state.tat, now)
+        if RateLimitState.objects.filter(pk=state.pk, tat=state.tat).update(tat=tat + delay):
+            return max(0.0, tat - tolerance - now)
+    raise DatabaseError(f'rate limit state of {host} kept changing under us')
+
+
+class HostLimiter:
+    """Shared request budget plus an in-flight cap for one host"""
+
+    def __init__(self, host, delay, max_concurrency):
+        self.host = host
+        self.bucket = None
+        self.slots = None
+        self.delay = None
+        self.burst = None
+        self.max_concurrency = None
+        self.configure(delay, max_concurrency)
+
+    def configure(self, delay, max_concurrency):
+        """Apply (possibly edited) engine settings; cheap when nothing changed"""
+        max_concurrency = max(1, int(max_concurrency or 1))
+        burst = max(1, getattr(settings, 'SCRAPER_RATE_LIMIT_BURST', 1))
+        if delay != self.delay or burst != self.burst:
+            if not delay or delay <= 0:
+                self.bucket = None
+            elif self.bucket is None:
+                self.bucket = TokenBucket(1.0 / delay, burst)
+            else:
+                self.bucket.configure(1.0 / delay, burst)
+            self.delay = delay
+            self.burst = burst
+        if max_concurrency != self.max_concurrency:
+            # Requests already holding a slot release it on the old semaphore
+            self.slots = threading.BoundedSemaphore(max_concurrency)
+            self.max_concurrency = max_concurrency
+
+    def reserve(self):
+        """Take the next request slot; returns the seconds to wait before using it"""
+        bucket, delay, burst = self.bucket, self.delay, self.burst
+        if bucket is None:
+            return 0.0
+        if getattr(settings, 'SCRAPER_RATE_LIMIT_SHARED', True):
+            try:
+                return reserve_shared(self.host, delay, burst)
+            except DatabaseError as e:
+                print(f"--- Shared rate limit unavailable for {self.host} ({e}), limiting this process only ---")
+        return bucket.reserve()
+
+    @contextmanager
+    def acquire(self):
+        slots = self.slots
+        with slots:
+            wait = self.reserve()
+            if wait > 0:
+                wait += random.uniform(0, getattr(settings, 'SCRAPER_RATE_LIMIT_JITTER', 1.0))
+                print(f"--- Waiting {wait:.1f}s for {self.host} rate limit ---")
+                time.sleep(wait)
+                instrument.record('rate_limit_wait', wait)
+            yield
+
+
+def get_limiter(host, delay, max_concurrency=1):
+    """The shared limiter for host, updated to the given settings"""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = HostLimiter(host, delay, max_concurrency)
+        else:
+            limiter.configure(delay, max_concurrency)
+    return limiter
+
+
+def limit(url, delay, max_concurrency=1):
+    """Context manager that holds a request slot for url's host, waiting if its budget is spent"""
+    host = urlparse(url).netloc.lower()
+    return get_limiter(host, delay, max_concurrency).acquire()
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .config import invalidate_config
+from .models import BlacklistedDomain, SearchEngine
+
+
+@receiver(post_save, sender=SearchEngine)
+@receiver(post_delete, sender=SearchEngine)
+@receiver(post_save, sender=BlacklistedDomain)
+@receiver(post_delete, sender=BlacklistedDomain)
+def scraper_config_changed(sender, **kwargs):
+    """Any engine or blacklist edit invalidates the cached config snapshot"""
+    invalidate_config()
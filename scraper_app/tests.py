@@ -1,3 +1,686 @@
-from django.test import TestCase
+import tempfile
+import threading
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from requests.structures import CaseInsensitiveDict
+
+from . import config, crawler, fetcher, http_cache, known_leads, metrics, ratelimit, serp_cache, views
+from .blacklist import FALLBACK_BLACKLIST, BlacklistMatcher
+from .cache import LockingFileBasedCache
+from .jobs import claim_next_unit, finish_job_if_complete, split_job
+from .leads import LeadBuffer
+from .models import BlacklistedDomain, RateLimitState, ScrapedData, ScrapeJob, ScrapeResult, SearchEngine, WorkUnit
+from .normalize import canonicalize_url, normalize_link, registrable_domain
+from .progress import ProgressChannel, read_progress, reset_counters
+
+# Progress and config go through the 'scraper' cache; keep tests out of the on-disk one
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'scraper': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-scraper'},
+}
+
+
+class FakeResponse:
+    """Stands in for a streamed requests.Response; records how much of the body was read"""
+
+    def __init__(self, body=b'', status_code=200, headers=None, url='https://example.com/'):
+        self.body = body
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict({'Content-Type': 'text/html; charset=utf-8'} if headers is None else headers)
+        self.url = url
+        self.history = []
+        self.bytes_read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            chunk = self.body[start:start + chunk_size]
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class BlacklistMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = BlacklistMatcher(FALLBACK_BLACKLIST)
+
+    def assertMatch(self, url, rule, kind):
+        match = self.matcher.match(url)
+        self.assertIsNotNone(match, url)
+        self.assertEqual((match.rule, match.kind), (rule, kind), url)
+
+    def test_domain_rule_matches_host_and_subdomains(self):
+        self.assertMatch('https://yelp.com/biz/x', 'yelp.com', 'domain')
+        self.assertMatch('https://www.yelp.com/biz/x', 'yelp.com', 'domain')
+        self.assertMatch('yelp.com', 'yelp.com', 'domain')
+
+    def test_domain_rule_needs_a_label_boundary(self):
+        self.assertIsNone(self.matcher.match('https://notyelp.com/'))
+        self.assertIsNone(self.matcher.match('https://yelp.com.example.ca/'))
+
+    def test_suffix_rules(self):
+        self.assertMatch('https://city.gov/', '.gov', 'tld')
+        self.assertMatch('https://army.mil/', '.mil', 'tld')
+        self.assertMatch('https://portal.nic.in/', '.nic.in', 'suffix')
+        # A suffix rule is not a label anywhere in the host
+        self.assertIsNone(self.matcher.match('https://www.gov.example.com/'))
+
+    def test_label_rule_needs_a_following_label(self):
+        self.assertMatch('https://yellowpages.ca/x', 'yellowpages.', 'label')
+        self.assertMatch('https://www.yellowpages.com/x', 'yellowpages.', 'label')
+        self.assertMatch('https://forum.example.com/', 'forum.', 'label')
+        self.assertIsNone(self.matcher.match('https://yellowpages/'))
+
+    def test_path_rule(self):
+        self.assertMatch('https://www.google.com/maps/place/x', 'google.com/maps', 'path')
+        self.assertIsNone(self.matcher.match('https://www.google.com/search?q=x'))
+
+    def test_entries_are_normalized_and_counted(self):
+        matcher = BlacklistMatcher(['  Example.COM ', '', None, '.Test'])
+        self.assertEqual(len(matcher), 2)
+        self.assertEqual(matcher.match('https://shop.example.com/').rule, 'example.com')
+        self.assertEqual(matcher.match('https://site.test/').rule, '.test')
+
+    def test_unparseable_urls_never_match(self):
+        self.assertIsNone(self.matcher.match(''))
+        self.assertIsNone(self.matcher.match('http://[::1'))
+
+
+@override_settings(CACHES=TEST_CACHES, SCRAPER_CONFIG_CHECK_INTERVAL=0)
+class ConfigSnapshotTests(TestCase):
+    def setUp(self):
+        caches['scraper'].clear()
+        config.invalidate_config()
+
+    def test_snapshot_is_reused_until_invalidated(self):
+        snapshot = config.get_config()
+        self.assertIs(config.get_config(), snapshot)
+        config.invalidate_config()
+        self.assertIsNot(config.get_config(), snapshot)
+
+    def test_fallback_blacklist_when_the_table_is_empty(self):
+        snapshot = config.get_config()
+        self.assertIs(snapshot.blacklist, config.get_fallback_matcher())
+        self.assertEqual(snapshot.db_blacklist_count, 0)
+
+    def test_model_edits_invalidate_the_snapshot(self):
+        config.get_config()
+        BlacklistedDomain.objects.create(domain='example-listing.com')
+        SearchEngine.objects.create(name='Bing', search_url_template='https://www.bing.com/search?q={query}', priority=2)
+        snapshot = config.get_config()
+        self.assertEqual(snapshot.db_blacklist_count, 1)
+        self.assertEqual(snapshot.blacklist.match('https://www.example-listing.com/x').rule, 'example-listing.com')
+        self.assertEqual([engine.name for engine in snapshot.engines], ['Bing'])
+
+        SearchEngine.objects.filter(name='Bing').delete()  # queryset delete still sends post_delete
+        self.assertEqual(config.get_config().engines, ())
+
+    def test_edits_in_another_process_are_noticed(self):
+        snapshot = config.get_config()
+        # Another process bumped the shared version; nothing changed locally
+        caches['scraper'].set(config.VERSION_CACHE_KEY, 'other-process', timeout=None)
+        reloaded = config.get_config()
+        self.assertIsNot(reloaded, snapshot)
+        self.assertEqual(reloaded.shared_version, 'other-process')
+
+
+class LeadBufferTests(TestCase):
+    def lead(self, **fields):
+        return dict({'category': 'Dentist', 'city': 'Toronto', 'country': 'Canada', 'title': 'Example Dental',
+                     'snippet': '', 'email': 'info@example.com', 'phone': '', 'is_elfsight': False,
+                     'is_verified': False}, **fields)
+
+    def test_upserts_on_the_normalized_link(self):
+        with LeadBuffer() as leads:
+            leads.add('https://www.example.com/', **self.lead())
+            leads.add('http://example.com', **self.lead(phone='+1 416 555 0100'))
+        self.assertEqual(leads.written, 1)
+        with LeadBuffer() as leads:
+            leads.add('https://example.com/', **self.lead(email='new@example.com'))
+
+        row = ScrapedData.objects.get()
+        self.assertEqual((row.link_key, row.email, row.phone), ('example.com', 'new@example.com', ''))
+
+    def test_falls_back_to_row_by_row_writes(self):
+        ScrapedData.objects.create(link='https://two.example.com/', link_key='two.example.com',
+                                   **self.lead(email='old@example.com'))
+        leads = LeadBuffer()
+        leads.add('https://one.example.com/', **self.lead())
+        leads.add('https://two.example.com/', **self.lead(email='two@example.com'))
+        with mock.patch.object(LeadBuffer, '_write_batch', side_effect=DatabaseError('bulk upsert failed')):
+            self.assertEqual(leads.flush(), 2)
+
+        self.assertEqual(leads.written, 2)
+        self.assertEqual(
+            dict(ScrapedData.objects.values_list('link_key', 'email')),
+            {'one.example.com': 'info@example.com', 'two.example.com': 'two@example.com'},
+        )
+
+    def test_counts_only_the_rows_that_were_saved(self):
+        leads = LeadBuffer()
+        leads.add('https://one.example.com/', **self.lead())
+        leads.add('https://two.example.com/', **self.lead(title=None))  # title is NOT NULL
+        with mock.patch.object(LeadBuffer, '_write_batch', side_effect=DatabaseError('bulk upsert failed')):
+            self.assertEqual(leads.flush(), 1)
+        self.assertEqual(leads.written, 1)
+        self.assertEqual(list(ScrapedData.objects.values_list('link_key', flat=True)), ['one.example.com'])
+
+    def test_raises_when_nothing_was_saved(self):
+        leads = LeadBuffer()
+        leads.add('https://one.example.com/', **self.lead())
+        with mock.patch.object(LeadBuffer, '_write_batch', side_effect=DatabaseError('database is locked')), \
+                mock.patch.object(ScrapedData.objects, 'update_or_create', side_effect=DatabaseError('database is locked')):
+            with self.assertRaisesMessage(DatabaseError, 'database is locked'):
+                leads.flush()
+        self.assertEqual(leads.written, 0)
+        self.assertFalse(ScrapedData.objects.exists())
+
+    def test_flushes_when_full(self):
+        leads = LeadBuffer(max_size=2, max_age=60)
+        leads.add('https://one.example.com/', **self.lead())
+        self.assertEqual(ScrapedData.objects.count(), 0)
+        leads.add('https://two.example.com/', **self.lead())
+        self.assertEqual(ScrapedData.objects.count(), 2)
+
+
+class LinkKeyTests(TestCase):
+    def lead(self, link, days_old, **fields):
+        # Rows from before link_key existed; bulk_create skips save(), which would set the key
+        obj, = ScrapedData.objects.bulk_create([ScrapedData(**dict(
+            {'link': link, 'category': 'Dentist', 'country': 'Canada', 'title': 'Example Dental'}, **fields))])
+        # created_at is auto_now_add, so backdate it afterwards
+        ScrapedData.objects.filter(pk=obj.pk).update(created_at=timezone.now() - timedelta(days=days_old))
+        return obj.pk
+
+    def test_normalize_link(self):
+        self.assertEqual(normalize_link('http://www.Example.com/'), 'example.com')
+        self.assertEqual(normalize_link('https://example.com#top'), 'example.com')
+        self.assertEqual(normalize_link('example.com/a/?x=1'), 'example.com/a?x=1')
+        self.assertEqual(normalize_link(''), '')
+
+    def test_migration_copy_of_normalize_link_matches(self):
+        migration = import_module('scraper_app.migrations.0011_scrapeddata_link_key')
+        for link in ('http://www.Example.com/', 'example.com:8080/a/?x=1', 'https://[bad', ''):
+            self.assertEqual(migration.normalize_link(link), normalize_link(link), link)
+
+    def test_backfill_merges_duplicates_into_the_newest_row(self):
+        newest = self.lead('https://example.com/', 1, email='new@example.com')
+        self.lead('http://www.example.com', 5, email='old@example.com', phone='+1 416 555 0100', is_verified=True)
+        other = self.lead('https://other.example.com/', 3)
+
+        import_module('scraper_app.migrations.0011_scrapeddata_link_key').backfill_link_keys(apps, None)
+
+        self.assertEqual(sorted(ScrapedData.objects.values_list('pk', flat=True)), sorted([newest, other]))
+        row = ScrapedData.objects.get(pk=newest)
+        self.assertEqual((row.link_key, row.email, row.phone, row.is_verified),
+                         ('example.com', 'new@example.com', '+1 416 555 0100', True))
+
+    def test_unkeyed_duplicates_are_merged_and_can_be_saved_again(self):
+        # What the first version of 0011 left behind: only the newest duplicate has the key
+        keeper = self.lead('https://example.com/', 1)
+        ScrapedData.objects.filter(pk=keeper).update(link_key='example.com')
+        self.lead('https://www.example.com', 5, email='old@example.com')
+        lone = self.lead('https://other.example.com/', 3)
+
+        import_module('scraper_app.migrations.0017_merge_duplicate_leads').merge_unkeyed_duplicates(apps, None)
+
+        self.assertEqual(dict(ScrapedData.objects.values_list('pk', 'link_key')),
+                         {keeper: 'example.com', lone: 'other.example.com'})
+        row = ScrapedData.objects.get(pk=keeper)
+        self.assertEqual(row.email, 'old@example.com')
+        row.save()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProgressChannelTests(SimpleTestCase):
+    def setUp(self):
+        caches['scraper'].clear()
+
+    def test_units_share_seq_and_counters(self):
+        reset_counters(1, current=0, saved=0, skipped=0)
+        seeds = {'current': 0, 'saved': 0, 'skipped': 0}
+        first = ProgressChannel(1, counters=seeds, state='running')
+        second = ProgressChannel(1, counters=seeds, state='running')
+
+        first.increment(stage='save', saved=3, skipped=1)
+        second.increment(stage='save', saved=2)
+        first.increment(stage='search', current=1)
+        state = read_progress(1)
+        self.assertEqual((state['saved'], state['skipped'], state['current'], state['seq']), (5, 1, 1, 3))
+
+        # A channel created later (the finish step) still publishes a higher seq
+        ProgressChannel(1).publish(stage='done', state='done', saved=5)
+        state = read_progress(1)
+        self.assertEqual((state['state'], state['saved'], state['seq']), ('done', 5, 4))
+
+    def test_counters_are_seeded_once(self):
+        ProgressChannel(2, counters={'saved': 4}).increment(saved=1)
+        ProgressChannel(2, counters={'saved': 0}).increment(saved=1)
+        self.assertEqual(read_progress(2)['saved'], 6)
+
+    def test_file_cache_increments_are_not_lost(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = LockingFileBasedCache(location, {})
+            cache.set('counter', 0)
+
+            def add_many():
+                for _ in range(50):
+                    cache.incr('counter')
+
+            threads = [threading.Thread(target=add_many) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(cache.get('counter'), 400)
+            self.assertFalse(cache.add('counter', 0))
+
+
+
+@override_settings(SCRAPER_HTTP_CACHE_DIR=None, SCRAPER_FETCH_MAX_BYTES=64 * 1024)
+class FetchPageTests(SimpleTestCase):
+    def fetch(self, resp, **kwargs):
+        with mock.patch('scraper_app.http_client.get', return_value=resp):
+            return fetcher.fetch_page(resp.url, **kwargs)
+
+    def test_only_html_is_downloaded(self):
+        for content_type in ('application/pdf', 'image/jpeg', 'text/plain; charset=utf-8', 'application/json'):
+            resp = FakeResponse(b'x' * 1000, headers={'Content-Type': content_type})
+            self.assertIsNone(self.fetch(resp), content_type)
+            self.assertEqual(resp.bytes_read, 0, content_type)
+            self.assertTrue(resp.closed)
+
+        for headers in ({'Content-Type': 'Application/XHTML+XML'}, {}):
+            page = self.fetch(FakeResponse(b'<html>ok</html>', headers=headers))
+            self.assertEqual(page.text, '<html>ok</html>', headers)
+
+    def test_download_stops_at_max_bytes(self):
+        resp = FakeResponse(b'<html>' + b'a' * 500 * 1024)
+        page = self.fetch(resp)
+        self.assertTrue(page.truncated)
+        self.assertEqual(page.bytes_read, 64 * 1024)
+        self.assertEqual(len(page.text), 64 * 1024)
+        # Stopped reading after the chunk that crossed the cap, and dropped the connection
+        self.assertLess(resp.bytes_read, 64 * 1024 + fetcher.CHUNK_SIZE)
+        self.assertTrue(resp.closed)
+
+        page = self.fetch(FakeResponse(b'<html>' + b'a' * 500 * 1024), max_bytes=1000)
+        self.assertEqual((page.bytes_read, page.truncated), (1000, True))
+
+    def test_small_pages_are_read_whole(self):
+        page = self.fetch(FakeResponse('<p>Café</p>'.encode('utf-8')))
+        self.assertEqual((page.text, page.truncated, page.status_code), ('<p>Café</p>', False, 200))
+
+
+@override_settings(SCRAPER_HTTP_CACHE_TTL=100)
+class HttpCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(SCRAPER_HTTP_CACHE_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def fetch(self, resp, now):
+        with mock.patch('scraper_app.http_client.get', return_value=resp) as get, \
+                mock.patch.object(http_cache.time, 'time', return_value=now):
+            page = fetcher.fetch_page(resp.url)
+        return page, get.call_args.kwargs['headers']
+
+    def test_304_reuses_the_body_and_restarts_the_ttl(self):
+        url = 'https://example.com/'
+        page, _ = self.fetch(FakeResponse(b'<p>Hours</p>', headers={'Content-Type': 'text/html', 'ETag': '"v1"'}), 1000)
+        self.assertFalse(page.from_cache)
+
+        page, sent = self.fetch(FakeResponse(status_code=304, headers={'ETag': '"v2"'}), 1080)
+        self.assertEqual(sent['If-None-Match'], '"v1"')
+        self.assertEqual((page.text, page.status_code, page.from_cache), ('<p>Hours</p>', 200, True))
+
+        # 150s after the page was downloaded, but only 70s after the 304
+        with mock.patch.object(http_cache.time, 'time', return_value=1150):
+            cached = http_cache.load(url)
+        self.assertEqual(cached.text, '<p>Hours</p>')
+        self.assertEqual(cached.validators, {'If-None-Match': '"v2"'})
+        with mock.patch.object(http_cache.time, 'time', return_value=1181):
+            self.assertIsNone(http_cache.load(url))
+
+    def test_pages_without_validators_are_not_stored(self):
+        self.fetch(FakeResponse(b'<p>Hours</p>'), 1000)
+        self.assertIsNone(http_cache.load('https://example.com/'))
+
+
+@override_settings(CACHES=TEST_CACHES, SCRAPER_SERP_CACHE_TTL=600)
+class SerpCacheTests(SimpleTestCase):
+    results = [{'title': 'Example Dental', 'url': 'https://example.com/', 'snippet': ''}]
+
+    def setUp(self):
+        caches['scraper'].clear()
+
+    def test_entries_are_keyed_by_engine_and_normalized_query(self):
+        serp_cache.set('google', 'Dentist  Toronto', self.results)
+        self.assertEqual(serp_cache.get('google', ' dentist toronto'), self.results)
+        self.assertIsNone(serp_cache.get('bing', 'dentist toronto'))
+
+    def test_entries_expire_after_the_ttl(self):
+        with mock.patch('time.time', return_value=1000):
+            serp_cache.set('google', 'dentist toronto', self.results)
+        with mock.patch('time.time', return_value=1599):
+            self.assertEqual(serp_cache.get('google', 'dentist toronto'), self.results)
+        with mock.patch('time.time', return_value=1601):
+            self.assertIsNone(serp_cache.get('google', 'dentist toronto'))
+
+    def test_empty_results_and_a_zero_ttl_are_not_cached(self):
+        serp_cache.set('google', 'dentist toronto', [])
+        self.assertIsNone(serp_cache.get('google', 'dentist toronto'))
+        with self.settings(SCRAPER_SERP_CACHE_TTL=0):
+            serp_cache.set('google', 'dentist toronto', self.results)
+            self.assertIsNone(serp_cache.get('google', 'dentist toronto'))
+
+    def test_repeated_searches_are_replayed(self):
+        resp = mock.Mock(status_code=200, text='<html></html>')
+        with mock.patch.object(views, '_search_request', return_value=resp) as search, \
+                mock.patch.object(views, 'parse_google_results', return_value=self.results):
+            first = views.scrape_google_reviews_only('Dentist Toronto', {})
+            second = views.scrape_google_reviews_only('dentist  toronto', {})
+        self.assertEqual(first, self.results)
+        self.assertEqual(second, self.results)
+        self.assertEqual(search.call_count, 1)
+
+
+@override_settings(SCRAPER_RATE_LIMIT_BURST=1, SCRAPER_RATE_LIMIT_SHARED=True)
+class RateLimitTests(TestCase):
+    def reserve(self, limiter, now):
+        with mock.patch.object(ratelimit.time, 'time', return_value=now):
+            return limiter.reserve()
+
+    def test_token_bucket(self):
+        with mock.patch.object(ratelimit.time, 'monotonic', return_value=100.0):
+            bucket = ratelimit.TokenBucket(rate=0.5, capacity=2)
+            self.assertEqual([bucket.reserve() for _ in range(4)], [0.0, 0.0, 2.0, 4.0])
+        with mock.patch.object(ratelimit.time, 'monotonic', return_value=110.0):
+            self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_workers_share_one_budget(self):
+        # Two processes' limiters for the same host
+        one = ratelimit.HostLimiter('www.google.com', 2.0, 1)
+        two = ratelimit.HostLimiter('www.google.com', 2.0, 1)
+        self.assertEqual(self.reserve(one, 1000.0), 0.0)
+        self.assertEqual(self.reserve(two, 1000.0), 2.0)
+        self.assertEqual(self.reserve(one, 1001.0), 3.0)
+        # Idle time refills the budget, but never beyond the burst
+        self.assertEqual(self.reserve(two, 1100.0), 0.0)
+        self.assertEqual(self.reserve(one, 1100.0), 2.0)
+        self.assertEqual(RateLimitState.objects.get(host='www.google.com').tat, 1104.0)
+        self.assertEqual(self.reserve(ratelimit.HostLimiter('www.bing.com', 2.0, 1), 1100.0), 0.0)
+
+    def test_burst(self):
+        with self.settings(SCRAPER_RATE_LIMIT_BURST=3):
+            limiter = ratelimit.HostLimiter('www.google.com', 2.0, 1)
+            self.assertEqual([self.reserve(limiter, 1000.0) for _ in range(5)], [0.0, 0.0, 0.0, 2.0, 4.0])
+
+    def test_falls_back_to_a_process_budget(self):
+        limiter = ratelimit.HostLimiter('www.google.com', 2.0, 1)
+        with mock.patch.object(ratelimit, 'reserve_shared', side_effect=DatabaseError('database is locked')):
+            waits = [limiter.reserve() for _ in range(2)]
+        self.assertEqual(waits[0], 0.0)
+        self.assertAlmostEqual(waits[1], 2.0, places=2)
+        with self.settings(SCRAPER_RATE_LIMIT_SHARED=False):
+            limiter.reserve()
+        self.assertFalse(RateLimitState.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES, SCRAPER_LEASE_SECONDS=60, SCRAPER_UNIT_MAX_ATTEMPTS=2)
+class WorkUnitLeaseTests(TestCase):
+    def make_job(self, cities=('Toronto', 'Ottawa'), **fields):
+        job = ScrapeJob.objects.create(categories=['Dentist'], cities=list(cities), country='Canada',
+                                       status=ScrapeJob.STATUS_RUNNING, **fields)
+        split_job(job)
+        return job
+
+    def expire(self, unit):
+        WorkUnit.objects.filter(pk=unit.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_claims_pending_units_in_order(self):
+        job = self.make_job()
+        first = claim_next_unit('w1')
+        second = claim_next_unit('w2')
+        self.assertEqual((first.job_id, first.position), (job.pk, 1))
+        self.assertEqual(second.position, 2)
+        self.assertEqual((first.status, first.worker, first.attempts), (WorkUnit.STATUS_LEASED, 'w1', 1))
+        self.assertGreater(first.lease_expires_at, timezone.now())
+        # Both units are leased and their leases are live
+        self.assertIsNone(claim_next_unit('w3'))
+
+    def test_expired_lease_is_taken_over(self):
+        self.make_job(cities=['Toronto'])
+        unit = claim_next_unit('w1')
+        self.expire(unit)
+        taken = claim_next_unit('w2')
+        self.assertEqual(taken.pk, unit.pk)
+        self.assertEqual((taken.worker, taken.attempts), ('w2', 2))
+
+    def test_gives_up_after_max_attempts_and_fails_the_job(self):
+        job = self.make_job(cities=['Toronto'])
+        for worker in ('w1', 'w2'):
+            self.expire(claim_next_unit(worker))
+        self.assertIsNone(claim_next_unit('w3'))
+        unit = WorkUnit.objects.get(job=job)
+        self.assertEqual(unit.status, WorkUnit.STATUS_FAILED)
+        self.assertIn('Gave up after 2 attempts', unit.error)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScrapeJob.STATUS_FAILED)
+
+    def test_a_failed_finish_can_be_retried(self):
+        job = self.make_job(cities=['Toronto'])
+        WorkUnit.objects.filter(job=job).update(status=WorkUnit.STATUS_DONE, saved_count=1, results=[
+            {'title': 'Example Dental', 'link': 'https://example.com/', 'category': 'Dentist', 'city': 'Toronto'},
+        ])
+        with mock.patch('scraper_app.jobs.save_results', side_effect=DatabaseError('database is locked')):
+            with self.assertRaises(DatabaseError):
+                finish_job_if_complete(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.finished_at), (ScrapeJob.STATUS_RUNNING, None))
+
+        finished = finish_job_if_complete(job.pk)
+        self.assertEqual((finished.status, finished.result_count, finished.saved_count), (ScrapeJob.STATUS_DONE, 1, 1))
+        self.assertEqual(ScrapeResult.objects.filter(job=job).count(), 1)
+        self.assertEqual(read_progress(job.pk)['state'], ScrapeJob.STATUS_DONE)
+        # Only one caller ever finishes a job
+        self.assertIsNone(finish_job_if_complete(job.pk))
+
+    def test_job_filter_and_load_test_jobs(self):
+        load_test = self.make_job(cities=['Toronto'], is_load_test=True)
+        self.assertIsNone(claim_next_unit('worker'))
+        self.assertEqual(claim_next_unit('loadtest', job_id=load_test.pk).job_id, load_test.pk)
+
+        other = self.make_job(cities=['Ottawa'])
+        self.assertIsNone(claim_next_unit('loadtest', job_id=load_test.pk))
+        self.assertEqual(claim_next_unit('worker').job_id, other.pk)
+
+
+@override_settings(SCRAPER_LEAD_FRESHNESS_DAYS=14)
+class FreshLeadTests(TestCase):
+    def setUp(self):
+        # The known-hosts filter is per process; start every test without one
+        patcher = mock.patch.object(known_leads, '_known_hosts', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lead(self, link, days_old=1, **fields):
+        return ScrapedData.objects.create(**dict(
+            {'link': link, 'category': 'Dentist', 'country': 'Canada', 'title': 'Example Dental',
+             'email': 'info@example.com', 'scraped_at': timezone.now() - timedelta(days=days_old)}, **fields))
+
+    def test_reuses_fresh_leads_of_the_same_country(self):
+        self.lead('https://www.example.com/', phone='+1 416 555 0100')
+        fresh = known_leads.find_fresh(['http://example.com', 'https://unknown.example.org/'], ' canada ')
+        self.assertEqual(list(fresh), ['http://example.com'])
+        self.assertEqual((fresh['http://example.com']['email'], fresh['http://example.com']['phone']),
+                         ('info@example.com', '+1 416 555 0100'))
+
+    def test_leads_of_another_country_are_fetched_again(self):
+        self.lead('https://example.com/', country='United States')
+        self.assertEqual(known_leads.find_fresh(['https://example.com/'], 'Canada'), {})
+
+    def test_stale_or_empty_leads_are_fetched_again(self):
+        self.lead('https://stale.example.com/', days_old=15)
+        self.lead('https://empty.example.com/', email='', phone='')
+        self.assertEqual(known_leads.find_fresh(['https://stale.example.com/', 'https://empty.example.com/'], 'Canada'), {})
+        with self.settings(SCRAPER_LEAD_FRESHNESS_DAYS=0):
+            self.lead('https://example.com/')
+            self.assertEqual(known_leads.find_fresh(['https://example.com/'], 'Canada'), {})
+
+    def test_unknown_hosts_cost_no_query(self):
+        self.lead('https://example.com/')
+        known_leads.get_known_hosts()
+        with self.assertNumQueries(0):
+            self.assertEqual(known_leads.find_fresh(['https://new.example.org/'], 'Canada'), {})
+        # Hosts this process writes are known right away
+        self.lead('https://new.example.org/')
+        known_leads.note_keys(['new.example.org'])
+        self.assertEqual(list(known_leads.find_fresh(['https://new.example.org/'], 'Canada')), ['https://new.example.org/'])
+
+
+class CanonicalUrlTests(SimpleTestCase):
+    def test_canonicalize_url(self):
+        self.assertEqual(
+            canonicalize_url('HTTPS://WWW.Example.com:443/a?utm_source=x&id=3&gclid=9#frag'),
+            'https://www.example.com/a?id=3',
+        )
+        self.assertEqual(canonicalize_url('http://example.com'), 'http://example.com/')
+        self.assertEqual(canonicalize_url('http://example.com:8080/x'), 'http://example.com:8080/x')
+        # Queries without tracking parameters are left byte-identical
+        self.assertEqual(canonicalize_url('https://example.com/?b=2&a=1'), 'https://example.com/?b=2&a=1')
+
+    def test_canonicalize_url_rejects_non_http(self):
+        for url in ('/relative', 'ftp://example.com/', 'mailto:a@example.com', '', None):
+            self.assertEqual(canonicalize_url(url), '', url)
+
+    def test_registrable_domain(self):
+        self.assertEqual(registrable_domain('https://shop.example.co.uk/x'), 'example.co.uk')
+        self.assertEqual(registrable_domain('www.Example.com'), 'example.com')
+        self.assertEqual(registrable_domain('https://a.b.example.com/'), 'example.com')
+        self.assertEqual(registrable_domain('https://a.example.on.ca/'), 'example.on.ca')
+        self.assertEqual(registrable_domain('http://192.168.0.1/'), '192.168.0.1')
+        self.assertEqual(registrable_domain('localhost'), 'localhost')
+
+    def test_registrable_domain_keeps_hosted_businesses_apart(self):
+        self.assertNotEqual(registrable_domain('https://one.myshopify.com/'), registrable_domain('https://two.myshopify.com/'))
+
+    def test_pages_of_one_business_dedupe_to_one_domain(self):
+        links = [
+            'https://www.example.com/',
+            'http://example.com/contact?utm_source=google',
+            'https://blog.example.com/post',
+        ]
+        self.assertEqual({registrable_domain(canonicalize_url(link)) for link in links}, {'example.com'})
+
+    def test_each_business_is_claimed_once(self):
+        state = views.ScrapeState()
+        domains = [registrable_domain(link) for link in (
+            'https://www.example.com/', 'https://example.com/contact', 'https://one.myshopify.com/',
+            'https://two.myshopify.com/', 'https://blog.example.com/',
+        )]
+        self.assertEqual([state.claim_domain(domain) for domain in domains], [True, False, True, True, False])
+        self.assertEqual(state.total_skipped_duplicates, 2)
+
+
+class ContactCrawlTests(SimpleTestCase):
+    landing = """
+        <a href="/blog/2019/contact-form-tips">Blog</a>
+        <a href="/about-us">About</a>
+        <a href="https://www.example.com/contact?utm_source=nav#form">Get in touch</a>
+        <a href="mailto:info@example.com">Contact</a>
+        <a href="/contact/brochure.pdf">Contact brochure</a>
+        <a href="https://facebook.com/example">Contact us on Facebook</a>
+        <a href="/">Home</a>
+        <a href="/services">Services</a>
+    """
+
+    def test_contact_links_are_ranked(self):
+        self.assertEqual(crawler.contact_links('https://www.example.com/', self.landing), [
+            'https://www.example.com/contact',
+            'https://www.example.com/blog/2019/contact-form-tips',
+            'https://www.example.com/about-us',
+        ])
+        self.assertEqual(crawler.contact_links('https://www.example.com/', self.landing, limit=1),
+                         ['https://www.example.com/contact'])
+
+    def test_crawl_fills_only_missing_fields(self):
+        pages = {
+            'https://www.example.com/contact': '<p>Call us: +1 416-555-0100</p><p>hello@example.com</p>',
+            'https://www.example.com/about-us': '<p>About us</p>',
+        }
+
+        def fetch_page(url, timeout=None):
+            return fetcher.Page(url, 200, pages[url], {}, len(pages[url]))
+
+        result = {'email': 'info@example.com', 'phone': '', 'city': 'Toronto', 'country': 'Canada'}
+        with mock.patch.object(crawler, 'fetch_page', side_effect=fetch_page) as fetched:
+            used = crawler.crawl_contacts(result, list(pages), max_pages=2, budget=5)
+        self.assertGreaterEqual(used, 1)
+        self.assertLessEqual(fetched.call_count, 2)
+        self.assertEqual((result['email'], result['phone']), ('info@example.com', '+1 416-555-0100'))
+
+    def test_nothing_is_fetched_when_nothing_is_missing(self):
+        result = {'email': 'info@example.com', 'phone': '+1 416-555-0100', 'city': 'Toronto', 'country': 'Canada'}
+        with mock.patch.object(crawler, 'fetch_page') as fetched:
+            self.assertEqual(crawler.crawl_contacts(result, ['https://www.example.com/contact']), 0)
+        fetched.assert_not_called()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        caches['scraper'].clear()
+
+    def test_render(self):
+        buckets = [0] * (len(metrics.BUCKETS) + 1)
+        buckets[0], buckets[3], buckets[-1] = 2, 1, 1  # 5ms, 50ms and past the last bound
+        snapshots = {
+            'host:2/1': {
+                'counters': {('scraper_serp_requests_total', (('engine', 'google'), ('outcome', '200'))): 3},
+                'histograms': {('scraper_stage_seconds', (('stage', 'fetch'),)): (buckets, 61.5, 4)},
+            },
+            'host:1': {
+                'counters': {('scraper_filter_rejections_total', (('reason', 'Say "hi"\\n'),)): 1.0},
+                'histograms': {},
+            },
+        }
+        lines = metrics.render(snapshots).splitlines()
+        self.assertIn('# TYPE scraper_serp_requests_total counter', lines)
+        self.assertIn('scraper_serp_requests_total{worker="host:2/1",engine="google",outcome="200"} 3', lines)
+        self.assertIn('scraper_filter_rejections_total{worker="host:1",reason="Say \\"hi\\"\\\\n"} 1', lines)
+
+        self.assertEqual(lines.index('# HELP scraper_stage_seconds Time spent per pipeline stage, per call') + 1,
+                         lines.index('# TYPE scraper_stage_seconds histogram'))
+        bucket_lines = [line for line in lines if line.startswith('scraper_stage_seconds_bucket')]
+        self.assertEqual(len(bucket_lines), len(metrics.BUCKETS) + 1)
+        self.assertEqual(bucket_lines[0], 'scraper_stage_seconds_bucket{worker="host:2/1",stage="fetch",le="0.005"} 2')
+        self.assertEqual(bucket_lines[3], 'scraper_stage_seconds_bucket{worker="host:2/1",stage="fetch",le="0.05"} 3')
+        self.assertEqual(bucket_lines[-2], 'scraper_stage_seconds_bucket{worker="host:2/1",stage="fetch",le="60"} 3')
+        self.assertEqual(bucket_lines[-1], 'scraper_stage_seconds_bucket{worker="host:2/1",stage="fetch",le="+Inf"} 4')
+        self.assertIn('scraper_stage_seconds_sum{worker="host:2/1",stage="fetch"} 61.5', lines)
+        self.assertIn('scraper_stage_seconds_count{worker="host:2/1",stage="fetch"} 4', lines)
+
+    def test_workers_publish_to_the_metrics_view(self):
+        snapshot = {'counters': {('scraper_leads_written_total', ()): 7}, 'histograms': {}}
+        with mock.patch.object(metrics, 'snapshot', return_value=snapshot):
+            metrics.publish('worker-host:42')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('scraper_leads_written_total{worker="worker-host:42"} 7', response.content.decode())
+
+        # A worker that stops publishing drops out once its snapshot expires
+        with mock.patch('time.time', return_value=metrics.time.time() + 3600):
+            self.assertNotIn('worker-host:42', metrics.collect())
@@ -5,6 +5,9 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('scrape/', views.scrape_data, name='scrape'),
     path('progress/', views.get_scraping_progress, name='progress'),
+    path('progress/stream/<int:job_id>/', views.progress_stream, name='progress_stream'),
+    path('results/<int:job_id>/', views.get_job_results, name='job_results'),
+    path('metrics/', views.prometheus_metrics, name='metrics'),
     path('download/', views.download_csv, name='download'),
     path('download/<int:client_id>/', views.download_client_csv, name='download_client'),
     path('download-verified/<int:client_id>/', views.download_verified_client_csv, name='download_verified_client'),
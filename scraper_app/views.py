@@ -1,18 +1,31 @@
-import requests
-from bs4 import BeautifulSoup
 import urllib.parse
 import time
-from .models import Client, ScrapedData, BlacklistedDomain, SearchEngine
+from .models import Client, ScrapedData, ScrapeJob, ScrapeResult
+from .fetcher import fetch_page, fetch_pages, get_download_settings, resolve_redirect
+from . import http_client, instrument, metrics, ratelimit, serp_cache
+from .config import get_config
+from .crawler import contact_links, crawl_contacts, get_crawl_settings, missing_fields
+from .extract import contacts_found, extract_from_response
+from .filters import REASON_NO_CONTACT, REASON_WRONG_COUNTRY, screen_result
+from .parsing import select_nodes
+from .known_leads import find_fresh
+from .leads import LeadBuffer
+from .normalize import canonicalize_url, registrable_domain
+from .progress import read_progress
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.core.paginator import Paginator
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 import csv
-import re
+import json
+import zlib
 
 def index(request):
     clients = Client.objects.all()
     return render(request, 'scraper_app/index.html', {'clients': clients})
 
 def scrape_data(request):
+    """Queue a scrape job and return its id immediately; a worker does the scraping"""
     if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
         client_id = request.POST.get('client')
         category_input = request.POST.get('category', '').strip()
@@ -21,11 +34,9 @@ def scrape_data(request):
         url = request.POST.get('url', '').strip()
         
         client = None
-        client_name = ""
         if client_id:
              try:
                  client = Client.objects.get(id=client_id)
-                 client_name = client.name
              except Client.DoesNotExist:
                  pass
 
@@ -33,138 +44,175 @@ def scrape_data(request):
         categories = [c.strip() for c in category_input.split(',') if c.strip()]
         cities = [c.strip() for c in city_input.split(',') if c.strip()] if city_input else ['']
         
-        print(f"DEBUG: Scrape request - Categories: {categories}, Cities: {cities}, Country: '{country}', URL: '{url}', Client: {client_name}")
-
-        raw_results = []
-        total_dup_count = 0
-        total_saved = 0
-        all_skipped_items = []
+        job = ScrapeJob.objects.create(
+            client=client,
+            categories=categories,
+            cities=cities,
+            country=country,
+            url=url,
+            total=1 if url else len(categories) * len(cities),
+            status_message='Waiting for a worker...'
+        )
+        print(f"DEBUG: Queued job {job.pk} - Categories: {categories}, Cities: {cities}, Country: '{country}', URL: '{url}'")
         
-        # Check if URL is provided - if so, scrape directly from URL
-        if url:
-            # For URL scraping, use first category and city
-            category = categories[0] if categories else ''
-            city = cities[0] if cities else ''
-            print(f"DEBUG: URL scraping mode - passing category='{category}', city='{city}', country='{country}'")
-            raw_results, dup_count, saved_count = scrape_from_url(url, category, city, country, client, client_name)
-            total_dup_count = dup_count
-            total_saved = saved_count
-            print(f"DEBUG: scrape_from_url returned {len(raw_results)} results, saved {saved_count}")
-            if raw_results:
-                print(f"DEBUG: First result - category: '{raw_results[0].get('category')}', city: '{raw_results[0].get('city')}', country: '{raw_results[0].get('country')}'")
-        else:
-            # Regular search-based scraping - iterate through all combinations
-            total_combinations = len(categories) * len(cities)
-            current_combination = 0
-            
-            # Store progress in session for polling
-            request.session['scraping_progress'] = {
-                'current': 0,
-                'total': total_combinations,
-                'current_category': '',
-                'current_city': '',
-                'saved': 0,
-                'skipped': 0
-            }
-            request.session.save()
-            
-            for category in categories:
-                for city in cities:
-                    current_combination += 1
-                    
-                    # Update progress in session
-                    request.session['scraping_progress'] = {
-                        'current': current_combination,
-                        'total': total_combinations,
-                        'current_category': category,
-                        'current_city': city or 'All cities',
-                        'saved': total_saved,
-                        'skipped': len(all_skipped_items),
-                        'status': f'Searching for {category} in {city or "all cities"}...'
-                    }
-                    request.session.save()
-                    
-                    print(f"\n{'='*60}")
-                    print(f"PROGRESS: Scraping combination {current_combination}/{total_combinations}")
-                    print(f"Category: '{category}', City: '{city}', Country: '{country}'")
-                    print(f"{'='*60}")
-                    
-                    batch_results, dup_count, saved_count, skipped_items, found_urls = perform_scraping(category, city, country, client, client_name)
-                    raw_results.extend(batch_results)
-                    total_dup_count += dup_count
-                    total_saved += saved_count
-                    all_skipped_items.extend(skipped_items)
-                    print(f"✓ Got {len(batch_results)} results, saved {saved_count} to database for {category} in {city or 'any city'}")
-                    
-                    # Small delay between combinations to avoid rate limiting
-                    # Only add delay if we have more combinations to process
-                    if current_combination < total_combinations:
-                        time.sleep(0.5)
-            
-            # Clear progress from session
-            if 'scraping_progress' in request.session:
-                del request.session['scraping_progress']
-                request.session.save()
-        
-        # For display purposes, prepare final results
-        final_results = []
-        for r in raw_results:
-            # Skip if filtered by country validation
-            if r.get('is_invalid_country'):
-                continue
-
-            email = (r.get('email') or '').strip()
-            phone = (r.get('phone') or '').strip()
-            
-            # Skip leads with NO contact info
-            if not email and not phone:
-                continue
-            
-            # Always use form data for display
-            if url:
-                # URL scraping - use form values
-                final_city = city
-                final_country = country
-                final_category = category
-            else:
-                # Search scraping - use form values from the loop
-                final_city = r.get('city', '')  # This was set from form in the loop
-                final_country = r.get('country', '')  # This was set from form in the loop
-                final_category = r.get('category', '')  # This was set from form in the loop
-            
-            r['client'] = client_name
-            r['category'] = final_category
-            r['city'] = final_city
-            r['country'] = final_country
-            r['is_verified'] = False
-            
-            final_results.append(r)
-
-        # Store results in session for download
-        request.session['scraped_data'] = final_results
+        # Remember the latest job so the download link can find its results
+        request.session['last_scrape_job_id'] = job.pk
         
-        return JsonResponse({
-            'status': 'success', 
-            'results': final_results, 
-            'count': len(final_results), 
-            'saved': total_saved,
-            'skipped_duplicates': total_dup_count,
-            'skipped_items': all_skipped_items[:50]  # Limit to 50 items for display
-        })
+        return JsonResponse({'status': 'queued', 'job_id': job.pk, 'total': job.total})
     return JsonResponse({'status': 'error', 'message': 'Invalid request'})
 
+def _get_job(request):
+    """Return the job named by ?job_id=, falling back to the session's latest job"""
+    job_id = request.GET.get('job_id') or request.session.get('last_scrape_job_id')
+    if not job_id:
+        return None
+    try:
+        return ScrapeJob.objects.get(pk=job_id)
+    except (ScrapeJob.DoesNotExist, ValueError):
+        return None
+
 def get_scraping_progress(request):
-    """Return current scraping progress from session"""
-    progress = request.session.get('scraping_progress', {})
+    """Return current progress of a scrape job, plus its summary once it is done"""
+    job = _get_job(request)
+    if job is None:
+        return JsonResponse({})
+    
+    progress = {
+        'job_id': job.pk,
+        'state': job.status,
+        'current': job.current,
+        'total': job.total,
+        'current_category': job.current_category,
+        'current_city': job.current_city,
+        'saved': job.saved_count,
+        'skipped': job.skipped_count,
+        'status': job.status_message
+    }
+    # Live stage/status from the progress channel is fresher than the job row
+    live = read_progress(job.pk)
+    if live and job.status == ScrapeJob.STATUS_RUNNING:
+        for name in ('stage', 'status', 'current', 'current_category', 'current_city', 'saved', 'skipped'):
+            if name in live:
+                progress[name] = live[name]
+    
+    if job.status == ScrapeJob.STATUS_DONE:
+        # Results themselves are fetched page by page from get_job_results
+        progress.update({
+            'count': job.result_count,
+            'skipped_duplicates': job.duplicate_count,
+            'skipped_items': job.skipped_items
+        })
+    elif job.status == ScrapeJob.STATUS_FAILED:
+        progress['message'] = job.error
     return JsonResponse(progress)
 
+def progress_stream(request, job_id):
+    """
+    Server-Sent Events stream of a job's progress channel. Each state change is
+    pushed as a 'progress' event; the stream ends once the job is done or failed
+    (or after SCRAPER_SSE_MAX_SECONDS, when the browser reconnects by itself).
+    Each open stream holds a server thread, so this needs a threaded or async server.
+    """
+    try:
+        job = ScrapeJob.objects.get(pk=job_id)
+    except ScrapeJob.DoesNotExist:
+        return HttpResponse("Job not found", status=404)
+    
+    poll_interval = getattr(settings, 'SCRAPER_SSE_POLL_INTERVAL', 0.25)
+    max_seconds = getattr(settings, 'SCRAPER_SSE_MAX_SECONDS', 30)
+    
+    def event(state):
+        return f"event: progress\ndata: {json.dumps(state)}\n\n"
+    
+    def finished_state():
+        # Final state straight from the job row, in case the channel expired or never existed
+        job.refresh_from_db()
+        state = {'job_id': job.pk, 'state': job.status, 'stage': job.status, 'status': job.status_message,
+                 'current': job.current, 'total': job.total, 'saved': job.saved_count, 'skipped': job.skipped_count,
+                 'current_category': job.current_category, 'current_city': job.current_city}
+        if job.status == ScrapeJob.STATUS_DONE:
+            state.update({'count': job.result_count, 'skipped_duplicates': job.duplicate_count,
+                          'skipped_items': job.skipped_items})
+        else:
+            state['message'] = job.error
+        return state
+    
+    def stream():
+        yield "retry: 2000\n\n"
+        if job.status in (ScrapeJob.STATUS_DONE, ScrapeJob.STATUS_FAILED):
+            yield event(finished_state())
+            return
+        
+        last_sent_key = None
+        last_sent = time.monotonic()
+        deadline = last_sent + max_seconds
+        while time.monotonic() < deadline:
+            state = read_progress(job_id)
+            # seq grows across the whole job; updated_at tells apart states published
+            # under a racing seq, and a final state is sent whatever its numbers
+            finished = bool(state) and state.get('state') in (ScrapeJob.STATUS_DONE, ScrapeJob.STATUS_FAILED)
+            key = (state.get('seq'), state.get('updated_at')) if state else None
+            if state and (key != last_sent_key or finished):
+                last_sent_key = key
+                last_sent = time.monotonic()
+                yield event(state)
+                if finished:
+                    return
+            elif time.monotonic() - last_sent > 15:
+                # Comment line keeps proxies from closing an idle connection
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+                # Covers a worker that finished while its channel was unreadable
+                if state is None and ScrapeJob.objects.filter(
+                        pk=job_id, status__in=[ScrapeJob.STATUS_DONE, ScrapeJob.STATUS_FAILED]).exists():
+                    yield event(finished_state())
+                    return
+            time.sleep(poll_interval)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+RESULT_FIELDS = ('position', 'client_name', 'title', 'link', 'snippet', 'category', 'city', 'country',
+                 'email', 'phone', 'is_elfsight', 'is_verified')
+
+def get_job_results(request, job_id):
+    """Return one page of a job's results (?page=, ?page_size= up to 500)"""
+    try:
+        page_number = int(request.GET.get('page', 1))
+        page_size = min(max(int(request.GET.get('page_size', 100)), 1), 500)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid page'}, status=400)
+    
+    rows = ScrapeResult.objects.filter(job_id=job_id).order_by('position').values(*RESULT_FIELDS)
+    paginator = Paginator(rows, page_size)
+    page = paginator.get_page(page_number)
+    
+    results = []
+    for row in page.object_list:
+        row['client'] = row.pop('client_name')
+        results.append(row)
+    
+    return JsonResponse({
+        'status': 'success',
+        'results': results,
+        'page': page.number,
+        'num_pages': paginator.num_pages,
+        'count': paginator.count,
+        'has_next': page.has_next()
+    })
+
 import concurrent.futures
+import threading
+from django.db import connection
 
-def scrape_from_url(url, category, city, country, client=None, client_name=""):
+def scrape_from_url(url, category, city, country, client=None, client_name="", lead_buffer=None):
     """
     Scrape data directly from a provided URL and save/update to database
     Returns result list, duplicate count, and saved count
     """
+    leads = lead_buffer if lead_buffer is not None else LeadBuffer()
     print(f"Scraping from URL: {url} - Category: {category}, City: {city}, Country: {country}")
     
     result = {
@@ -208,27 +256,23 @@ def scrape_from_url(url, category, city, country, client=None, client_name=""):
         phone = (result.get('phone') or '').strip()
         
         if email or phone:
-            try:
-                obj, created = ScrapedData.objects.update_or_create(
-                    link=url,
-                    defaults={
-                        'client': client,
-                        'category': category,  # Always use form category
-                        'city': city,  # Always use form city
-                        'country': country,  # Always use form country
-                        'title': result.get('title', '').strip(),
-                        'snippet': result.get('snippet', '').strip(),
-                        'email': email,
-                        'phone': phone,
-                        'is_elfsight': result.get('is_elfsight', False),
-                        'is_verified': False
-                    }
-                )
-                saved_count = 1
-                action = "CREATED" if created else "UPDATED"
-                print(f"✓ {action} URL scrape in database (Cat: {category}, City: {city}, Country: {country})")
-            except Exception as e:
-                print(f"Error saving URL scrape to DB: {e}")
+            leads.add(
+                url,
+                client=client,
+                category=category,  # Always use form category
+                city=city,  # Always use form city
+                country=country,  # Always use form country
+                title=result.get('title', '').strip(),
+                snippet=result.get('snippet', '').strip(),
+                email=email,
+                phone=phone,
+                is_elfsight=result.get('is_elfsight', False),
+                is_verified=False
+            )
+            if lead_buffer is None:
+                leads.flush()
+            saved_count = 1
+            print(f"✓ Saved URL scrape (Cat: {category}, City: {city}, Country: {country})")
         
     except Exception as e:
         print(f"Error scraping URL {url}: {e}")
@@ -236,11 +280,73 @@ def scrape_from_url(url, category, city, country, client=None, client_name=""):
     
     return [result], 0, saved_count  # Return single result, 0 duplicates, saved count
 
-def perform_scraping(category, city, country, client=None, client_name=""):
+def _report(progress, stage, status, **deltas):
+    """Publish a stage update to a job's ProgressChannel, if there is one"""
+    if progress is not None:
+        progress.increment(stage=stage, status=status, **deltas)
+
+class ScrapeState:
+    """
+    Results of one combination, shared by the engine threads of perform_scraping.
+    Every read-modify-write goes through the lock.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.all_results = []
+        self.seen_domains = set()
+        self.total_skipped_duplicates = 0
+        self.saved_count = 0
+        self.skipped_items = []  # Track skipped items with reasons
+        self.all_found_urls = []  # Track ALL URLs found from search engines
+    
+    def claim_domain(self, domain):
+        """True the first time a registrable domain is seen, so each business is visited once"""
+        with self.lock:
+            if domain in self.seen_domains:
+                self.total_skipped_duplicates += 1
+                return False
+            self.seen_domains.add(domain)
+            return True
+    
+    def merge(self, results, found_urls, skipped_items):
+        with self.lock:
+            self.all_results.extend(results)
+            self.saved_count += len(results)
+            self.all_found_urls.extend(found_urls)
+            self.skipped_items.extend(skipped_items)
+    
+    def result_count(self):
+        with self.lock:
+            return len(self.all_results)
+
+def run_in_thread_pool(func, args_list, max_workers):
+    """
+    Run func(*args) for each args tuple on a thread pool and return the results
+    in order. Each worker thread closes its own database connection when done.
+    """
+    def call(args):
+        try:
+            return func(*args)
+        finally:
+            connection.close()
+    
+    if max_workers <= 1 or len(args_list) <= 1:
+        # Nothing to overlap; stay on the calling thread (and its connection)
+        return [func(*args) for args in args_list]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(call, args_list))
+
+def perform_scraping(category, city, country, client=None, client_name="", lead_buffer=None, progress=None):
     """
     Perform scraping and save results incrementally to database
+    Leads are written through lead_buffer (a job-wide LeadBuffer); without one,
+    a private buffer is used and flushed before returning
+    Stage updates (search, fetch, extract, save) go to progress (a ProgressChannel)
+    The search engines run concurrently, each under its host's rate limit
     Returns count of saved results and skip details
     """
+    leads = lead_buffer if lead_buffer is not None else LeadBuffer()
     # Natural query construction (e.g. "Gym Toronto Canada")
     # Avoid "in" which can sometimes limit engine results
     query_parts = [category]
@@ -250,81 +356,31 @@ def perform_scraping(category, city, country, client=None, client_name=""):
     query = " ".join(query_parts).strip()
     print(f"Scraping query: {query}")
     
-    all_results = []
-    seen_links = set()
-    total_skipped_duplicates = 0
-    saved_count = 0
-    skipped_items = []  # Track skipped items with reasons
-    all_found_urls = []  # Track ALL URLs found from search engines
+    state = ScrapeState()
+    
+    # Engines and blacklist come from one immutable snapshot for the whole combination
+    config = get_config()
     
     def add_unique_and_save(new_list):
-        nonlocal total_skipped_duplicates, saved_count, skipped_items, all_found_urls
+        # Collected locally, then merged into the shared state in one step
+        accepted = []
+        found_urls = []
+        skipped_items = []
         
-        # Get active blacklisted domains from database
-        db_blacklist = list(BlacklistedDomain.objects.filter(is_active=True).values_list('domain', flat=True))
-        
-        # Fallback hardcoded blacklist (in case database is empty)
-        fallback_blacklist = [
-            # Review & Listing Sites
-            'birdeye.com', 'trustpilot.com', 'yelp.com', 'yellowpages.',
-            'tripadvisor.', 'bbb.org', 'foursquare.com', 'zomato.com',
-            'clutch.co', 'goodfirms.co', 'yably.ca', 'bestratedintoronto.com',
-            'threebestrated.', 'threebest.', '3bestrated.',
-            
-            # Forums & Discussion Sites
-            'reddit.com', 'quora.com', 'stackoverflow.com', 'stackexchange.com',
-            'answers.yahoo.com', 'thestudentroom.co.uk', 'studentroom.co.uk',
-            'lawstudents.', 'studentdoctor.', 'studentforums.',
-            'forum.', 'forums.', 'community.', 'discuss.',
-            
-            # Legal Directories
-            'lawyers.com', 'avvo.com', 'findlaw.com', 'martindale.com',
-            'superlawyers.com', 'nolo.com', 'bestlawfirms.com', 'lexpert.ca',
-            
-            # Social Media
-            'facebook.com', 'instagram.com', 'twitter.com', 'linkedin.com',
-            'pinterest.com', 'youtube.com', 'tumblr.com', 'medium.com',
-            
-            # Maps & Directories
-            'google.com/maps', 'maps.google.com', 'mapquest.com',
-            'justdial.com', 'indiamart.com', 'sulekha.com', 'indiatimes.com',
-            'magicpin.in', 'urbanpro.com', 'timesofindia.',
-            
-            # Job Sites
-            'glassdoor.', 'indeed.com',
-            
-            # Travel & Booking
-            'booking.com', 'expedia.', 'hotels.com', 'airbnb.com',
-            'opentable.com', 'urbanspoon.com',
-            
-            # Home Services
-            'homeadvisor.com', 'angi.com', 'thumbtack.com', 'houzz.com',
-            'porch.com', 'bark.com',
-            
-            # Other
-            'wikipedia.org', 'zumba.com',
-            
-            # Search Engines
-            'search.yahoo.com', 'search.brave.com',
-            
-            # Government & Education
-            '.gov', '.nic.in', 'gov.in', 'gov.uk', 'usa.gov', 'pib.gov.in',
-            '.edu', '.mil', 'india.gov.in'
-        ]
-        
-        # Use database blacklist if available, otherwise use fallback
-        blacklist = db_blacklist if db_blacklist else fallback_blacklist
-        
-        print(f"  Using {len(blacklist)} blacklisted domains ({len(db_blacklist)} from database, {len(fallback_blacklist)} fallback)")
+        matcher = config.blacklist
+        print(f"  Using {len(matcher)} blacklisted domains ({config.db_blacklist_count} from database, config v{config.version})")
         
         c = 0
         skipped_listing_sites = 0
+        candidates = []  # Items that passed all filters, visited as one batch
+        filter_started = time.perf_counter()
         for item in new_list:
+            # Canonical form (no tracking parameters, fragments, default ports) is what gets fetched and stored
+            item['link'] = canonicalize_url(item['link']) or item['link']
             link = item['link'].lower()
-            title = item.get('title', '').lower()
             
             # Log ALL found URLs
-            all_found_urls.append({
+            found_urls.append({
                 'url': item['link'],
                 'title': item.get('title', ''),
                 'source': 'search_engine'
@@ -332,174 +388,100 @@ def perform_scraping(category, city, country, client=None, client_name=""):
             
             if link.startswith('/'): continue
             
-            # Skip non-English titles
-            non_english_chars = sum(1 for c in title if ord(c) > 127)
-            if non_english_chars > len(title) * 0.3:
-                skipped_listing_sites += 1
-                skipped_items.append({
-                    'url': item['link'][:80],
-                    'reason': 'Non-English content'
-                })
-                print(f"  Skipped non-English: {item['title'][:60]}...")
-                continue
-            
-            # Skip businesses without Google Reviews
-            has_reviews = item.get('has_reviews', False)
-            if not has_reviews:
-                skipped_listing_sites += 1
-                skipped_items.append({
-                    'url': item['link'][:80],
-                    'reason': 'No Google Reviews found'
-                })
-                print(f"  Skipped (no reviews): {item['title'][:60]}...")
-                continue
-            
-            # Skip blacklisted domains (listing sites)
-            is_listing_site = any(domain in link for domain in blacklist)
-            if is_listing_site:
+            skipped = screen_result(item, matcher)
+            if skipped:
                 skipped_listing_sites += 1
-                skipped_items.append({
-                    'url': item['link'][:80],
-                    'reason': 'Listing/Review site (blacklisted)'
-                })
-                print(f"  Skipped listing site: {item['link'][:60]}...")
+                skipped_items.append(skipped)
+                metrics.inc('scraper_filter_rejections_total', reason=skipped['reason'])
+                print(f"  Skipped ({skipped['reason']}): {item['link'][:60]}...")
                 continue
             
-            # Skip forum posts, discussion threads, and non-business URLs
-            forum_keywords = [
-                'forum', 'thread', 'topic', 'discussion', 'post', 'comment',
-                'reddit.com', 'quora.com', 'stackoverflow', 'answers.yahoo',
-                '/forum/', '/thread/', '/topic/', '/discussion/', '/post/',
-                'lawstudents', 'studentroom', 'thestudentroom',
-                'wiki', 'wikipedia', 'fandom', 'wikia'
-            ]
-            
-            is_forum = any(keyword in link for keyword in forum_keywords)
-            if is_forum:
-                skipped_listing_sites += 1
-                skipped_items.append({
-                    'url': item['link'][:80],
-                    'reason': 'Forum/Discussion thread (not a business)'
-                })
-                print(f"  Skipped forum/discussion: {item['link'][:60]}...")
+            # One visit per business: other pages of the same site (or a host known to
+            # redirect to it) are duplicates
+            if state.claim_domain(registrable_domain(resolve_redirect(item['link']))):
+                candidates.append(item)
+            else:
+                print(f"  Skipped duplicate site: {item['link'][:60]}...")
+        instrument.record('filter', time.perf_counter() - filter_started)
+        
+        # Sites with fresh contact info in ScrapedData for this country are not fetched again (one query per batch)
+        with instrument.timed('lookup'):
+            fresh = find_fresh([item['link'] for item in candidates], country)
+        to_visit = []
+        for item in candidates:
+            stored = fresh.get(item['link'])
+            if stored is None:
+                to_visit.append(item)
                 continue
+            item['email'] = stored['email'] or ''
+            item['phone'] = stored['phone'] or ''
+            item['is_elfsight'] = item.get('is_elfsight') or stored['is_elfsight']
+            item['scraped_at'] = stored['scraped_at']  # Keep the stored freshness on the upsert
+        if fresh:
+            print(f"  Reusing {len(fresh)} recently scraped sites without fetching them")
+        
+        # Visit all accepted candidates concurrently and extract data as pages arrive
+        if to_visit:
+            print(f"  Visiting {len(to_visit)} candidate sites concurrently...")
+            _report(progress, 'fetch', f'Visiting {len(to_visit)} sites for {category} in {city or "all cities"}...')
+            visit_and_extract_many(to_visit, progress=progress)
+        
+        for item in candidates:
+            # Save or update in database immediately if has contact info
+            email = (item.get('email') or '').strip()
+            phone = (item.get('phone') or '').strip()
             
-            # Skip URLs with forum-like patterns in title
-            title_forum_keywords = ['forum', 'discussion', 'thread', 'post', 'comment', 'question', 'answer']
-            if any(keyword in title for keyword in title_forum_keywords):
-                skipped_listing_sites += 1
+            # Skip if no contact info
+            if not email and not phone:
                 skipped_items.append({
                     'url': item['link'][:80],
-                    'reason': 'Forum/Discussion content'
+                    'reason': REASON_NO_CONTACT
                 })
-                print(f"  Skipped forum content: {item['title'][:60]}...")
+                metrics.inc('scraper_filter_rejections_total', reason=REASON_NO_CONTACT)
+                print(f"  Skipped (no contact): {item['title'][:50]}...")
                 continue
             
-            # Only accept URLs that look like business websites
-            # Must have a proper domain (not just subpages of forums/portals)
-            from urllib.parse import urlparse
-            parsed = urlparse(item['link'])
-            domain = parsed.netloc.lower()
-            path = parsed.path.lower()
-            
-            # Skip if URL path contains forum-like segments
-            bad_path_segments = ['/forum/', '/thread/', '/topic/', '/discussion/', '/post/', '/questions/', '/answers/']
-            if any(segment in path for segment in bad_path_segments):
-                skipped_listing_sites += 1
+            # Skip if invalid country
+            if item.get('is_invalid_country'):
                 skipped_items.append({
                     'url': item['link'][:80],
-                    'reason': 'Forum URL path'
+                    'reason': REASON_WRONG_COUNTRY
                 })
-                print(f"  Skipped forum URL: {item['link'][:60]}...")
+                metrics.inc('scraper_filter_rejections_total', reason=REASON_WRONG_COUNTRY)
+                print(f"  Skipped (wrong country): {item['title'][:50]}...")
                 continue
             
-            # Skip "Top X" / "Best of" ranking pages
-            ranking_keywords = [
-                'top 10', 'top 5', 'top 20', 'top 30', 'top 50', 'top 100',
-                'top ten', 'top five', 'top twenty',
-                'best 10', 'best 5', 'best 20', 'best of', 'best in',
-                'top rated', 'highest rated', 'top-rated',
-                '10 best', '5 best', '20 best', '30 best',
-                'rankings', 'ranked', 'list of', 'directory of',
-                'best lawyers', 'best doctors', 'best clinics', 'best firms',
-                'best restaurants', 'best gyms', 'best services',
-                'top lawyers', 'top doctors', 'top clinics', 'top firms'
-            ]
-            
-            is_ranking_page = any(keyword in title for keyword in ranking_keywords)
-            if is_ranking_page:
-                skipped_listing_sites += 1
-                skipped_items.append({
-                    'url': item['link'][:80],
-                    'reason': 'Ranking page (Top 10/Best of)'
-                })
-                print(f"  Skipped ranking page: {item['title'][:60]}...")
-                continue
-            
-            if link not in seen_links:
-                seen_links.add(link)
-                
-                # Visit and extract data immediately
-                visit_and_extract(item)
-                
-                # Save or update in database immediately if has contact info
-                email = (item.get('email') or '').strip()
-                phone = (item.get('phone') or '').strip()
-                
-                # Skip if no contact info
-                if not email and not phone:
-                    skipped_items.append({
-                        'url': item['link'][:80],
-                        'reason': 'No contact info (email/phone)'
-                    })
-                    print(f"  Skipped (no contact): {item['title'][:50]}...")
-                    continue
-                
-                # Skip if invalid country
-                if item.get('is_invalid_country'):
-                    skipped_items.append({
-                        'url': item['link'][:80],
-                        'reason': 'Wrong country'
-                    })
-                    print(f"  Skipped (wrong country): {item['title'][:50]}...")
-                    continue
-                
-                # Always use form data - never use extracted/hardcoded values
-                final_city = city  # Always use form city
-                final_country = country  # Always use form country
-                final_category = category  # Always use form category
-                
-                # Update or create in database
-                try:
-                    obj, created = ScrapedData.objects.update_or_create(
-                        link=item.get('link', '').strip(),
-                        defaults={
-                            'client': client,
-                            'category': final_category,
-                            'city': final_city,
-                            'country': final_country,
-                            'title': item.get('title', '').strip(),
-                            'snippet': item.get('snippet', '').strip(),
-                            'email': email,
-                            'phone': phone,
-                            'is_elfsight': item.get('is_elfsight', False),
-                            'is_verified': False
-                        }
-                    )
-                    saved_count += 1
-                    action = "CREATED" if created else "UPDATED"
-                    print(f"  ✓ {action}: {item['title'][:50]}... (Cat: {final_category}, City: {final_city}, Country: {final_country})")
-                except Exception as e:
-                    print(f"  Error saving to DB: {e}")
-                
-                all_results.append(item)
-                c += 1
+            # Always use form data - never use extracted/hardcoded values
+            final_city = city  # Always use form city
+            final_country = country  # Always use form country
+            final_category = category  # Always use form category
+            
+            # Queue for the buffered bulk upsert (keyed on link)
+            leads.add(
+                item.get('link', ''),
+                client=client,
+                category=final_category,
+                city=final_city,
+                country=final_country,
+                title=item.get('title', '').strip(),
+                snippet=item.get('snippet', '').strip(),
+                email=email,
+                phone=phone,
+                is_elfsight=item.get('is_elfsight', False),
+                is_verified=False,
+                scraped_at=item.pop('scraped_at', None)
+            )
+            print(f"  ✓ QUEUED: {item['title'][:50]}... (Cat: {final_category}, City: {final_city}, Country: {final_country})")
+            
+            accepted.append(item)
+            c += 1
+        _report(progress, 'save', f'Saved {c} leads for {category} in {city or "all cities"}',
+                saved=c, skipped=len(skipped_items))
+        state.merge(accepted, found_urls, skipped_items)
         print(f"Engine batch: {c} new unique business URLs found and saved (skipped {skipped_listing_sites} listing/ranking sites).")
 
-    # Get active search engines from database
-    db_engines = SearchEngine.objects.filter(is_active=True).order_by('priority')
-    
-    if not db_engines.exists():
+    # Get active search engines from the cached config snapshot
+    if not config.engines:
         print("WARNING: No active search engines found in database. Using default Google and Bing.")
         # Fallback to hardcoded engines
         engines = [
@@ -507,13 +489,13 @@ def perform_scraping(category, city, country, client=None, client_name=""):
             ('Bing Search', scrape_elfsight_businesses)
         ]
     else:
-        print(f"Using {db_engines.count()} active search engine(s) from database:")
-        for eng in db_engines:
+        print(f"Using {len(config.engines)} active search engine(s) from database:")
+        for eng in config.engines:
             print(f"  - {eng.name} (Priority: {eng.priority}, Add Reviews: {eng.add_reviews_keyword})")
         
-        # Build engines list from database
+        # Build engines list from config
         engines = []
-        for db_engine in db_engines:
+        for db_engine in config.engines:
             if 'google' in db_engine.name.lower():
                 engines.append((db_engine.name, scrape_google_reviews_only))
             elif 'bing' in db_engine.name.lower():
@@ -533,22 +515,23 @@ def perform_scraping(category, city, country, client=None, client_name=""):
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/120.0.0.0",
     ]
 
-    for name, engine_func in engines:
+    def run_engine(name, engine_func):
         # If we already have enough results, we can stop
-        if len(all_results) >= 100:  # Increased from 30 to 100
-            print(f"Already have {len(all_results)} results, stopping search")
-            break 
+        if state.result_count() >= 100:  # Increased from 30 to 100
+            print(f"Already have {state.result_count()} results, skipping {name}")
+            return
         
-        # Get delay setting from database
-        try:
-            db_engine = SearchEngine.objects.get(name=name, is_active=True)
+        # Get delay setting from config snapshot
+        db_engine = config.engines_by_name.get(name)
+        if db_engine:
             delay = db_engine.delay_between_requests
             max_results = db_engine.max_results
             print(f"\n--- Using {name}: delay={delay}s, max_results={max_results} ---")
-        except SearchEngine.DoesNotExist:
+        else:
             delay = 2.0  # Default delay
             max_results = 50  # Increased default
             print(f"\n--- Using {name}: default settings (delay=2s, max=50) ---")
+        max_concurrency = db_engine.max_concurrency if db_engine else 1
         
         # Try multiple variations to get results for the specific city
         search_queries = [query]
@@ -560,8 +543,9 @@ def perform_scraping(category, city, country, client=None, client_name=""):
             search_queries.append(f"best {category} {city}")
 
         for q in search_queries:
-            if len(all_results) >= max_results: break
+            if state.result_count() >= max_results: break
             print(f"\n--- Trying {name} with query: {q} ---")
+            _report(progress, 'search', f'Searching {name}: {q}')
             try:
                 current_headers = {
                     "User-Agent": random.choice(user_agents),
@@ -576,12 +560,9 @@ def perform_scraping(category, city, country, client=None, client_name=""):
                     "Cache-Control": "max-age=0"
                 }
                 
-                # Add random delay BEFORE request to avoid rate limiting
-                delay_time = delay + random.uniform(0, 1.0)
-                print(f"--- Waiting {delay_time:.1f}s before request (anti-blocking) ---")
-                time.sleep(delay_time)
-                
-                batch = engine_func(q, current_headers)
+                # The engine waits on its host's rate limiter only when it actually
+                # sends a request and the host's budget is spent
+                batch = engine_func(q, current_headers, delay=delay, max_concurrency=max_concurrency)
                 print(f"--- {name} returned {len(batch) if batch else 0} raw results ---")
                 if batch:
                     for r in batch:
@@ -602,6 +583,15 @@ def perform_scraping(category, city, country, client=None, client_name=""):
                 import traceback
                 traceback.print_exc()
 
+    run_in_thread_pool(run_engine, engines, max_workers=len(engines))
+
+    if lead_buffer is None:
+        leads.flush()
+    
+    all_results, saved_count, skipped_items, all_found_urls = (
+        state.all_results, state.saved_count, state.skipped_items, state.all_found_urls
+    )
+    
     print(f"\n{'='*60}")
     print(f"SCRAPING SUMMARY for '{query}':")
     print(f"  Total URLs found from search: {len(all_found_urls)}")
@@ -619,75 +609,55 @@ def perform_scraping(category, city, country, client=None, client_name=""):
         if len(all_found_urls) > 20:
             print(f"  ... and {len(all_found_urls) - 20} more URLs")
     
-    return all_results, total_skipped_duplicates, saved_count, skipped_items, all_found_urls
+    return all_results, state.total_skipped_duplicates, saved_count, skipped_items, all_found_urls
 
-def scrape_google_reviews_only(query, headers):
+def _search_base_url(engine):
+    # Scheme and host the engine's searches go to (a local fake engine in load tests)
+    defaults = {'google': 'https://www.google.com', 'bing': 'https://www.bing.com'}
+    return getattr(settings, 'SCRAPER_SEARCH_BASE_URLS', {}).get(engine, defaults[engine]).rstrip('/')
+
+def _search_request(engine, url, headers, delay, max_concurrency):
+    # One rate-limited search request, counted and timed per engine for /metrics
+    outcome = 'error'
+    started = None
+    try:
+        with ratelimit.limit(url, delay, max_concurrency), instrument.timed('search'):
+            started = time.perf_counter()
+            resp = http_client.get(url, headers=headers, timeout=30)
+        outcome = str(resp.status_code)
+        return resp
+    finally:
+        metrics.inc('scraper_serp_requests_total', engine=engine, outcome=outcome)
+        if started is not None:
+            metrics.observe('scraper_serp_request_seconds', time.perf_counter() - started, engine=engine)
+
+def scrape_google_reviews_only(query, headers, delay=2.0, max_concurrency=1):
     """
     Search ONLY for businesses that have Google Reviews
     Filters to include only businesses with review indicators
+    Results come from the SERP cache when possible; real searches go through
+    the per-host rate limiter (delay seconds apart, max_concurrency at once)
     """
+    # Search specifically for businesses with Google reviews
+    # Add "business" keyword to avoid forums and discussions
+    search_query = f"{query} business google reviews -forum -discussion -thread"
+    cached = serp_cache.get('google', search_query)
+    if cached is not None:
+        print(f"  Google results for '{search_query}' served from cache ({len(cached)} results)")
+        metrics.inc('scraper_serp_requests_total', engine='google', outcome='cached')
+        return cached
+    
     results = []
     try:
-        # Search specifically for businesses with Google reviews
-        # Add "business" keyword to avoid forums and discussions
-        search_query = f"{query} business google reviews -forum -discussion -thread"
-        url = f"https://www.google.com/search?q={urllib.parse.quote(search_query)}&hl=en&lr=lang_en"
+        url = f"{_search_base_url('google')}/search?q={urllib.parse.quote(search_query)}&hl=en&lr=lang_en"
         
         print(f"  Searching Google (English only): {search_query}")
-        resp = requests.get(url, headers=headers, timeout=30)
+        resp = _search_request('google', url, headers, delay, max_concurrency)
         if resp.status_code == 200:
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            
-            # Google search results are in divs with class 'g'
-            items = soup.select('div.g')
-            
-            print(f"  Found {len(items)} raw results from Google")
-            
-            for r in items:
-                # Try to find title and link
-                title_tag = r.select_one('h3')
-                link_tag = r.select_one('a')
-                
-                if title_tag and link_tag:
-                    title = title_tag.get_text(strip=True)
-                    link = link_tag.get('href', '')
-                    
-                    if not link or link.startswith('/') or 'google.com' in link:
-                        continue
-                    
-                    # Skip non-English titles (check for Chinese, Japanese, Korean, Arabic, etc.)
-                    # English text should be mostly ASCII or common Latin characters
-                    non_english_chars = sum(1 for c in title if ord(c) > 127)
-                    if non_english_chars > len(title) * 0.3:  # If more than 30% non-ASCII, skip
-                        print(f"  Skipped non-English: {title[:50]}")
-                        continue
-                    
-                    # Get snippet
-                    snippet_tag = r.select_one('.VwiC3b, .s, .st')
-                    snippet = snippet_tag.get_text(strip=True) if snippet_tag else ""
-                    
-                    # ONLY include if it has Google Maps/Reviews indicators
-                    is_google_maps = 'google.com/maps' in link.lower() or 'goo.gl/maps' in link.lower()
-                    has_review_keywords = any(keyword in title.lower() or keyword in snippet.lower() 
-                                             for keyword in ['review', 'reviews', 'rating', 'ratings', 'star', '★', 'google'])
-                    
-                    # Skip if no review indicators
-                    if not (is_google_maps or has_review_keywords):
-                        print(f"  Skipped (no reviews): {title[:50]}")
-                        continue
-                    
-                    results.append({
-                        'title': title,
-                        'link': link,
-                        'snippet': snippet,
-                        'email': None,
-                        'phone': None,
-                        'is_elfsight': False,
-                        'is_verified': False,
-                        'has_reviews': True,
-                        'is_google_maps': is_google_maps
-                    })
-                    
+            with instrument.timed('parse'):
+                results = parse_google_results(resp.text)
+            # Only complete, successful searches are cached
+            serp_cache.set('google', search_query, results)
     except Exception as e:
         print(f"Google search error: {e}")
         import traceback
@@ -696,66 +666,30 @@ def scrape_google_reviews_only(query, headers):
     print(f"  Returning {len(results)} results with Google Reviews")
     return results
 
-def scrape_elfsight_businesses(query, headers):
+def scrape_elfsight_businesses(query, headers, delay=2.0, max_concurrency=1):
     """
     Secondary search for businesses with reviews using Bing
+    Cached the same way as scrape_google_reviews_only
     """
+    # Search for businesses with reviews, exclude forums
+    search_query = f"{query} business reviews -forum -discussion"
+    cached = serp_cache.get('bing', search_query)
+    if cached is not None:
+        print(f"  Bing results for '{search_query}' served from cache ({len(cached)} results)")
+        metrics.inc('scraper_serp_requests_total', engine='bing', outcome='cached')
+        return cached
+    
     results = []
     try:
-        # Search for businesses with reviews, exclude forums
-        search_query = f"{query} business reviews -forum -discussion"
-        url = f"https://www.bing.com/search?q={urllib.parse.quote(search_query)}&setlang=en"
+        url = f"{_search_base_url('bing')}/search?q={urllib.parse.quote(search_query)}&setlang=en"
         
         print(f"  Searching Bing (English only): {search_query}")
-        resp = requests.get(url, headers=headers, timeout=30)
+        resp = _search_request('bing', url, headers, delay, max_concurrency)
         if resp.status_code == 200:
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            items = soup.select('.b_algo')
-            
-            print(f"  Found {len(items)} raw results from Bing")
-            
-            for r in items:
-                title_tag = r.select_one('h2 a')
-                
-                if title_tag:
-                    title = title_tag.get_text(strip=True)
-                    link = title_tag.get('href', '')
-                    
-                    if not link or link.startswith('/'):
-                        continue
-                    
-                    # Skip non-English titles
-                    non_english_chars = sum(1 for c in title if ord(c) > 127)
-                    if non_english_chars > len(title) * 0.3:  # If more than 30% non-ASCII, skip
-                        print(f"  Skipped non-English: {title[:50]}")
-                        continue
-                    
-                    snippet_tag = r.select_one('.b_caption p')
-                    snippet = snippet_tag.get_text(strip=True) if snippet_tag else ""
-                    
-                    # ONLY include if it has review indicators
-                    has_review_keywords = any(keyword in title.lower() or keyword in snippet.lower() 
-                                             for keyword in ['review', 'reviews', 'rating', 'ratings', 'star', '★'])
-                    
-                    # Skip if no review indicators
-                    if not has_review_keywords:
-                        print(f"  Skipped (no reviews): {title[:50]}")
-                        continue
-                    
-                    # Check if Elfsight is mentioned (will be verified during page visit)
-                    has_elfsight = 'elfsight' in link.lower() or 'elfsight' in title.lower() or 'elfsight' in snippet.lower()
-                    
-                    results.append({
-                        'title': title,
-                        'link': link,
-                        'snippet': snippet,
-                        'email': None,
-                        'phone': None,
-                        'is_elfsight': has_elfsight,
-                        'is_verified': False,
-                        'has_reviews': True
-                    })
-                    
+            with instrument.timed('parse'):
+                results = parse_bing_results(resp.text)
+            # Only complete, successful searches are cached
+            serp_cache.set('bing', search_query, results)
     except Exception as e:
         print(f"Bing search error: {e}")
         import traceback
@@ -764,321 +698,268 @@ def scrape_elfsight_businesses(query, headers):
     print(f"  Returning {len(results)} results with reviews from Bing")
     return results
 
+def parse_google_results(text):
+    """Candidate results from a Google SERP: review-related organic results only"""
+    results = []
+    # Google search results are in divs with class 'g'; only those get parsed
+    items = select_nodes(text, 'div.g', only={'name': 'div', 'class_': 'g'})
+
+    print(f"  Found {len(items)} raw results from Google")
+
+    for r in items:
+        # Try to find title and link
+        title_tag = r.select_one('h3')
+        link_tag = r.select_one('a')
+
+        if title_tag and link_tag:
+            title = title_tag.get_text(strip=True)
+            link = link_tag.get('href', '')
+
+            if not link or link.startswith('/') or 'google.com' in link:
+                continue
+
+            # Skip non-English titles (check for Chinese, Japanese, Korean, Arabic, etc.)
+            # English text should be mostly ASCII or common Latin characters
+            non_english_chars = sum(1 for c in title if ord(c) > 127)
+            if non_english_chars > len(title) * 0.3:  # If more than 30% non-ASCII, skip
+                print(f"  Skipped non-English: {title[:50]}")
+                continue
+
+            # Get snippet
+            snippet_tag = r.select_one('.VwiC3b, .s, .st')
+            snippet = snippet_tag.get_text(strip=True) if snippet_tag else ""
+
+            # ONLY include if it has Google Maps/Reviews indicators
+            is_google_maps = 'google.com/maps' in link.lower() or 'goo.gl/maps' in link.lower()
+            has_review_keywords = any(keyword in title.lower() or keyword in snippet.lower() 
+                                     for keyword in ['review', 'reviews', 'rating', 'ratings', 'star', '★', 'google'])
+
+            # Skip if no review indicators
+            if not (is_google_maps or has_review_keywords):
+                print(f"  Skipped (no reviews): {title[:50]}")
+                continue
+
+            results.append({
+                'title': title,
+                'link': link,
+                'snippet': snippet,
+                'email': None,
+                'phone': None,
+                'is_elfsight': False,
+                'is_verified': False,
+                'has_reviews': True,
+                'is_google_maps': is_google_maps
+            })
+    return results
+
+def parse_bing_results(text):
+    """Candidate results from a Bing SERP: review-related organic results only"""
+    results = []
+    items = select_nodes(text, '.b_algo', only={'class_': 'b_algo'})
+
+    print(f"  Found {len(items)} raw results from Bing")
+
+    for r in items:
+        title_tag = r.select_one('h2 a')
+
+        if title_tag:
+            title = title_tag.get_text(strip=True)
+            link = title_tag.get('href', '')
+
+            if not link or link.startswith('/'):
+                continue
+
+            # Skip non-English titles
+            non_english_chars = sum(1 for c in title if ord(c) > 127)
+            if non_english_chars > len(title) * 0.3:  # If more than 30% non-ASCII, skip
+                print(f"  Skipped non-English: {title[:50]}")
+                continue
+
+            snippet_tag = r.select_one('.b_caption p')
+            snippet = snippet_tag.get_text(strip=True) if snippet_tag else ""
+
+            # ONLY include if it has review indicators
+            has_review_keywords = any(keyword in title.lower() or keyword in snippet.lower() 
+                                     for keyword in ['review', 'reviews', 'rating', 'ratings', 'star', '★'])
+
+            # Skip if no review indicators
+            if not has_review_keywords:
+                print(f"  Skipped (no reviews): {title[:50]}")
+                continue
+
+            # Check if Elfsight is mentioned (will be verified during page visit)
+            has_elfsight = 'elfsight' in link.lower() or 'elfsight' in title.lower() or 'elfsight' in snippet.lower()
+
+            results.append({
+                'title': title,
+                'link': link,
+                'snippet': snippet,
+                'email': None,
+                'phone': None,
+                'is_elfsight': has_elfsight,
+                'is_verified': False,
+                'has_reviews': True
+            })
+    return results
+
 def visit_and_extract(result):
-    url = result['link']
-    result['city'] = (result.get('city') or '').strip()
-    target_country = (result.get('country') or '').strip()
+    """Fetch a single candidate site and extract contact details into result"""
+    try:
+        resp = fetch_page(result['link'], stop_when=_stop_when())
+    except Exception:
+        resp = None
+    extract_from_response(result, resp)
+    links = _contact_pages_to_crawl(result, resp)
+    if links:
+        crawl_contacts(result, links)
+    return result
+
+def _contact_pages_to_crawl(result, resp):
+    # Only landing pages that loaded but lack an email or phone are worth a contact-page crawl
+    if resp is None or resp.status_code != 200 or result.get('is_invalid_country') or not missing_fields(result):
+        return []
+    max_pages, _ = get_crawl_settings()
+    return contact_links(resp.url or result['link'], resp.text, limit=max_pages)
+
+def _stop_when():
+    # Stop reading a page once it has an email and a phone, if enabled
+    _, early_stop = get_download_settings()
+    return contacts_found if early_stop else None
+
+def visit_and_extract_many(items, progress=None):
+    """
+    Fetch a batch of candidate sites concurrently and extract contact details
+    from each page as soon as its response arrives
+    """
+    items_by_url = {}
+    for item in items:
+        items_by_url.setdefault(item['link'], []).append(item)
     
-    # Country map for fuzzy matching
-    country_variations = {
-        'Canada': ['canada', 'ca'],
-        'USA': ['usa', 'united states', 'u.s.a', 'america', ' u.s '],
-        'India': ['india', ' bhart ', ' in '],
-        'UK': ['united kingdom', ' u.k', 'great britain', 'england', 'london']
-    }
+    to_crawl = []  # (item, contact page links) for landing pages without contact info
     
-    # Quick Check in Link (Link often contains .ca, .in, .uk)
-    link_lower = url.lower()
-    if target_country == 'Canada' and ('.ca/' in link_lower or link_lower.endswith('.ca')):
-        pass # Good sign
-    elif target_country == 'India' and ('.in/' in link_lower or link_lower.endswith('.in')):
-        pass # Good sign
-    elif target_country == 'UK' and ('.uk/' in link_lower or link_lower.endswith('.uk')):
-        pass # Good sign
+    def handle(url, resp):
+        for item in items_by_url[url]:
+            extract_from_response(item, resp)
+            links = _contact_pages_to_crawl(item, resp)
+            if links:
+                to_crawl.append((item, links))
+        _report(progress, 'extract', f'Extracted contacts from {url[:60]}', pages_visited=1)
+    
+    fetch_pages(list(items_by_url), handler=handle, stop_when=_stop_when())
+    
+    # Second pass: a few likely contact pages per site, each site within its own page/time budget
+    if to_crawl:
+        _report(progress, 'fetch', f'Checking contact pages of {len(to_crawl)} sites...')
+        max_pages, _ = get_crawl_settings()
+        workers = max(1, getattr(settings, 'SCRAPER_FETCH_CONCURRENCY', 16) // max_pages)
+        pages = run_in_thread_pool(crawl_contacts, to_crawl, max_workers=workers)
+        _report(progress, 'extract', f'Checked {sum(pages)} contact pages', pages_visited=sum(pages))
+    return items
 
-    # Dynamic Snippet Check: Look for "City, Country" pattern
-    if not result['city'] and target_country:
-        meta_text = ((result.get('title') or '') + " " + (result.get('snippet') or '')).lower()
-        pattern = rf"([a-z\s]+),\s*{re.escape(target_country.lower())}"
-        match = re.search(pattern, meta_text)
-        if match:
-            extracted = match.group(1).strip().title()
-            if len(extracted.split()) <= 2:
-                result['city'] = extracted
+def prometheus_metrics(request):
+    """Pipeline metrics of this process and every worker, in Prometheus text format"""
+    return HttpResponse(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
 
-    try:
-        resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
-        if resp.status_code == 200:
-            text = resp.text
-            text_lower = text.lower()
-            soup = BeautifulSoup(text, 'html.parser')
-            
-            # Country verification: Does this site actually belong to the target country?
-            if target_country:
-                candidates = country_variations.get(target_country, [target_country.lower()])
-                # Does the page content mention the country or its variations?
-                found_target = any(c in text_lower for c in candidates)
-                
-                # If country name is missing, but the city matches our search, consider it FOUND
-                # (e.g. searching Toronto and found Toronto, even if 'Canada' isn't explicitly on footer)
-                if not found_target and result['city']:
-                    if result['city'].lower() in text_lower:
-                        found_target = True
+def download_csv(request):
+    """Stream the results of the session's latest scrape job (or ?job_id=) as CSV"""
+    job = _get_job(request)
+    if job is None:
+        rows = []
+    else:
+        values = job.result_rows.order_by('position').values_list(
+            'title', 'link', 'snippet', 'category', 'city', 'country', 'email', 'phone', 'is_elfsight'
+        ).iterator(chunk_size=2000)
+        rows = (
+            [i, title, link, snippet, category, city, country, email, phone,
+             'Yes' if is_elfsight else 'No',
+             'Verified' if (email or phone) else 'Not Verified']
+            for i, (title, link, snippet, category, city, country, email, phone, is_elfsight) in enumerate(values, 1)
+        )
+    return _stream_csv(request, 'scraped_data_results.csv', rows)
 
-                # Check for mention of WRONG countries
-                wrong_countries = []
-                for k, v in country_variations.items():
-                    if k != target_country:
-                        if any(f" {var} " in f" {text_lower} " for var in v):
-                            wrong_countries.append(k)
-                
-                # If target is NOT found AND a wrong country IS found, this is definitely random data
-                if not found_target and len(wrong_countries) > 0:
-                    result['is_invalid_country'] = True
-                else:
-                    result['is_invalid_country'] = False
-            else:
-                result['is_invalid_country'] = False
+CSV_HEADER = ['Sr No.', 'Title', 'Link', 'Description', 'Category', 'City', 'Country', 'Email', 'Phone', 'Is Elfsight', 'Verified']
 
-            # 1. Elfsight detection
-            if any(t in text.lower() for t in ['elfsight.com', 'elfsight-app']):
-                result['is_elfsight'] = True
-            
-            # 2. Dynamic City Scraping (JSON-LD) - The most reliable way
-            if not result['city']:
-                try:
-                    import json
-                    scripts = soup.find_all('script', type='application/ld+json')
-                    for script in scripts:
-                        try:
-                            data = json.loads(script.string)
-                            # Handle both single object and list of objects
-                            items = data if isinstance(data, list) else [data]
-                            for item in items:
-                                addr = item.get('address')
-                                if isinstance(addr, dict):
-                                    city = addr.get('addressLocality')
-                                    if city:
-                                        result['city'] = str(city).strip()
-                                        break
-                                elif isinstance(item.get('location'), dict):
-                                    loc_addr = item['location'].get('address')
-                                    if isinstance(loc_addr, dict):
-                                        city = loc_addr.get('addressLocality')
-                                        if city:
-                                            result['city'] = str(city).strip()
-                                            break
-                            if result['city']: break
-                        except: continue
-                except: pass
+# Columns read for the client exports; everything else on ScrapedData is never loaded
+EXPORT_COLUMNS = ('title', 'link', 'snippet', 'category', 'city', 'country', 'email', 'phone', 'is_elfsight')
 
-            # 3. Dynamic City Scraping (Microdata / Schema.org)
-            if not result['city']:
-                city_tag = soup.find(attrs={"itemprop": "addressLocality"})
-                if city_tag:
-                    result['city'] = city_tag.get_text(strip=True)
+class Echo:
+    """File-like object whose write() just returns the value, so csv.writer output can be streamed"""
+    def write(self, value):
+        return value
 
-            # 4. Dynamic City Scraping (Common HTML classes)
-            if not result['city']:
-                for cls in ['city', 'locality', 'address-city', 'contact-city']:
-                    tag = soup.find(class_=re.compile(cls, re.I))
-                    if tag:
-                        val = tag.get_text(strip=True)
-                        if len(val) < 30 and len(val) > 2:
-                            result['city'] = val
-                            break
+def _csv_chunks(rows, chunk_size=64 * 1024):
+    """Render rows as CSV text, yielded in chunks of roughly chunk_size characters"""
+    writer = csv.writer(Echo())
+    buffer = [writer.writerow(CSV_HEADER)]
+    size = len(buffer[0])
+    for row in rows:
+        line = writer.writerow(row)
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
 
-            # 5. Last Resort: Meta tags
-            if not result['city']:
-                meta_city = soup.find('meta', attrs={'name': re.compile('city|location', re.I)})
-                if meta_city:
-                    result['city'] = meta_city.get('content', '').strip()
+def _gzip_chunks(chunks):
+    """Gzip a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
 
-            # Emails
-            result['email'] = '' # Initialize as empty
-            emails = re.findall(r"[a-zA-Z0-9.\-_%+#]+@[a-zA-Z0-9.\-_%+#]+\.[a-zA-Z]{2,4}", text)
-            if emails:
-                best = None
-                for e in set(emails):
-                    el = e.lower()
-                    if any(g in el for g in ['info@', 'contact@', 'support@']):
-                        if not best: best = e
-                    elif not any(x in el for x in ['.png', '.jpg', '.gif']):
-                        best = e
-                        break
-                if best:
-                    result['email'] = best
-            
-            # Phone Numbers - Try structured data first (most reliable)
-            result['phone'] = ''
-            
-            # 1. Try JSON-LD structured data
-            try:
-                import json
-                scripts = soup.find_all('script', type='application/ld+json')
-                for script in scripts:
-                    try:
-                        data = json.loads(script.string)
-                        items = data if isinstance(data, list) else [data]
-                        for item in items:
-                            # Check for telephone field
-                            phone = item.get('telephone') or item.get('phone')
-                            if phone:
-                                result['phone'] = str(phone).strip()
-                                break
-                            # Check in contactPoint
-                            contact = item.get('contactPoint')
-                            if isinstance(contact, dict):
-                                phone = contact.get('telephone')
-                                if phone:
-                                    result['phone'] = str(phone).strip()
-                                    break
-                        if result['phone']:
-                            break
-                    except:
-                        continue
-            except:
-                pass
-            
-            # 2. Try microdata/schema.org
-            if not result['phone']:
-                phone_tag = soup.find(attrs={"itemprop": "telephone"})
-                if phone_tag:
-                    result['phone'] = phone_tag.get_text(strip=True)
-            
-            # 3. Try common HTML patterns
-            if not result['phone']:
-                # Look for tel: links first (most reliable)
-                tel_links = soup.find_all('a', href=re.compile(r'^tel:', re.I))
-                if tel_links:
-                    href = tel_links[0].get('href', '')
-                    phone = href.replace('tel:', '').strip()
-                    if phone:
-                        result['phone'] = phone
-            
-            # 4. If still no phone, search in text with improved patterns
-            # 4. If still no phone, search in text with improved patterns
-            if not result['phone']:
-                phones = []
-                
-                # Search with improved patterns
-                phone_patterns = [
-                    # International format with country code
-                    r'\+\d{1,3}[-.\s]?\(?\d{2,4}\)?[-.\s]?\d{3,4}[-.\s]?\d{3,4}',
-                    # US/Canada format: (123) 456-7890 or 123-456-7890
-                    r'\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}',
-                    # Indian format: +91 98765 43210 or 9876543210
-                    r'\+?91[-.\s]?[6-9]\d{9}',
-                    r'[6-9]\d{9}',
-                    # UK format: +44 20 1234 5678
-                    r'\+?44[-.\s]?\d{2,4}[-.\s]?\d{3,4}[-.\s]?\d{3,4}',
-                    # General international
-                    r'\+\d{10,15}'
-                ]
-                
-                for pattern in phone_patterns:
-                    found = re.findall(pattern, text)
-                    phones.extend(found)
-                
-                # Clean and deduplicate phones
-                if phones:
-                    unique_phones = []
-                    unique_clean = set()
-                    
-                    for p in phones:
-                        # Clean the phone number
-                        p_clean = re.sub(r"[^\d+]", "", p)
-                        
-                        # Validate length (10-15 digits)
-                        if len(p_clean) >= 10 and len(p_clean) <= 15:
-                            # Check if we haven't seen this number
-                            if p_clean not in unique_clean:
-                                unique_clean.add(p_clean)
-                                # Keep original formatting
-                                unique_phones.append(p.strip())
-                    
-                    # Prioritize numbers with '+' (international format), then longer numbers
-                    if unique_phones:
-                        unique_phones.sort(key=lambda x: (
-                            not x.startswith('+'),
-                            -len(re.sub(r"[^\d]", "", x))
-                        ))
-                        result['phone'] = unique_phones[0]
-    except: 
-        if 'phone' not in result: result['phone'] = ''
-    return result
+def _stream_csv(request, filename, rows):
+    """StreamingHttpResponse for a CSV export; ?gzip=1 compresses it on the fly"""
+    chunks = _csv_chunks(rows)
+    if request.GET.get('gzip') in ('1', 'true', 'yes'):
+        response = StreamingHttpResponse(_gzip_chunks(chunks), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(chunks, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
-def download_csv(request):
-    data = request.session.get('scraped_data', [])
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="scraped_data_results.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Sr No.', 'Title', 'Link', 'Description', 'Category', 'City', 'Country', 'Email', 'Phone', 'Is Elfsight', 'Verified'])
-    
-    for i, r in enumerate(data, 1):
-        writer.writerow([
+def _export_rows(queryset, verified_label=None):
+    """Yield CSV rows from a ScrapedData queryset using a chunked server-side cursor"""
+    rows = queryset.values_list(*EXPORT_COLUMNS).iterator(chunk_size=2000)
+    for i, (title, link, snippet, category, city, country, email, phone, is_elfsight) in enumerate(rows, 1):
+        yield [
             i,
-            (r.get('title') or ''), 
-            (r.get('link') or ''), 
-            (r.get('snippet') or ''), 
-            (r.get('category') or ''), 
-            (r.get('city') or ''), 
-            (r.get('country') or ''), 
-            (r.get('email') or ''), 
-            (r.get('phone') or ''), 
-            'Yes' if r.get('is_elfsight') else 'No',
-            'Verified' if (r.get('email') or r.get('phone')) else 'Not Verified'
-        ])
-    return response
+            title,
+            link,
+            snippet,
+            category,
+            city,
+            country,
+            email,
+            phone,
+            'Yes' if is_elfsight else 'No',
+            verified_label or ('Verified' if (email or phone) else 'Not Verified')
+        ]
 
 def download_client_csv(request, client_id):
     try:
         client = Client.objects.get(id=client_id)
-        data = ScrapedData.objects.filter(client=client).order_by('-created_at')
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="scraped_data_{client.name.replace(" ", "_")}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Sr No.', 'Title', 'Link', 'Description', 'Category', 'City', 'Country', 'Email', 'Phone', 'Is Elfsight', 'Verified'])
-        
-        for i, row in enumerate(data, 1):
-            writer.writerow([
-                i,
-                row.title, 
-                row.link, 
-                row.snippet, 
-                row.category, 
-                row.city, 
-                row.country,
-                row.email,
-                row.phone,
-                'Yes' if row.is_elfsight else 'No',
-                'Verified' if (row.email or row.phone) else 'Not Verified'
-            ])
-        return response
     except Client.DoesNotExist:
         return HttpResponse("Client not found", status=404)
+    
+    data = ScrapedData.objects.filter(client=client).order_by('-created_at')
+    return _stream_csv(request, f'scraped_data_{client.name.replace(" ", "_")}.csv', _export_rows(data))
 
 def download_verified_client_csv(request, client_id):
     try:
         client = Client.objects.get(id=client_id)
-        # Filter ONLY verified data
-        data = ScrapedData.objects.filter(client=client, is_verified=True).order_by('-created_at')
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="verified_data_{client.name.replace(" ", "_")}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Sr No.', 'Title', 'Link', 'Description', 'Category', 'City', 'Country', 'Email', 'Phone', 'Is Elfsight', 'Verified'])
-        
-        for i, row in enumerate(data, 1):
-            writer.writerow([
-                i,
-                row.title, 
-                row.link, 
-                row.snippet, 
-                row.category, 
-                row.city, 
-                row.country,
-                row.email,
-                row.phone,
-                'Yes' if row.is_elfsight else 'No',
-                'Verified' # Since we filtered by is_verified=True
-            ])
-        return response
     except Client.DoesNotExist:
         return HttpResponse("Client not found", status=404)
+    
+    # Filter ONLY verified data
+    data = ScrapedData.objects.filter(client=client, is_verified=True).order_by('-created_at')
+    # Every row is verified since we filtered by is_verified=True
+    return _stream_csv(request, f'verified_data_{client.name.replace(" ", "_")}.csv', _export_rows(data, verified_label='Verified'))
 
 # Removed unused scrapers - now only using Google Reviews
 